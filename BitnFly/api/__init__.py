@@ -2,8 +2,22 @@
 A module BitNFly
 """
 
-from collections import OrderedDict
-from math import log
+from BitnFly.api.plan import Plan
+from BitnFly.api.schema import FlagSchema
+from BitnFly.api.array import BitnFlyArray
+from BitnFly.api.expr import FlagPredicate
+from BitnFly.api.bitmap import Bitmap
+from BitnFly.api.index import FlagIndex
+from BitnFly.api.store import FlagStore
+from BitnFly.api.concurrent import ConcurrentBitnFly
+from BitnFly.api.handle import mask_repr
+from BitnFly.api.sparse import SparseBitnFly
+from BitnFly.api.shared import SharedFlagTable
+from BitnFly.api.instrument import Recorder, instrumented
+from BitnFly.api.classes import make_class
+from BitnFly.api.delta import DeltaLog, FlagDelta
+from BitnFly.api.history import History
+from BitnFly.api.value import FlagValue
 
 
 class BitnFly(object):
@@ -12,22 +26,29 @@ class BitnFly(object):
     A BitNFly - the main object
     """
 
+    __slots__ = (
+        '__output', '__schema', '__options', '__opt_flags', '__flags_swap_mask',
+        '__repr_swap_mask', '__switch_state', '__checkpoint', '__weakref__',
+    )
+
     def __init__(self, options, **kwargs):
 
         """
         The constructor will configure all needed variables
 
-        :param options: list of strings, each value will be represented as pow(index, 2) from left to right
-        :type options: list
+        :param options: list of strings, each value will be represented as pow(index, 2) from left to right,
+            or an already built FlagSchema which will be shared instead of rebuilt
+        :type options: list or FlagSchema
         :param kwargs: a possible key is an 'output` with callable value eg. hex, bin; default is int
         :type kwargs: dict
         """
 
-        assert isinstance(options, list), 'an options attribute must be a list'
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
 
         self.__output = kwargs.get('output', int)
 
-        self.__options = self._create_options([opt.upper() for opt in options])
+        self.__schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        self.__options = self.__schema.options
 
         self.__opt_flags = 0x0
         self.__flags_swap_mask = 0x0
@@ -35,44 +56,51 @@ class BitnFly(object):
         self.__repr_swap_mask = kwargs.get('mask', None)
 
         self.__switch_state = True
-        self.__operation = '__xor__'
+        self.__checkpoint = None
 
         self._init()
 
+        if self.__schema.recorder is not None:
+            self.__class__ = instrumented(self.__class__)
+
     def __and__(self, other):
 
         """
         A bitwise operator &
 
-        :param other: can be an int or a str
+        :param other: can be an int, an option or a group name
         :type other: int or str
-        :return: True if other is set in self otherwise False
+        :return: True if other is set in self, or implied by a set flag, otherwise False
         :rtype: bool
         """
 
-        if isinstance(other, int) and self.get(output=int) & other:
-            return True
-
-        elif isinstance(other, str) and self._is_set(other):
-            return True
+        if isinstance(other, str):
+            other = self.__schema.mask_of(other)
 
-        else:
+        elif not isinstance(other, int):
             return False
 
+        if self.__schema.implied_by:
+            other = self.__schema.implied_by_mask(other)
+
+        return bool(self.__opt_flags & other)
+
     def __or__(self, other):
 
         """
         A bitwise operator |
 
-        :param other: can be an int, a str, a list of int or a list of str
-        :type other: int, str, list
+        :param other: can be an int, a str, or a list, a tuple or a frozenset of int or of str
+        :type other: int, str, list, tuple, frozenset
         :return: self
         :rtype: self
         """
 
-        self.__operation = '__or__'
+        mask = self.__schema.or_mask(other)
+
+        self.__opt_flags |= mask
+        self.__flags_swap_mask |= mask
 
-        self._args_callback(other, callback_int=self._bitnfly_bits, callback_str=self._bitnfly_str)
         return self
 
     def __xor__(self, other):
@@ -80,16 +108,13 @@ class BitnFly(object):
         """
         A bitwise operator ^. Will turn on or off all bits in self with mask other
 
-        :param other: can be an int, a str, a list of int or a list of str
-        :type other: int, str, list
+        :param other: can be an int, a str, or a list, a tuple or a frozenset of int or of str
+        :type other: int, str, list, tuple, frozenset
         :return: object it self
         :rtype: object
         """
 
-        self.__operation = '__xor__'
-        self.flip(other)
-
-        return self
+        return self.flip(other)
 
     def __str__(self):
         return str(self.get())
@@ -99,359 +124,283 @@ class BitnFly(object):
         return '{}({}, mask={})'.format(
             self.__class__.__name__,
             [flags.lower() for flags in self.__options.keys()],
-            self.get(),
+            mask_repr(self.get()),
             self.__flags_swap_mask
         )
 
     def __getattr__(self, item):
 
+        # private and unset slot names must not look up the options, which may be unset themselves
+        if item.startswith('_'):
+            raise AttributeError(item)
+
         if item.upper() in self.__options:
             return self.__options.get(item.upper())
 
         return self.__getattribute__(item)
 
-    @staticmethod
-    def _create_options(options):
+    def _is_set(self, opt, result_as=None):
 
         """
-        A helper protected method for a internal usage
-        Will create a ordered dictionary
+        Check is some bit is set or not
 
-        :param options:
-        :type options:
-        :return:
-        :rtype:
+        :param opt: an option or a group name
+        :type opt: str
+        :return: if opt bit is set True otherwise False
+        :rtype: bool
         """
 
-        return OrderedDict(
-            zip(options, [pow(2, x) for x in range(len(options))])
-        )
+        mask = self.__schema.mask_of(opt)
 
-    def _bitnfly_bits_xor(self, bit):
-        """
-        Flip bits - xor
-        :param bit:
-        :type bit:
-        :return:
-        :rtype:
-        """
-        self.__opt_flags ^= (1 << bit)
-        self.__flags_swap_mask ^= (1 << bit)
+        if result_as is None:
+            return True if mask & self.__opt_flags else False
 
-    def _bitnfly_bits_or(self, bit):
-        """
-        Or bit
-        :param bit:
-        :type bit:
-        :return:
-        :rtype:
-        """
-        self.__opt_flags |= (1 << bit)
-        self.__flags_swap_mask |= (1 << bit)
+        elif result_as == 'int':
+            return mask & self.__opt_flags
 
-    def _bitnfly_bits_helper(self, bit):
-        """
-        A helper bit method
+    def _init(self):
 
-        :param bit:
-        :type bit:
-        :return:
-        :rtype:
         """
-        if bit in self.__options.values():
+        Will initialize the bits and swap_mask
 
-            bit = int(log(bit, 2))
+        :return: a tuple of current bits and swap mask
+        :rtype: tuple
+        """
+        swap_mask = self.__schema.full_mask
+        flag = swap_mask if self.__repr_swap_mask is None else 0x0
 
-            if self.__operation == '__xor__':
-                self._bitnfly_bits_xor(bit)
+        self.__opt_flags, self.__flags_swap_mask = flag or self.__repr_swap_mask, swap_mask
 
-            else:
-                self._bitnfly_bits_or(bit)
+        return self.__opt_flags, self.__flags_swap_mask
 
-    def _bitnfly_bits_int(self, bit):
-        """
-        A function that care about bits
-        :param bit: a bit
-        :type bit: int
-        :return: void
-        :rtype: void
-        """
-        self._bitnfly_bits_helper(bit)
+    def flip(self, bits):
 
-    def _bitnfly_bits_list(self, bit_num):
-        """
-        When we got a list ot bits
-        :param bit_num:
-        :type bit_num:
-        :return:
-        :rtype:
         """
-        for bit in bit_num:
-            self._bitnfly_bits_helper(bit)
-
-    def _bitnfly_bits(self, bit_num):
+        Will flip bit or bits to opposite side. Argument masks are resolved
+        by the schema and cached, see FlagSchema.mask_of
 
+        :param bits: can be an int, a str, or a list, a tuple or a frozenset of int or of str
+        :type bits: int, str, list, tuple, frozenset
+        :return: object it self
+        :rtype: object
         """
-        A helper protected method for a internal usage
-        Will flip a bit or bits to opposite values
 
-        :param bit_num: can be a int or a list
-        :type bit_num: int, list
-        """
+        mask = self.__schema.mask_of(bits, '__xor__')
 
-        if isinstance(bit_num, int):
-            self._bitnfly_bits_int(bit_num)
+        self.__opt_flags ^= mask
+        self.__flags_swap_mask ^= mask
 
-        if isinstance(bit_num, list):
-            self._bitnfly_bits_list(bit_num)
+        return self
 
-    def _bitnfly_str_xor(self, bit):
+    def set_range(self, start, stop):
 
         """
-        flip str xor
+        Will set the flags at positions start to stop - 1, as | does
 
-        :param bit:
-        :type bit:
-        :return:
-        :rtype:
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
         """
 
-        self.__opt_flags ^= (1 << list(self.__options.keys()).index(bit))
-        self.__flags_swap_mask ^= (1 << list(self.__options.keys()).index(bit))
+        mask = self.__schema.range_mask(start, stop)
 
-    def _bitnfly_str_or(self, bit):
+        self.__opt_flags |= mask
+        self.__flags_swap_mask |= mask
 
-        """
-        flip str or
-
-        :param bit:
-        :type bit:
-        :return:
-        :rtype:
-        """
+        return self
 
-        self.__opt_flags |= (1 << list(self.__options.keys()).index(bit))
-        self.__flags_swap_mask |= (1 << list(self.__options.keys()).index(bit))
+    def clear_range(self, start, stop):
 
-    def _bitnfly_str_list(self, bit_name):
         """
-        When we got a list of strings
-        :param bit_name:
-        :type bit_name:
-        :return:
-        :rtype:
+        Will flip the set flags at positions start to stop - 1, so all of them are cleared
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
         """
 
-        for bit in bit_name:
+        mask = self.__schema.range_mask(start, stop) & self.__opt_flags
 
-            bit = bit.upper()
+        self.__opt_flags ^= mask
+        self.__flags_swap_mask ^= mask
 
-            if self.__operation == '__xor__':
-                self._bitnfly_str_xor(bit)
+        return self
 
-            else:
-                self._bitnfly_str_or(bit)
+    def flip_range(self, start, stop):
 
-    def _bitnfly_str_str(self, bit_name):
         """
-        Case with a string bit
-        :param bit_name:
-        :type bit_name:
-        :return:
-        :rtype:
+        Will flip the flags at positions start to stop - 1
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
         """
 
-        bit_name = bit_name.upper()
+        mask = self.__schema.range_mask(start, stop)
 
-        if self.__operation == '__xor__':
-            self._bitnfly_str_xor(bit_name)
+        self.__opt_flags ^= mask
+        self.__flags_swap_mask ^= mask
 
-        else:
-            self._bitnfly_str_or(bit_name)
+        return self
 
-    def _bitnfly_str(self, bit_name):
+    def off(self):
 
         """
-        A helper protected method for a internal usage
-        Will flip a bit or bits to opposite values
+        Will turning off all bits, according to a swap mask
 
-        :param bit_name:
-        :type bit_name:
-        :return:
-        :rtype:
+        :return: object it self
+        :rtype: object
         """
 
-        if isinstance(bit_name, str):
-            self._bitnfly_str_str(bit_name)
-
-        elif isinstance(bit_name, list):
-            self._bitnfly_str_list(bit_name)
+        self.__opt_flags &= ~self.__flags_swap_mask
+        self.__switch_state = False
+        return self
 
-    def _is_set(self, opt, result_as=None):
+    def on(self):
 
         """
-        Check is some bit is set or not
+        Will turn on all flags according to swap mask
 
-        :param opt: string that represent some bit field
-        :type opt: str
-        :return: if opt bit is set True otherwise False
-        :rtype: bool
+        :return: object it self
+        :rtype: object
         """
 
-        opt = opt.upper()
+        if self.__switch_state is False:
 
-        if result_as is None:
-            return True if self.__options[opt] & self.__opt_flags else False
+            self.__opt_flags ^= self.__flags_swap_mask
+            self.__switch_state = True
 
-        elif result_as == 'int':
-            return self.__options[opt] & self.__opt_flags
+        return self
 
-    @staticmethod
-    def _is_type_list(bits, itype):
+    def reset(self):
 
         """
-        A factory helper method.
-        Will test whether all elements in a list are from some type
+        Reset all bits to initial values
 
-        :param bits: a list of bits
-        :type bits: list
-        :param itype: a type for which we are looking for
-        :type itype: str or int
-        :return: if all elements are from itype type True otherwise False
-        :rtype: bool
+        :return: object it's self
+        :rtype: object
         """
 
-        return len(bits) == len([x for x in bits if isinstance(x, itype)])
+        self._init()
+        return self
 
-    def _is_digit_list(self, bits):
+    def apply(self, ops):
 
         """
-        Test if all elements in list are int
+        Will apply a sequence of operations at once. The operations are fused into
+        a few masks and the state is replaced in one step
 
-        :param bits: a list of bits
-        :type bits: list
-        :return: True if all elements are int otherwise False
-        :rtype: bool
+        :param ops: operations like [('flip', 'admin'), ('or', [1, 2]), 'off'] or a Plan
+        :type ops: list or Plan
+        :return: object it self
+        :rtype: object
         """
 
-        return self._is_type_list(bits, int)
+        plan = ops if isinstance(ops, Plan) else self.__schema.plan(ops)
 
-    def _is_alpha_list(self, bits):
+        assert plan.schema is self.__schema or plan.schema.fingerprint == self.__schema.fingerprint, \
+            'a plan must be made for the same schema'
 
-        """
-        Test if all elements in list are str
+        initial = self.__schema.full_mask if self.__repr_swap_mask is None else self.__repr_swap_mask
 
-        :param bits: a list of bits
-        :type bits: list
-        :return: True if all elements are str otherwise False
-        :rtype: bool
-        """
+        self.__opt_flags, self.__flags_swap_mask, self.__switch_state = plan.run(
+            self.__opt_flags, self.__flags_swap_mask, self.__switch_state, initial
+        )
 
-        return self._is_type_list(bits, str)
+        return self
 
-    def _init(self):
+    def state(self):
 
         """
-        Will initialize the bits and swap_mask
+        Will return the whole state, as FlagStore.state does for a slot
 
-        :return: a tuple of current bits and swap mask
+        :return: a tuple of flags, swap mask and switch state
         :rtype: tuple
         """
-        flag, swap_mask = 0x0, 0x0
-
-        for _, val in self.__options.items():
-
-            swap_mask |= val
-
-            if self.__repr_swap_mask is None:
-                flag |= val
 
-        self.__opt_flags, self.__flags_swap_mask = flag or self.__repr_swap_mask, swap_mask
-
-        return self.__opt_flags, self.__flags_swap_mask
+        return self.__opt_flags, self.__flags_swap_mask, self.__switch_state
 
-    def _args_callback(self, bits, **kwargs):
+    def freeze(self):
 
         """
-        A helper method, which care about all input arguments
+        Will return the current flags as an interned, immutable and hashable value
 
-        :param bits: a user query ca be a str an int, or a list of str or list or ints
-        :type bits:
-        :param kwargs: contains to required keys callback_int and callback_str, they must be callable
-        :type kwargs: dict
-        :return: void
-        :rtype: void
+        :return: a value
+        :rtype: FlagValue
         """
 
-        callback_int = kwargs.get('callback_int')
-        callback_str = kwargs.get('callback_str')
-
-        if isinstance(bits, int) or (isinstance(bits, list) and self._is_digit_list(bits)):
-            callback_int(bits)
+        return self.__schema.value(self.__opt_flags)
 
-        if isinstance(bits, str) or (isinstance(bits, list) and self._is_alpha_list(bits)):
-            callback_str(bits)
-
-    def flip(self, bits):
+    def checkpoint(self):
 
         """
-        Will flip bit or bits to opposite side
+        Will start tracking changes from the current state, see drain
 
-        :param bits: can be an int, a str, a list of int or a list of str
-        :type bits: int, str, list
         :return: object it self
         :rtype: object
         """
 
-        self.__operation = '__xor__'
-
-        self._args_callback(
-            bits,
-            callback_int=self._bitnfly_bits,
-            callback_str=self._bitnfly_str,
-        )
+        self.__checkpoint = self.state()
         return self
 
-    def off(self):
+    def drain(self):
 
         """
-        Will turning off all bits, according to a swap mask
+        Will return the changes since the last checkpoint as one delta and checkpoint again.
+        Bits flipped back and forth cancel out
 
-        :return: object it self
-        :rtype: object
+        :return: a delta for apply_delta on a replica
+        :rtype: FlagDelta
         """
 
-        self.__opt_flags &= ~self.__flags_swap_mask
-        self.__switch_state = False
-        return self
+        assert self.__checkpoint is not None, 'changes are tracked after a checkpoint'
 
-    def on(self):
+        flags, swap_mask, switch_state = self.__checkpoint
+        self.checkpoint()
+
+        return FlagDelta(
+            flags ^ self.__opt_flags,
+            swap_mask ^ self.__flags_swap_mask,
+            None if switch_state == self.__switch_state else self.__switch_state
+        )
+
+    def apply_delta(self, delta):
 
         """
-        Will turn on all flags according to swap mask
+        Will apply a delta drained from a replica of the same schema
 
+        :param delta: a delta
+        :type delta: FlagDelta
         :return: object it self
         :rtype: object
         """
 
-        if self.__switch_state is False:
-
-            self.__opt_flags ^= self.__flags_swap_mask
-            self.__switch_state = True
+        self.__opt_flags, self.__flags_swap_mask, self.__switch_state = delta.apply(
+            self.__opt_flags, self.__flags_swap_mask, self.__switch_state
+        )
 
         return self
 
-    def reset(self):
+    def batch(self):
 
         """
-        Reset all bits to initial values
+        Will return a Plan bound to this object. Operations recorded on it are applied
+        by its commit method or at the end of a with block
 
-        :return: object it's self
-        :rtype: object
+        :return: a plan
+        :rtype: Plan
         """
 
-        self._init()
-        return self
+        return Plan(self.__schema, target=self)
 
     def get(self, bit=None, output=None):
 
@@ -474,7 +423,7 @@ class BitnFly(object):
 
         elif isinstance(bit, int):
 
-            if bit in self.__options.values():
+            if self.__schema.is_bit(bit):
                 return call(self.__opt_flags & bit)
 
             else:
@@ -486,6 +435,28 @@ class BitnFly(object):
         else:
             raise TypeError('A bit argument can be int or a str')
 
+    def names(self):
+
+        """
+        Will return the lower cased names of the set flags, in bit order
+
+        :return: a list of names
+        :rtype: list
+        """
+
+        return self.__schema.names_of(self.__opt_flags)
+
+    def iter_set(self):
+
+        """
+        Will iterate the lower cased names of the set flags, visiting only the set bits
+
+        :return: a generator of names
+        :rtype: generator
+        """
+
+        return self.__schema.iter_names(self.__opt_flags)
+
     def flags(self):
         """
         Will return all flags in ordered dict
@@ -494,6 +465,14 @@ class BitnFly(object):
         """
         return self.__options
 
+    def schema(self):
+        """
+        Will return the shared schema of this object
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
     def mask(self):
         """
         Will return the current swap mask
@@ -503,5 +482,21 @@ class BitnFly(object):
         return self.__flags_swap_mask
 
 __all__ = [
+    'Bitmap',
     'BitnFly',
+    'BitnFlyArray',
+    'ConcurrentBitnFly',
+    'DeltaLog',
+    'FlagDelta',
+    'FlagIndex',
+    'FlagPredicate',
+    'FlagSchema',
+    'FlagStore',
+    'FlagValue',
+    'History',
+    'Plan',
+    'Recorder',
+    'SharedFlagTable',
+    'SparseBitnFly',
+    'make_class',
 ]
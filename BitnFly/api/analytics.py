@@ -0,0 +1,324 @@
+"""
+A module with population analytics of flag masks.
+
+analyze() streams masks - ints, BitnFly like objects or uint64 arrays,
+eg. FlagStore.flags_array() or BitnFlyArray.get() - a chunk at a time and
+counts how many masks have each flag, how many have each pair of flags
+and how many have n flags set. With numpy a chunk is unpacked into a bit
+matrix once, the pairs are one matrix product and the histogram uses a
+byte popcount table; without numpy the set bits are found with the byte
+tables of the bitmap module.
+"""
+
+from BitnFly.api.array import as_word_matrix, to_words
+from BitnFly.api.bitmap import iter_positions, popcount
+from BitnFly.api.codec import Decoder
+from BitnFly.api.stream import CHUNK_SIZE, chunks
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# rows of a float32 product of 0/1 bits whose sums are exact
+EXACT_ROWS = 1 << 24
+
+if numpy is not None:
+    BYTE_POPCOUNT = numpy.array([popcount(value) for value in range(256)], dtype=numpy.uint8)
+
+else:  # pragma: no cover
+    BYTE_POPCOUNT = None
+
+
+class FlagStats(object):
+
+    """
+    FlagStats - the result of analyze, counts can be added up with +
+    """
+
+    def __init__(self, schema, total, counts, pairs, histogram):
+
+        """
+        :param schema: a schema of the masks
+        :type schema: FlagSchema
+        :param total: number of masks
+        :type total: int
+        :param counts: masks per flag position
+        :type counts: list
+        :param pairs: a len(schema) x len(schema) matrix of masks per pair of positions, or None
+        :type pairs: numpy.ndarray or list
+        :param histogram: masks per number of set flags, from 0 to len(schema)
+        :type histogram: list
+        """
+
+        self.schema = schema
+        self.total = total
+        self.counts = counts
+        self.pairs = pairs
+        self.histogram = histogram
+
+    def __repr__(self):
+        return '{}({} masks, {} flags)'.format(self.__class__.__name__, self.total, len(self.schema))
+
+    def __add__(self, other):
+
+        assert self.schema.fingerprint == other.schema.fingerprint, 'stats must be made for the same schema'
+
+        if self.pairs is None or other.pairs is None:
+            pairs = None
+
+        elif numpy is not None and isinstance(self.pairs, numpy.ndarray):
+            pairs = self.pairs + other.pairs
+
+        else:
+            pairs = [[x + y for x, y in zip(left, right)] for left, right in zip(self.pairs, other.pairs)]
+
+        return FlagStats(
+            self.schema,
+            self.total + other.total,
+            [x + y for x, y in zip(self.counts, other.counts)],
+            pairs,
+            [x + y for x, y in zip(self.histogram, other.histogram)]
+        )
+
+    def count(self, name):
+
+        """
+        Will return the number of masks with a flag set
+
+        :param name: an option name
+        :type name: str
+        :return: a count
+        :rtype: int
+        """
+
+        return self.counts[self.schema.position(name.upper())]
+
+    def pair(self, first, second):
+
+        """
+        Will return the number of masks with both flags set
+
+        :param first: an option name
+        :type first: str
+        :param second: an option name
+        :type second: str
+        :return: a count
+        :rtype: int
+        """
+
+        assert self.pairs is not None, 'pairs were not counted'
+
+        return int(self.pairs[self.schema.position(first.upper())][self.schema.position(second.upper())])
+
+    def as_dict(self):
+
+        """
+        Will return the counts by option name
+
+        :return: a dict name -> count
+        :rtype: dict
+        """
+
+        return dict(zip(self.schema.names, self.counts))
+
+
+def _masks(items):
+
+    """
+    Will read the flags of BitnFly like objects, ints and arrays are passed as they are
+    """
+
+    for item in items:
+
+        if isinstance(item, int) or numpy is not None and isinstance(item, (numpy.ndarray, numpy.integer)):
+            yield item
+
+        else:
+            yield item.get(output=int)
+
+
+def _words(chunk, schema):
+
+    """
+    Will turn a chunk into a uint64 matrix cut to the schema
+    """
+
+    matrix = as_word_matrix(chunk, schema.words) if isinstance(chunk, list) else chunk
+
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(-1, 1)
+
+    return numpy.ascontiguousarray(matrix & to_words(schema.full_mask, schema.words), dtype='<u8')
+
+
+def _analyze_chunk(matrix, width, pairs):
+
+    """
+    Will count a uint64 matrix
+
+    :return: a tuple of counts, pairs and a histogram as numpy arrays
+    :rtype: tuple
+    """
+
+    data = matrix.view(numpy.uint8).reshape(matrix.shape[0], -1)
+
+    histogram = numpy.bincount(BYTE_POPCOUNT[data].sum(axis=1, dtype=numpy.int64), minlength=width + 1)
+    bits = numpy.unpackbits(data, axis=1, bitorder='little')[:, :width]
+
+    counts = bits.sum(axis=0, dtype=numpy.int64)
+
+    if pairs:
+
+        pairs = numpy.zeros((width, width), dtype=numpy.int64)
+
+        # float32 products go to BLAS and are exact up to EXACT_ROWS rows, longer chunks are added up in int64
+        for start in range(0, bits.shape[0], EXACT_ROWS):
+            block = bits[start:start + EXACT_ROWS].astype(numpy.float32)
+            pairs += numpy.dot(block.T, block).astype(numpy.int64)
+
+    else:
+        pairs = None
+
+    return counts, pairs, histogram
+
+
+def _analyze_python(chunk, schema, counts, pairs, histogram):
+
+    full_mask = schema.full_mask
+
+    for mask in chunk:
+
+        positions = list(iter_positions(int(mask) & full_mask))
+        histogram[len(positions)] += 1
+
+        for x, position in enumerate(positions):
+
+            counts[position] += 1
+
+            if pairs is not None:
+
+                row = pairs[position]
+
+                for other in positions[x:]:
+                    row[other] += 1
+
+
+def analyze(masks, schema, pairs=True, chunk_size=CHUNK_SIZE):
+
+    """
+    Will count flags, pairs of flags and set flags per mask over a population
+
+    :param masks: an iterable of ints or BitnFly like objects, a uint64 array or an iterable of uint64 arrays
+    :type masks: iterable or numpy.ndarray
+    :param schema: a schema of the masks
+    :type schema: FlagSchema
+    :param pairs: count the pairs of flags, they cost len(schema) ** 2 counters
+    :type pairs: bool
+    :param chunk_size: masks per chunk
+    :type chunk_size: int
+    :return: stats
+    :rtype: FlagStats
+    """
+
+    width = len(schema)
+
+    if numpy is not None and isinstance(masks, numpy.ndarray):
+        parts = chunks(masks, chunk_size)
+
+    else:
+        parts = chunks(_masks(masks), chunk_size)
+
+    if numpy is None:
+
+        total, counts, histogram = 0, [0] * width, [0] * (width + 1)
+        matrix = [[0] * width for _ in range(width)] if pairs else None
+
+        for chunk in parts:
+            _analyze_python(chunk, schema, counts, matrix, histogram)
+            total += len(chunk)
+
+        if matrix is not None:
+            for x in range(width):
+                for y in range(x):
+                    matrix[x][y] = matrix[y][x]
+
+        return FlagStats(schema, total, counts, matrix, histogram)
+
+    total = 0
+    counts = numpy.zeros(width, dtype=numpy.int64)
+    histogram = numpy.zeros(width + 1, dtype=numpy.int64)
+    matrix = numpy.zeros((width, width), dtype=numpy.int64) if pairs else None
+
+    for chunk in parts:
+
+        chunk_counts, chunk_pairs, chunk_histogram = _analyze_chunk(_words(chunk, schema), width, pairs)
+
+        total += len(chunk)
+        counts += chunk_counts
+        histogram += chunk_histogram
+
+        if pairs:
+            matrix += chunk_pairs
+
+    return FlagStats(schema, total, counts.tolist(), matrix, histogram.tolist())
+
+
+def analyze_file(fp, schema, pairs=True, chunk_size=CHUNK_SIZE):
+
+    """
+    Will analyze a stream written by the codec, reading a chunk at a time
+
+    :param fp: a binary file object
+    :type fp: file
+    :param schema: a schema of the masks
+    :type schema: FlagSchema
+    :param pairs: count the pairs of flags
+    :type pairs: bool
+    :param chunk_size: masks per chunk
+    :type chunk_size: int
+    :return: stats
+    :rtype: FlagStats
+    """
+
+    decoder = Decoder(fp, schema)
+    read = decoder.read_array if numpy is not None else decoder.read
+
+    def read_chunks():
+
+        while True:
+
+            chunk = read(chunk_size)
+
+            if not len(chunk):
+                return
+
+            yield chunk
+
+    return analyze(read_chunks(), schema, pairs, chunk_size)
+
+
+def flag_counts(masks, schema, chunk_size=CHUNK_SIZE):
+
+    """
+    Will count the masks per flag
+
+    :param masks: see analyze
+    :type masks: iterable or numpy.ndarray
+    :param schema: a schema of the masks
+    :type schema: FlagSchema
+    :param chunk_size: masks per chunk
+    :type chunk_size: int
+    :return: a dict name -> count
+    :rtype: dict
+    """
+
+    return analyze(masks, schema, False, chunk_size).as_dict()
+
+
+__all__ = [
+    'FlagStats',
+    'analyze',
+    'analyze_file',
+    'flag_counts',
+]
@@ -0,0 +1,542 @@
+"""
+A module with BitnFlyArray - a column of BitnFly states backed by NumPy
+"""
+
+from BitnFly.api.instrument import instrumented
+from BitnFly.api.schema import FlagSchema
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+
+
+def to_words(mask, words):
+
+    """
+    Will split a mask into 64 bit words, the lowest word first
+
+    :param mask: a mask
+    :type mask: int
+    :param words: number of words
+    :type words: int
+    :return: a uint64 array with shape (words,)
+    :rtype: numpy.ndarray
+    """
+
+    return numpy.array(
+        [(mask >> (WORD_BITS * x)) & WORD_MASK for x in range(words)], dtype=numpy.uint64
+    )
+
+
+def from_words(row):
+
+    """
+    Will join 64 bit words, the lowest word first, into a mask
+
+    :param row: a sequence of words
+    :type row: numpy.ndarray
+    :return: a mask
+    :rtype: int
+    """
+
+    mask = 0x0
+
+    for x, word in enumerate(row.tolist()):
+        mask |= word << (WORD_BITS * x)
+
+    return mask
+
+
+def as_word_matrix(masks, words):
+
+    """
+    Will convert masks into a uint64 matrix with shape (len(masks), words)
+
+    :param masks: a list of ints, a 1-D uint64 array (one word only) or a 2-D array
+    :type masks: list or numpy.ndarray
+    :param words: number of words
+    :type words: int
+    :return: a new uint64 matrix
+    :rtype: numpy.ndarray
+    """
+
+    if isinstance(masks, numpy.ndarray):
+
+        matrix = masks.reshape(-1, 1) if masks.ndim == 1 else masks
+        assert matrix.shape[1] == words, 'masks must have {} words per row'.format(words)
+
+        return numpy.array(matrix, dtype=numpy.uint64)
+
+    if words == 1:
+        return numpy.array(masks, dtype=numpy.uint64).reshape(-1, 1)
+
+    return numpy.array(
+        [[(mask >> (WORD_BITS * x)) & WORD_MASK for x in range(words)] for mask in masks],
+        dtype=numpy.uint64
+    ).reshape(-1, words)
+
+
+class BitnFlyArray(object):
+
+    """
+    A BitnFlyArray - many BitnFly states sharing one schema.
+
+    Flags and swap masks are kept in uint64 matrices with one row per
+    state and schema.words columns, so every operation is one vectorized
+    pass over all rows.
+    """
+
+    def __init__(self, options, size=0, masks=None, **kwargs):
+
+        """
+        The constructor will configure all needed arrays
+
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        :param size: number of rows, used when masks is not given
+        :type size: int
+        :param masks: initial flags per row, they are also restored by reset
+        :type masks: list or numpy.ndarray
+        :param kwargs: a possible key is a 'mask' - initial flags of every row, as in BitnFly
+        :type kwargs: dict
+        """
+
+        if numpy is None:
+            raise ImportError('BitnFlyArray requires numpy')
+
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        self.__schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        self.__words = self.__schema.words
+        self.__full = to_words(self.__schema.full_mask, self.__words)
+
+        if masks is not None:
+            self.__initial = as_word_matrix(masks, self.__words)
+
+        else:
+            mask = kwargs.get('mask', None)
+            initial = self.__schema.full_mask if mask is None else mask
+
+            self.__initial = numpy.tile(to_words(initial, self.__words), (size, 1))
+
+        self.__opt_flags = None
+        self.__flags_swap_mask = None
+        self.__switch_state = None
+        self.__checkpoint = None
+
+        self._init()
+
+        if self.__schema.recorder is not None:
+            self.__class__ = instrumented(self.__class__)
+
+    def __len__(self):
+        return self.__opt_flags.shape[0]
+
+    def __and__(self, other):
+
+        """
+        A bitwise operator &
+
+        :param other: can be an int, a str or a list of them
+        :type other: int, str, list
+        :return: per row True if other is set, or implied by a set flag, otherwise False
+        :rtype: numpy.ndarray
+        """
+
+        mask = self.__schema.implied_by_mask(other if isinstance(other, int) else self.__schema.mask_of(other))
+
+        return numpy.any(
+            self.__opt_flags & to_words(mask & self.__schema.full_mask, self.__words), axis=1
+        )
+
+    def __or__(self, other):
+
+        """
+        A bitwise operator |
+
+        :param other: can be an int, a str, a list of int or a list of str,
+            or an array with a mask per row
+        :type other: int, str, list, numpy.ndarray
+        :return: self
+        :rtype: self
+        """
+
+        words = self._words(other, '__or__')
+
+        self.__opt_flags |= words
+        self.__flags_swap_mask |= words
+
+        return self
+
+    def __xor__(self, other):
+
+        """
+        A bitwise operator ^. Will turn on or off all bits in self with mask other
+
+        :param other: can be an int, a str, a list of int or a list of str,
+            or an array with a mask per row
+        :type other: int, str, list, numpy.ndarray
+        :return: self
+        :rtype: self
+        """
+
+        return self.flip(other)
+
+    def __repr__(self):
+
+        return '{}({} rows, {} flags)'.format(
+            self.__class__.__name__, len(self), len(self.__schema)
+        )
+
+    def _words(self, bits, operation):
+
+        """
+        Will turn a flag argument into words, which can be broadcast against the rows
+
+        :param bits: a flag argument or an array with a mask per row
+        :type bits: int, str, list, numpy.ndarray
+        :param operation: '__xor__' or '__or__'
+        :type operation: str
+        :return: an uint64 array with shape (words,) or (rows, words)
+        :rtype: numpy.ndarray
+        """
+
+        if isinstance(bits, numpy.ndarray):
+
+            matrix = as_word_matrix(bits, self.__words) & self.__full
+
+            if operation == '__or__':
+
+                for position, implied in self.__schema.implied.items():
+
+                    rows = (matrix[:, position // WORD_BITS] >> numpy.uint64(position % WORD_BITS)) & numpy.uint64(1)
+                    matrix[rows.astype(bool)] |= to_words(implied, self.__words)
+
+            return matrix
+
+        mask = self.__schema.or_mask(bits) if operation == '__or__' else self.__schema.mask_of(bits, operation)
+
+        return to_words(mask, self.__words)
+
+    def _view(self, matrix):
+
+        """
+        Will return a read only view - a 1-D array for one word schemas
+
+        :param matrix: a words matrix
+        :type matrix: numpy.ndarray
+        :return: a read only view
+        :rtype: numpy.ndarray
+        """
+
+        view = matrix[:, 0] if self.__words == 1 else matrix[:]
+        view.flags.writeable = False
+
+        return view
+
+    def _init(self):
+
+        """
+        Will initialize the bits and the swap masks, as in BitnFly the switch states are kept
+
+        :return: a tuple of current bits and swap masks
+        :rtype: tuple
+        """
+
+        rows = self.__initial.shape[0]
+
+        self.__opt_flags = self.__initial.copy()
+        self.__flags_swap_mask = numpy.tile(self.__full, (rows, 1))
+
+        if self.__switch_state is None:
+            self.__switch_state = numpy.ones(rows, dtype=bool)
+
+        return self.__opt_flags, self.__flags_swap_mask
+
+    def flip(self, bits):
+
+        """
+        Will flip bit or bits to opposite side in every row
+
+        :param bits: can be an int, a str, a list of int or a list of str,
+            or an array with a mask per row
+        :type bits: int, str, list, numpy.ndarray
+        :return: object it self
+        :rtype: object
+        """
+
+        words = self._words(bits, '__xor__')
+
+        self.__opt_flags ^= words
+        self.__flags_swap_mask ^= words
+
+        return self
+
+    def set_range(self, start, stop):
+
+        """
+        Will set the flags at positions start to stop - 1 in every row, as | does
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        words = to_words(self.__schema.range_mask(start, stop), self.__words)
+
+        self.__opt_flags |= words
+        self.__flags_swap_mask |= words
+
+        return self
+
+    def clear_range(self, start, stop):
+
+        """
+        Will flip the set flags at positions start to stop - 1 in every row, so all of them are cleared
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        words = self.__opt_flags & to_words(self.__schema.range_mask(start, stop), self.__words)
+
+        self.__opt_flags ^= words
+        self.__flags_swap_mask ^= words
+
+        return self
+
+    def flip_range(self, start, stop):
+
+        """
+        Will flip the flags at positions start to stop - 1 in every row
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        words = to_words(self.__schema.range_mask(start, stop), self.__words)
+
+        self.__opt_flags ^= words
+        self.__flags_swap_mask ^= words
+
+        return self
+
+    def off(self):
+
+        """
+        Will turn off all bits of every row, according to its swap mask
+
+        :return: object it self
+        :rtype: object
+        """
+
+        self.__opt_flags &= ~self.__flags_swap_mask
+        self.__switch_state[:] = False
+
+        return self
+
+    def on(self):
+
+        """
+        Will turn on all flags of the rows, which are switched off, according to their swap masks
+
+        :return: object it self
+        :rtype: object
+        """
+
+        rows = ~self.__switch_state
+
+        self.__opt_flags[rows] ^= self.__flags_swap_mask[rows]
+        self.__switch_state[:] = True
+
+        return self
+
+    def reset(self):
+
+        """
+        Reset all rows to their initial values
+
+        :return: object it's self
+        :rtype: object
+        """
+
+        self._init()
+        return self
+
+    def checkpoint(self):
+
+        """
+        Will start tracking changes of all rows from their current states, see BitnFly.checkpoint
+
+        :return: object it self
+        :rtype: object
+        """
+
+        self.__checkpoint = (self.__opt_flags.copy(), self.__flags_swap_mask.copy(), self.__switch_state.copy())
+        return self
+
+    def drain(self):
+
+        """
+        Will return the changes of the rows since the last checkpoint and checkpoint again.
+        The changed rows are found in one vectorized pass, deltas are built for them only
+
+        :return: a dict row -> FlagDelta
+        :rtype: dict
+        """
+
+        # the codec, which deltas are encoded with, imports this module
+        from BitnFly.api.delta import FlagDelta
+
+        assert self.__checkpoint is not None, 'changes are tracked after a checkpoint'
+
+        flags, swap_mask, switch_state = self.__checkpoint
+
+        flags ^= self.__opt_flags
+        swap_mask ^= self.__flags_swap_mask
+        switched = switch_state != self.__switch_state
+
+        rows = numpy.flatnonzero(numpy.any(flags, axis=1) | numpy.any(swap_mask, axis=1) | switched)
+        deltas = {}
+
+        for row in rows.tolist():
+
+            deltas[row] = FlagDelta(
+                from_words(flags[row]),
+                from_words(swap_mask[row]),
+                bool(self.__switch_state[row]) if switched[row] else None
+            )
+
+        self.checkpoint()
+        return deltas
+
+    def apply_deltas(self, deltas):
+
+        """
+        Will apply deltas of rows, eg. drained from a replica
+
+        :param deltas: a dict row -> FlagDelta
+        :type deltas: dict
+        :return: object it self
+        :rtype: object
+        """
+
+        for row, delta in deltas.items():
+
+            self.__opt_flags[row] ^= to_words(delta.flags, self.__words)
+            self.__flags_swap_mask[row] ^= to_words(delta.swap_mask, self.__words)
+
+            if delta.switch_state is not None:
+                self.__switch_state[row] = delta.switch_state
+
+        return self
+
+    def migrate(self, migration):
+
+        """
+        Will return a copy of the rows in the new schema of a migration. Flags, swap masks
+        and the masks restored by reset are remapped, switch states are kept, see SchemaMigration.migrate
+
+        :param migration: a migration from the schema of this array
+        :type migration: SchemaMigration
+        :return: a new array
+        :rtype: BitnFlyArray
+        """
+
+        assert migration.old.fingerprint == self.__schema.fingerprint, 'a migration must start from this schema'
+
+        result = BitnFlyArray(migration.new, masks=migration.remap_array(self.__initial))
+
+        words = result.__words
+        defaults = to_words(migration.defaults, words)
+
+        # the swap bits of inserted flags are set as in a new array, and the defaults are clear while switched off
+        swap = as_word_matrix(migration.remap_array(self.__flags_swap_mask), words)
+
+        result.__opt_flags = as_word_matrix(migration.remap_array(self.__opt_flags), words)
+        result.__flags_swap_mask = swap & ~defaults | to_words(migration.inserted_mask, words)
+        result.__switch_state = self.__switch_state.copy()
+        result.__opt_flags[~result.__switch_state] &= ~defaults
+
+        return result
+
+    def get(self, bit=None):
+
+        """
+        Will return the flags of all rows, if arg bit is None, otherwise
+        the flags masked with bit
+
+        :param bit:
+        :type bit: str or int
+        :return: a read only uint64 array, 1-D for schemas up to 64 flags, otherwise (rows, words)
+        :rtype: numpy.ndarray
+        """
+
+        if bit is None:
+            return self._view(self.__opt_flags)
+
+        elif isinstance(bit, int):
+            mask = bit if self.__schema.is_bit(bit) else 0x0
+
+        elif isinstance(bit, str):
+            mask = self.__schema.mask_of(bit)
+
+        else:
+            raise TypeError('A bit argument can be int or a str')
+
+        return self._view(self.__opt_flags & to_words(mask, self.__words))
+
+    def mask(self):
+        """
+        Will return the current swap masks
+        :return: a read only uint64 array
+        :rtype: numpy.ndarray
+        """
+        return self._view(self.__flags_swap_mask)
+
+    def flags(self):
+        """
+        Will return all flags in ordered dict
+        :return:
+        :rtype:
+        """
+        return self.__schema.options
+
+    def schema(self):
+        """
+        Will return the shared schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
+    def to_ints(self):
+        """
+        Will return the flags of all rows as python ints
+        :return:
+        :rtype: list
+        """
+        if self.__words == 1:
+            return self.__opt_flags[:, 0].tolist()
+
+        return [from_words(row) for row in self.__opt_flags]
+
+
+__all__ = [
+    'BitnFlyArray',
+]
@@ -0,0 +1,382 @@
+"""
+A module with a compressed bitmap of non negative ints, in the spirit of roaring bitmaps.
+
+Values are split by their high 16 bits into chunks. A chunk with few
+values keeps them in a sorted array of the low 16 bits, a dense chunk
+keeps them as a 65536 bit int.
+"""
+
+from array import array
+from bisect import bisect_left
+
+ARRAY_LIMIT = 4096
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8
+
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # pragma: no cover
+    def popcount(value):
+        return bin(value).count('1')
+
+
+def iter_positions(mask):
+
+    """
+    Will iterate the positions of set bits in ascending order, in one pass over the bytes of mask
+
+    :param mask: a non negative int
+    :type mask: int
+    :return: a generator of positions
+    :rtype: generator
+    """
+
+    for index, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = index << 3
+
+            for bit in BYTE_BITS[byte]:
+                yield base | bit
+
+
+def _cardinality(container):
+    return popcount(container) if isinstance(container, int) else len(container)
+
+
+def _iter_container(container):
+
+    """
+    Will iterate the low values of a container in ascending order
+
+    :param container: an array or a bitset
+    :type container: array or int
+    :return: a generator of ints
+    :rtype: generator
+    """
+
+    if not isinstance(container, int):
+        for value in container:
+            yield value
+
+        return
+
+    for index, byte in enumerate(container.to_bytes(CHUNK_BYTES, 'little')):
+        if byte:
+            base = index << 3
+
+            for bit in BYTE_BITS[byte]:
+                yield base | bit
+
+
+def _copy(container):
+    return container if isinstance(container, int) else array('H', container)
+
+
+def _to_bitset(container):
+
+    if isinstance(container, int):
+        return container
+
+    bitset = 0x0
+
+    for value in container:
+        bitset |= 1 << value
+
+    return bitset
+
+
+def _normalize(container):
+
+    """
+    Will choose the smaller representation of a container, None if it is empty
+
+    :param container: an array, a bitset or a sorted iterable of low values
+    :type container: array, int or list
+    :return: a container or None
+    :rtype: array or int or None
+    """
+
+    if isinstance(container, int):
+
+        count = popcount(container)
+
+        if count == 0:
+            return None
+
+        if count <= ARRAY_LIMIT:
+            return array('H', _iter_container(container))
+
+        return container
+
+    if not container:
+        return None
+
+    if len(container) > ARRAY_LIMIT:
+        return _to_bitset(container)
+
+    return container if isinstance(container, array) else array('H', container)
+
+
+def _and(left, right):
+
+    if isinstance(left, int) and isinstance(right, int):
+        return _normalize(left & right)
+
+    if isinstance(left, int):
+        left, right = right, left
+
+    if isinstance(right, int):
+        return _normalize([value for value in left if right >> value & 1])
+
+    if len(left) > len(right):
+        left, right = right, left
+
+    other = set(right)
+    return _normalize([value for value in left if value in other])
+
+
+def _or(left, right):
+
+    if isinstance(left, int) or isinstance(right, int):
+        return _normalize(_to_bitset(left) | _to_bitset(right))
+
+    return _normalize(sorted(set(left).union(right)))
+
+
+def _sub(left, right):
+
+    if isinstance(left, int):
+        return _normalize(left & ~_to_bitset(right))
+
+    if isinstance(right, int):
+        return _normalize([value for value in left if not right >> value & 1])
+
+    other = set(right)
+    return _normalize([value for value in left if value not in other])
+
+
+class Bitmap(object):
+
+    """
+    A Bitmap - a compressed set of non negative ints below 2 ** 32
+    """
+
+    def __init__(self, values=()):
+
+        """
+        :param values: initial values
+        :type values: iterable
+        """
+
+        self.__chunks = {}
+
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def _from_chunks(cls, chunks):
+
+        bitmap = cls()
+        bitmap.__chunks = chunks
+
+        return bitmap
+
+    def __len__(self):
+        return sum(_cardinality(container) for container in self.__chunks.values())
+
+    def __bool__(self):
+        return bool(self.__chunks)
+
+    def __contains__(self, value):
+
+        container = self.__chunks.get(value >> CHUNK_BITS)
+
+        if container is None:
+            return False
+
+        low = value & CHUNK_MASK
+
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __iter__(self):
+
+        for key in sorted(self.__chunks):
+
+            base = key << CHUNK_BITS
+
+            for low in _iter_container(self.__chunks[key]):
+                yield base | low
+
+    def __eq__(self, other):
+        return isinstance(other, Bitmap) and list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+
+        return '{}({})'.format(self.__class__.__name__, list(self))
+
+    def __and__(self, other):
+
+        """
+        An intersection, only chunks present in both bitmaps are visited
+
+        :param other: a bitmap
+        :type other: Bitmap
+        :return: a new bitmap
+        :rtype: Bitmap
+        """
+
+        chunks, others = self.__chunks, other.__chunks
+
+        if len(chunks) > len(others):
+            chunks, others = others, chunks
+
+        result = {}
+
+        for key, container in chunks.items():
+
+            if key in others:
+
+                merged = _and(container, others[key])
+
+                if merged is not None:
+                    result[key] = merged
+
+        return self._from_chunks(result)
+
+    def __or__(self, other):
+
+        """
+        A union
+
+        :param other: a bitmap
+        :type other: Bitmap
+        :return: a new bitmap
+        :rtype: Bitmap
+        """
+
+        result = dict((key, _copy(container)) for key, container in self.__chunks.items())
+
+        for key, container in other.__chunks.items():
+            result[key] = _copy(container) if key not in result else _or(result[key], container)
+
+        return self._from_chunks(result)
+
+    def __sub__(self, other):
+
+        """
+        A difference, only chunks of self are visited
+
+        :param other: a bitmap
+        :type other: Bitmap
+        :return: a new bitmap
+        :rtype: Bitmap
+        """
+
+        result = {}
+        others = other.__chunks
+
+        for key, container in self.__chunks.items():
+
+            merged = _copy(container) if key not in others else _sub(container, others[key])
+
+            if merged is not None:
+                result[key] = merged
+
+        return self._from_chunks(result)
+
+    def add(self, value):
+
+        """
+        Will add a value
+
+        :param value: an int in [0, 2 ** 32)
+        :type value: int
+        :return: void
+        :rtype: void
+        """
+
+        assert 0 <= value >> CHUNK_BITS <= CHUNK_MASK, 'a value must be in [0, 2 ** 32)'
+
+        key, low = value >> CHUNK_BITS, value & CHUNK_MASK
+        container = self.__chunks.get(key)
+
+        if container is None:
+            self.__chunks[key] = array('H', [low])
+
+        elif isinstance(container, int):
+            self.__chunks[key] = container | 1 << low
+
+        else:
+
+            index = bisect_left(container, low)
+
+            if index < len(container) and container[index] == low:
+                return
+
+            container.insert(index, low)
+
+            if len(container) > ARRAY_LIMIT:
+                self.__chunks[key] = _to_bitset(container)
+
+    def discard(self, value):
+
+        """
+        Will remove a value if it is present
+
+        :param value: an int
+        :type value: int
+        :return: void
+        :rtype: void
+        """
+
+        key, low = value >> CHUNK_BITS, value & CHUNK_MASK
+        container = self.__chunks.get(key)
+
+        if container is None:
+            return
+
+        if isinstance(container, int):
+            container = _normalize(container & ~(1 << low))
+
+        else:
+
+            index = bisect_left(container, low)
+
+            if index < len(container) and container[index] == low:
+                del container[index]
+
+            container = container or None
+
+        if container is None:
+            del self.__chunks[key]
+
+        else:
+            self.__chunks[key] = container
+
+    def copy(self):
+        """
+        Will return an independent copy
+        :return:
+        :rtype: Bitmap
+        """
+        return self._from_chunks(
+            dict((key, _copy(container)) for key, container in self.__chunks.items())
+        )
+
+
+__all__ = [
+    'Bitmap',
+    'iter_positions',
+]
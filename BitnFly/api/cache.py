@@ -0,0 +1,86 @@
+"""
+A module with a small bounded cache
+"""
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    """
+    A LRUCache - a dictionary which keeps at most size entries
+    and evicts the least recently used one first
+    """
+
+    def __init__(self, size=256):
+
+        """
+        :param size: max number of entries
+        :type size: int
+        """
+
+        assert size > 0, 'a size must be positive'
+
+        self.size = size
+        self.__data = OrderedDict()
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def get(self, key, default=None):
+
+        """
+        Will return a cached value and mark it as the most recently used
+
+        :param key: a hashable key
+        :type key: object
+        :param default: returned when key is not cached
+        :type default: object
+        :return: the value
+        :rtype: object
+        """
+
+        try:
+            self.__data.move_to_end(key)
+
+        except KeyError:
+            return default
+
+        return self.__data[key]
+
+    def put(self, key, value):
+
+        """
+        Will cache a value, evicting the least recently used one if full
+
+        :param key: a hashable key
+        :type key: object
+        :param value: a value
+        :type value: object
+        :return: the value
+        :rtype: object
+        """
+
+        self.__data.pop(key, None)
+        self.__data[key] = value
+
+        if len(self.__data) > self.size:
+            self.__data.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        """
+        Will drop all entries
+        :return:
+        :rtype:
+        """
+        self.__data.clear()
+
+
+__all__ = [
+    'LRUCache',
+]
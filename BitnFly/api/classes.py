@@ -0,0 +1,128 @@
+"""
+A module with make_class - a factory of BitnFly subclasses bound to one schema,
+in the spirit of collections.namedtuple.
+
+A generated class has no instance dictionary, its option constants are
+class attributes and, when asked for, every option gets an is_<name>
+property and a set_<name> method, which test and set a precomputed mask.
+"""
+
+import sys
+
+from BitnFly.api.schema import FlagSchema
+
+
+def _is(test_mask, direct):
+
+    if direct:
+        def is_set(self):
+            return bool(self._BitnFly__opt_flags & test_mask)
+
+    else:
+        def is_set(self):
+            return bool(self.get(output=int) & test_mask)
+
+    return property(is_set)
+
+
+def _set(name, mask, direct):
+
+    if direct:
+        def set_flag(self):
+
+            self._BitnFly__opt_flags |= mask
+            self._BitnFly__flags_swap_mask |= mask
+
+            return self
+
+    else:
+        def set_flag(self):
+            return self | name
+
+    return set_flag
+
+
+def caller_module(depth=1):
+
+    """
+    Will return the name of the module calling the function which calls this one, as namedtuple finds it
+
+    :param depth: frames to go up from the calling function
+    :type depth: int
+    :return: a module name, __main__ when it can not be found
+    :rtype: str
+    """
+
+    try:
+        return sys._getframe(depth + 1).f_globals.get('__name__', '__main__')
+    except (AttributeError, ValueError):  # pragma: no cover
+        return '__main__'
+
+
+def make_class(typename, options, properties=False, base=None, module=None, **kwargs):
+
+    """
+    Will generate a class of objects of one schema
+
+    :param typename: a class name
+    :type typename: str
+    :param options: list of strings or a FlagSchema
+    :type options: list or FlagSchema
+    :param properties: add is_<name> properties and set_<name> methods
+    :type properties: bool
+    :param base: a class taking a schema as its first argument, BitnFly by default
+    :type base: type
+    :param module: the __module__ of the class, by default the caller's, so that instances can be pickled
+        when the class is a global of that module
+    :type module: str
+    :param kwargs: passed to FlagSchema, when options is a list
+    :type kwargs: dict
+    :return: a new class, its constructor takes the keyword arguments of base
+    :rtype: type
+    """
+
+    from BitnFly.api import BitnFly
+
+    base = base or BitnFly
+
+    # the flags of a BitnFly are read and written in place, other bases go through their methods
+    direct = issubclass(base, BitnFly) and base.__or__ is BitnFly.__or__ and base.get is BitnFly.get
+
+    schema = options if isinstance(options, FlagSchema) else FlagSchema(options, **kwargs)
+
+    def init(self, **kwargs):
+        base.__init__(self, schema, **kwargs)
+
+    namespace = {
+        '__module__': module or caller_module(),
+        '__slots__': (),
+        '__init__': init,
+        '__doc__': '{}({})'.format(typename, ', '.join(name.lower() for name in schema.names)),
+        'schema_': schema,
+    }
+
+    attributes = {}
+
+    for name in schema.names:
+
+        position = schema.position(name)
+        attributes[name] = 1 << position
+
+        if properties and name.lower().isidentifier():
+
+            attributes['is_' + name.lower()] = _is(schema.implied_by.get(position, 1 << position), direct)
+            attributes['set_' + name.lower()] = _set(name, schema.or_mask(name), direct)
+
+    for attribute in attributes:
+
+        if hasattr(base, attribute):
+            raise ValueError('{!r} would hide {}.{}'.format(attribute, base.__name__, attribute))
+
+    namespace.update(attributes)
+
+    return type(typename, (base,), namespace)
+
+
+__all__ = [
+    'make_class',
+]
@@ -0,0 +1,532 @@
+"""
+A module with a compact binary format for flag masks.
+
+A stream starts with a 16 bytes header::
+
+    magic b'BNFC' | version u8 | encoding u8 | reserved u16 | schema fingerprint 8 bytes
+
+followed by one record per mask. DENSE records are the mask in
+mask_bytes(schema) little endian bytes, SPARSE records are a varint count of
+set bits followed by varint deltas of their positions, AUTO records are a
+one byte tag (DENSE or SPARSE) followed by the smaller of the two.
+
+Encoder and Decoder work on file objects with a bounded buffer, so
+populations of any size can be streamed.
+"""
+
+import struct
+
+from BitnFly.api.array import as_word_matrix, to_words
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+MAGIC = b'BNFC'
+VERSION = 1
+
+HEADER = struct.Struct('<4sBBH8s')
+
+DENSE = 0
+SPARSE = 1
+AUTO = 2
+
+ENCODINGS = {'dense': DENSE, 'sparse': SPARSE, 'auto': AUTO}
+
+BUFFER_SIZE = 1 << 20
+
+
+def mask_bytes(schema):
+
+    """
+    Will return the size of a dense record
+
+    :param schema: a schema
+    :type schema: FlagSchema
+    :return: bytes
+    :rtype: int
+    """
+
+    return max(1, (schema.full_mask.bit_length() + 7) // 8)
+
+
+def write_varint(out, value):
+
+    """
+    Will append an unsigned LEB128 varint
+
+    :param out: a buffer
+    :type out: bytearray
+    :param value: a non negative int
+    :type value: int
+    :return: void
+    :rtype: void
+    """
+
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+
+    out.append(value)
+
+
+def sparse_record(mask):
+
+    """
+    Will encode a mask as a varint count and varint deltas of set bit positions
+
+    :param mask: a mask
+    :type mask: int
+    :return: a record
+    :rtype: bytearray
+    """
+
+    positions, last = [], 0
+
+    while mask:
+
+        low = mask & -mask
+        position = low.bit_length() - 1
+        mask ^= low
+
+        positions.append(position - last)
+        last = position
+
+    out = bytearray()
+    write_varint(out, len(positions))
+
+    for delta in positions:
+        write_varint(out, delta)
+
+    return out
+
+
+def read_varint(data, pos):
+
+    """
+    Will read an unsigned LEB128 varint from a buffer
+
+    :param data: a buffer
+    :type data: bytes
+    :param pos: an offset of the varint
+    :type pos: int
+    :return: a tuple of the value and the offset after it
+    :rtype: tuple
+    """
+
+    value = shift = 0
+
+    while True:
+
+        if pos >= len(data):
+            raise ValueError('a varint is truncated')
+
+        byte = data[pos]
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        pos += 1
+
+        if byte < 0x80:
+            return value, pos
+
+
+def read_sparse(data, pos):
+
+    """
+    Will read a record written by sparse_record from a buffer
+
+    :param data: a buffer
+    :type data: bytes
+    :param pos: an offset of the record
+    :type pos: int
+    :return: a tuple of the mask and the offset after it
+    :rtype: tuple
+    """
+
+    count, pos = read_varint(data, pos)
+    mask = position = 0
+
+    for _ in range(count):
+        delta, pos = read_varint(data, pos)
+        position += delta
+        mask |= 1 << position
+
+    return mask, pos
+
+
+class Encoder(object):
+
+    """
+    An Encoder - writes masks into a binary stream
+    """
+
+    def __init__(self, fp, schema, encoding='dense', buffer_size=BUFFER_SIZE):
+
+        """
+        Will write the header
+
+        :param fp: a binary file object
+        :type fp: file
+        :param schema: a schema of the masks
+        :type schema: FlagSchema
+        :param encoding: 'dense', 'sparse' or 'auto'
+        :type encoding: str
+        :param buffer_size: bytes buffered before they are written
+        :type buffer_size: int
+        """
+
+        assert encoding in ENCODINGS, 'an encoding must be one of {}'.format(sorted(ENCODINGS))
+
+        self.__fp = fp
+        self.__schema = schema
+        self.__encoding = ENCODINGS[encoding]
+        self.__nbytes = mask_bytes(schema)
+        self.__buffer_size = buffer_size
+        self.__buffer = bytearray()
+
+        fp.write(HEADER.pack(MAGIC, VERSION, self.__encoding, 0, schema.fingerprint))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def _record(self, mask):
+
+        if self.__encoding == DENSE:
+            return mask.to_bytes(self.__nbytes, 'little')
+
+        sparse = sparse_record(mask)
+
+        if self.__encoding == SPARSE:
+            return sparse
+
+        if len(sparse) < self.__nbytes:
+            return bytearray((SPARSE,)) + sparse
+
+        return bytearray((DENSE,)) + mask.to_bytes(self.__nbytes, 'little')
+
+    def write(self, mask):
+
+        """
+        Will encode one mask
+
+        :param mask: a mask
+        :type mask: int
+        :return: void
+        :rtype: void
+        """
+
+        self.__buffer += self._record(mask & self.__schema.full_mask)
+
+        if len(self.__buffer) >= self.__buffer_size:
+            self.flush()
+
+    def write_many(self, masks):
+
+        """
+        Will encode many masks, a uint64 array is written in one pass when encoding is dense
+
+        :param masks: an iterable of ints or a uint64 array as used by BitnFlyArray
+        :type masks: iterable or numpy.ndarray
+        :return: void
+        :rtype: void
+        """
+
+        if numpy is not None and isinstance(masks, numpy.ndarray):
+
+            if self.__encoding == DENSE:
+
+                self.flush()
+
+                words = self.__schema.words
+
+                matrix = as_word_matrix(masks, words)
+                matrix &= to_words(self.__schema.full_mask, words)
+
+                matrix = matrix.astype('<u8')
+                data = matrix.view(numpy.uint8).reshape(matrix.shape[0], -1)[:, :self.__nbytes]
+
+                self.__fp.write(data.tobytes())
+                return
+
+            masks = masks.tolist() if masks.ndim == 1 else (
+                int.from_bytes(row.astype('<u8').tobytes(), 'little') for row in masks
+            )
+
+        for mask in masks:
+            self.write(mask)
+
+    def flush(self):
+        """
+        Will write the buffered records
+        :return:
+        :rtype:
+        """
+        if self.__buffer:
+            self.__fp.write(bytes(self.__buffer))
+            self.__buffer = bytearray()
+
+
+class Decoder(object):
+
+    """
+    A Decoder - reads masks from a binary stream written by an Encoder
+    """
+
+    def __init__(self, fp, schema, buffer_size=BUFFER_SIZE):
+
+        """
+        Will read and check the header
+
+        :param fp: a binary file object
+        :type fp: file
+        :param schema: a schema of the masks, it must match the stream
+        :type schema: FlagSchema
+        :param buffer_size: bytes read at once
+        :type buffer_size: int
+        """
+
+        self.__fp = fp
+        self.__schema = schema
+        self.__nbytes = mask_bytes(schema)
+        self.__buffer_size = buffer_size
+        self.__data = b''
+        self.__pos = 0
+
+        header = fp.read(HEADER.size)
+
+        if len(header) < HEADER.size:
+            raise ValueError('a stream is too short')
+
+        magic, version, encoding, _, fingerprint = HEADER.unpack(header)
+
+        if magic != MAGIC or version != VERSION or encoding not in ENCODINGS.values():
+            raise ValueError('a stream is not a flag stream')
+
+        if fingerprint != schema.fingerprint:
+            raise ValueError('a stream was written with another schema')
+
+        self.encoding = encoding
+
+    def __iter__(self):
+
+        while True:
+
+            mask = self.read_one()
+
+            if mask is None:
+                return
+
+            yield mask
+
+    def _ensure(self, size):
+
+        """
+        Will make at least size unread bytes available, reading as little as needed
+
+        :param size: bytes
+        :type size: int
+        :return: True if they are available, False at the end of the stream
+        :rtype: bool
+        """
+
+        available = len(self.__data) - self.__pos
+
+        if available >= size:
+            return True
+
+        chunks = [self.__data[self.__pos:]]
+
+        while available < size:
+
+            chunk = self.__fp.read(max(self.__buffer_size, size - available))
+
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+            available += len(chunk)
+
+        self.__data = b''.join(chunks)
+        self.__pos = 0
+
+        return available >= size
+
+    def _take(self, size):
+
+        if not self._ensure(size):
+            raise ValueError('a stream is truncated')
+
+        start = self.__pos
+        self.__pos += size
+
+        return self.__data[start:self.__pos]
+
+    def _varint(self):
+
+        value = shift = 0
+
+        while True:
+
+            byte = self._take(1)[0]
+            value |= (byte & 0x7f) << shift
+            shift += 7
+
+            if byte < 0x80:
+                return value
+
+    def _sparse(self):
+
+        mask = position = 0
+
+        for _ in range(self._varint()):
+            position += self._varint()
+            mask |= 1 << position
+
+        return mask
+
+    def _dense(self, count):
+
+        """
+        Will take the bytes of up to count dense records
+
+        :param count: max number of records
+        :type count: int
+        :return: bytes of whole records
+        :rtype: bytes
+        """
+
+        nbytes = self.__nbytes
+
+        if not self._ensure(count * nbytes) and (len(self.__data) - self.__pos) % nbytes:
+            raise ValueError('a stream is truncated')
+
+        return self._take(min(count, (len(self.__data) - self.__pos) // nbytes) * nbytes)
+
+    def read_one(self):
+
+        """
+        Will decode the next mask
+
+        :return: a mask or None at the end of the stream
+        :rtype: int or None
+        """
+
+        if not self._ensure(1):
+            return None
+
+        encoding = self.encoding
+
+        if encoding == AUTO:
+            encoding = self._take(1)[0]
+
+        if encoding == SPARSE:
+            return self._sparse()
+
+        return int.from_bytes(self._take(self.__nbytes), 'little')
+
+    def read(self, count):
+
+        """
+        Will decode up to count masks
+
+        :param count: max number of masks
+        :type count: int
+        :return: a list of masks, empty at the end of the stream
+        :rtype: list
+        """
+
+        if self.encoding == DENSE:
+
+            nbytes = self.__nbytes
+            data = self._dense(count)
+
+            return [int.from_bytes(data[x:x + nbytes], 'little') for x in range(0, len(data), nbytes)]
+
+        masks = []
+
+        while len(masks) < count:
+
+            mask = self.read_one()
+
+            if mask is None:
+                break
+
+            masks.append(mask)
+
+        return masks
+
+    def read_array(self, count):
+
+        """
+        Will decode up to count masks of a dense stream in one pass
+
+        :param count: max number of masks
+        :type count: int
+        :return: a uint64 array, 1-D for one word schemas otherwise (rows, words)
+        :rtype: numpy.ndarray
+        """
+
+        if numpy is None:
+            raise ImportError('Decoder.read_array requires numpy')
+
+        if self.encoding != DENSE:
+            return as_word_matrix(self.read(count), self.__schema.words)
+
+        nbytes, words = self.__nbytes, self.__schema.words
+        data = self._dense(count)
+
+        rows = numpy.zeros((len(data) // nbytes, words * 8), dtype=numpy.uint8)
+        rows[:, :nbytes] = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, nbytes)
+
+        matrix = rows.view('<u8').astype(numpy.uint64)
+
+        return matrix[:, 0] if words == 1 else matrix
+
+
+def dump(masks, fp, schema, encoding='dense'):
+
+    """
+    Will write masks into a file object
+
+    :param masks: an iterable of ints or a uint64 array
+    :type masks: iterable or numpy.ndarray
+    :param fp: a binary file object
+    :type fp: file
+    :param schema: a schema of the masks
+    :type schema: FlagSchema
+    :param encoding: 'dense', 'sparse' or 'auto'
+    :type encoding: str
+    :return: void
+    :rtype: void
+    """
+
+    with Encoder(fp, schema, encoding) as encoder:
+        encoder.write_many(masks)
+
+
+def load(fp, schema):
+
+    """
+    Will read all masks from a file object
+
+    :param fp: a binary file object
+    :type fp: file
+    :param schema: a schema of the masks
+    :type schema: FlagSchema
+    :return: a list of masks
+    :rtype: list
+    """
+
+    return list(Decoder(fp, schema))
+
+
+__all__ = [
+    'Decoder',
+    'Encoder',
+    'dump',
+    'load',
+]
@@ -0,0 +1,58 @@
+"""
+A module with ConcurrentBitnFly - a BitnFly, which can be shared between threads
+"""
+
+import threading
+
+from BitnFly.api.handle import FlagHandle
+from BitnFly.api.schema import FlagSchema
+
+
+class ConcurrentBitnFly(FlagHandle):
+
+    """
+    A ConcurrentBitnFly - the whole state is one immutable
+    (flags, swap mask, switch state) tuple. Writers build a new tuple under
+    a lock and swap it in with a single assignment, readers (get, &, mask)
+    only read that attribute and never take the lock, so they always see
+    a consistent state.
+    """
+
+    def __init__(self, options, **kwargs):
+
+        """
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        :param kwargs: possible keys are an 'output' and a 'mask' as in BitnFly
+        :type kwargs: dict
+        """
+
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        super(ConcurrentBitnFly, self).__init__(schema, **kwargs)
+
+        mask = kwargs.get('mask', None)
+
+        self._initial_flags = schema.full_mask if mask is None else mask
+        self._lock = threading.Lock()
+        self._state = (self._initial_flags, schema.full_mask, True)
+
+    def _load(self):
+        return self._state
+
+    def _store(self, flags, swap_mask, switch_state):
+        self._state = (flags, swap_mask, switch_state)
+
+    def _initial(self):
+        return self._initial_flags
+
+    def _update(self, func, *args):
+
+        with self._lock:
+            self._state = func(*(self._state + args))
+
+
+__all__ = [
+    'ConcurrentBitnFly',
+]
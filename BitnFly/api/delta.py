@@ -0,0 +1,472 @@
+"""
+A module with deltas of flag states, for replicating them.
+
+A FlagDelta is the XOR of flags and of the swap mask between two states,
+plus the new switch state when it changed. Deltas compose by XOR, so
+flipping a bit twice since a checkpoint leaves nothing to send, and a
+delta costs the changed bits only::
+
+    switch u8 (0 unchanged, 1 on, 2 off, + 4 added, + 8 removed) | sparse flags | sparse swap mask
+
+with sparse records as in the codec. A DeltaLog collects the deltas of
+many states by key - FlagStore, FlagIndex and SharedFlagTable feed one
+when tracking, see ChangeTracking - and is drained into a dict of the
+changed keys only. Keys can be added and removed, as entities of a
+FlagIndex are: a missing key has the state ABSENT, so the XOR of an
+added key is its whole state and a key removed and added again is a
+plain change.
+"""
+
+import threading
+
+from BitnFly.api.codec import read_sparse, read_varint, sparse_record, write_varint
+
+UNCHANGED = 0
+SWITCHED_ON = 1
+SWITCHED_OFF = 2
+
+ADDED = 4
+REMOVED = 8
+
+# the state of a missing key
+ABSENT = (0x0, 0x0, True)
+
+
+class FlagDelta(object):
+
+    """
+    A FlagDelta - the change of one state since a checkpoint
+    """
+
+    __slots__ = ('flags', 'swap_mask', 'switch_state', 'presence')
+
+    def __init__(self, flags=0x0, swap_mask=0x0, switch_state=None, presence=None):
+
+        """
+        :param flags: changed flags
+        :type flags: int
+        :param swap_mask: changed bits of the swap mask
+        :type swap_mask: int
+        :param switch_state: the new switch state or None when it did not change
+        :type switch_state: bool or None
+        :param presence: True when the key was added, False when it was removed, otherwise None
+        :type presence: bool or None
+        """
+
+        self.flags = flags
+        self.swap_mask = swap_mask
+        self.switch_state = switch_state
+        self.presence = presence
+
+    def __bool__(self):
+        return bool(self.flags or self.swap_mask or self.switch_state is not None or self.presence is not None)
+
+    def __eq__(self, other):
+
+        if not isinstance(other, FlagDelta):
+            return NotImplemented
+
+        return (self.flags, self.swap_mask, self.switch_state, self.presence) == \
+            (other.flags, other.swap_mask, other.switch_state, other.presence)
+
+    def __ne__(self, other):
+
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+
+        text = '{}(flags={}, swap_mask={}, switch_state={}'.format(
+            self.__class__.__name__, hex(self.flags), hex(self.swap_mask), self.switch_state
+        )
+
+        return text + (')' if self.presence is None else ', presence={})'.format(self.presence))
+
+    def merge(self, other):
+
+        """
+        Will compose this delta with a later one
+
+        :param other: a delta taken after this one
+        :type other: FlagDelta
+        :return: a new delta
+        :rtype: FlagDelta
+        """
+
+        if self.presence is None or other.presence is None:
+            presence = other.presence if self.presence is None else self.presence
+
+        elif self.presence:
+            # added and removed again, there is nothing left to send
+            return FlagDelta()
+
+        else:
+            presence = None
+
+        return FlagDelta(
+            self.flags ^ other.flags,
+            self.swap_mask ^ other.swap_mask,
+            self.switch_state if other.switch_state is None else other.switch_state,
+            presence
+        )
+
+    def apply(self, flags, swap_mask, switch_state):
+
+        """
+        Will compute the state after this delta, an added key starts from ABSENT
+
+        :param flags: flags
+        :type flags: int
+        :param swap_mask: a swap mask
+        :type swap_mask: int
+        :param switch_state: a switch state
+        :type switch_state: bool
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        return (
+            flags ^ self.flags,
+            swap_mask ^ self.swap_mask,
+            switch_state if self.switch_state is None else self.switch_state
+        )
+
+    def to_bytes(self):
+
+        """
+        Will encode the delta, its size follows the number of changed bits
+
+        :return: an encoded delta
+        :rtype: bytes
+        """
+
+        head = UNCHANGED if self.switch_state is None else SWITCHED_ON if self.switch_state else SWITCHED_OFF
+
+        if self.presence is not None:
+            head |= ADDED if self.presence else REMOVED
+
+        out = bytearray((head,))
+
+        out += sparse_record(self.flags)
+        out += sparse_record(self.swap_mask)
+
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data, pos=0):
+
+        """
+        Will decode a delta written by to_bytes
+
+        :param data: a buffer
+        :type data: bytes
+        :param pos: an offset of the delta
+        :type pos: int
+        :return: a delta
+        :rtype: FlagDelta
+        """
+
+        return cls.read(data, pos)[0]
+
+    @classmethod
+    def read(cls, data, pos):
+
+        """
+        Will decode a delta from a buffer
+
+        :param data: a buffer
+        :type data: bytes
+        :param pos: an offset of the delta
+        :type pos: int
+        :return: a tuple of the delta and the offset after it
+        :rtype: tuple
+        """
+
+        head = data[pos] if pos < len(data) else None
+
+        if head is None or head & 3 == 3 or head >> 2 not in (0, ADDED >> 2, REMOVED >> 2):
+            raise ValueError('a buffer does not hold a delta at {}'.format(pos))
+
+        switch_state = None if head & 3 == UNCHANGED else head & 3 == SWITCHED_ON
+        presence = None if head < ADDED else head & ADDED == ADDED
+
+        flags, pos = read_sparse(data, pos + 1)
+        swap_mask, pos = read_sparse(data, pos)
+
+        return cls(flags, swap_mask, switch_state, presence), pos
+
+
+def diff(before, after):
+
+    """
+    Will return the delta between two states
+
+    :param before: a tuple of flags, swap mask and switch state
+    :type before: tuple
+    :param after: a tuple of flags, swap mask and switch state
+    :type after: tuple
+    :return: a delta
+    :rtype: FlagDelta
+    """
+
+    return FlagDelta(
+        before[0] ^ after[0],
+        before[1] ^ after[1],
+        None if bool(before[2]) == bool(after[2]) else bool(after[2])
+    )
+
+
+def dumps(deltas):
+
+    """
+    Will encode deltas of int keys, eg. as drained from a DeltaLog
+
+    :param deltas: a dict key -> FlagDelta, keys are non negative ints
+    :type deltas: dict
+    :return: an encoded feed
+    :rtype: bytes
+    """
+
+    out = bytearray()
+    write_varint(out, len(deltas))
+
+    for key in sorted(deltas):
+
+        assert isinstance(key, int) and key >= 0, 'a key must be a non negative int'
+
+        write_varint(out, key)
+        out += deltas[key].to_bytes()
+
+    return bytes(out)
+
+
+def loads(data):
+
+    """
+    Will decode a feed written by dumps
+
+    :param data: an encoded feed
+    :type data: bytes
+    :return: a dict key -> FlagDelta
+    :rtype: dict
+    """
+
+    count, pos = read_varint(data, 0)
+    deltas = {}
+
+    for _ in range(count):
+        key, pos = read_varint(data, pos)
+        deltas[key], pos = FlagDelta.read(data, pos)
+
+    return deltas
+
+
+class DeltaLog(object):
+
+    """
+    A DeltaLog - accumulates the deltas of many states by key.
+
+    Only keys written since the last drain are kept, each as one running
+    XOR, so a log costs the changed states and their changed bits, not
+    the population.
+    """
+
+    def __init__(self):
+
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def record(self, key, before, after):
+
+        """
+        Will add the change of a state
+
+        :param key: a slot or an entity
+        :type key: hashable
+        :param before: a tuple of flags, swap mask and switch state
+        :type before: tuple
+        :param after: a tuple of flags, swap mask and switch state
+        :type after: tuple
+        :return: void
+        :rtype: void
+        """
+
+        with self.__lock:
+
+            self._record(key, before, after)
+
+    def _record(self, key, before, after, presence=None):
+
+        entry = self.__entries.get(key)
+
+        if entry is None:
+
+            # flags, swap mask, switch state before and after, presence before and after
+            entry = self.__entries[key] = [
+                before[0] ^ after[0], before[1] ^ after[1], bool(before[2]), bool(after[2]), presence is not True, True
+            ]
+
+        else:
+            entry[0] ^= before[0] ^ after[0]
+            entry[1] ^= before[1] ^ after[1]
+            entry[3] = bool(after[2])
+
+        if presence is not None:
+            entry[5] = presence
+
+    def added(self, key, after):
+
+        """
+        Will add the change of a new key, from ABSENT to its state
+
+        :param key: a slot or an entity
+        :type key: hashable
+        :param after: a tuple of flags, swap mask and switch state
+        :type after: tuple
+        :return: void
+        :rtype: void
+        """
+
+        with self.__lock:
+            self._record(key, ABSENT, after, True)
+
+    def removed(self, key, before):
+
+        """
+        Will add the change of a removed key, from its state to ABSENT
+
+        :param key: a slot or an entity
+        :type key: hashable
+        :param before: a tuple of flags, swap mask and switch state
+        :type before: tuple
+        :return: void
+        :rtype: void
+        """
+
+        with self.__lock:
+            self._record(key, before, ABSENT, False)
+
+    def discard(self, key):
+
+        """
+        Will forget the change of a state, eg. of a removed entity
+
+        :param key: a slot or an entity
+        :type key: hashable
+        :return: void
+        :rtype: void
+        """
+
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def drain(self):
+
+        """
+        Will return the deltas since the last drain and start a new one.
+        States, which came back to where they were, and keys added and removed again are left out
+
+        :return: a dict key -> FlagDelta
+        :rtype: dict
+        """
+
+        with self.__lock:
+            entries, self.__entries = self.__entries, {}
+
+        deltas = {}
+
+        for key, (flags, swap_mask, base, switch_state, was_present, present) in entries.items():
+
+            if not was_present and not present:
+                continue
+
+            delta = FlagDelta(
+                flags, swap_mask, None if switch_state == base else switch_state,
+                None if was_present == present else present
+            )
+
+            if delta:
+                deltas[key] = delta
+
+        return deltas
+
+
+class ChangeTracking(object):
+
+    """
+    A mixin for containers of keyed states - FlagStore, FlagIndex and SharedFlagTable.
+
+    A container records into self._log from its write path while tracking,
+    and reads states with state(key). apply_deltas writes through
+    _apply_delta, which containers with an atomic update override.
+    """
+
+    _log = None
+
+    def track(self, log=None):
+
+        """
+        Will record the changes of states into a log, until untrack
+
+        :param log: a log, by default a new one
+        :type log: DeltaLog
+        :return: the log
+        :rtype: DeltaLog
+        """
+
+        self._log = DeltaLog() if log is None else log
+        return self._log
+
+    def untrack(self):
+
+        """
+        Will stop recording changes
+
+        :return: the log or None
+        :rtype: DeltaLog
+        """
+
+        log, self._log = self._log, None
+        return log
+
+    def drain(self):
+
+        """
+        Will return the deltas of the keys changed since the last drain, see DeltaLog.drain
+
+        :return: a dict key -> FlagDelta
+        :rtype: dict
+        """
+
+        assert self._log is not None, 'changes are recorded after track'
+        return self._log.drain()
+
+    def apply_deltas(self, deltas):
+
+        """
+        Will apply deltas drained from a replica, the work follows the number of deltas
+
+        :param deltas: a dict key -> FlagDelta
+        :type deltas: dict
+        :return: void
+        :rtype: void
+        """
+
+        for key, delta in deltas.items():
+            self._apply_delta(key, delta)
+
+    def _apply_delta(self, key, delta):
+        self.store(key, *delta.apply(*self.state(key)))
+
+
+__all__ = [
+    'ChangeTracking',
+    'DeltaLog',
+    'FlagDelta',
+    'diff',
+    'dumps',
+    'loads',
+]
@@ -0,0 +1,348 @@
+"""
+A module with compiled flag predicates.
+
+An expression like ``"can_read & can_edit & ~anonymous | admin"`` is
+compiled into a disjunction of (mask, expected) tests: a state matches
+when ``state & mask == expected`` for at least one of them.
+
+Grammar, from the lowest precedence::
+
+    expression := term ('|' term)*
+    term       := factor ('&' factor)*
+    factor     := '~' factor | name | '(' expression ')'
+"""
+
+import re
+
+from BitnFly.api.array import BitnFlyArray, to_words
+from BitnFly.api.bitmap import iter_positions
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+MAX_TERMS = 4096
+
+TOKENS = re.compile(r'\s*(?:([()&|~])|([A-Za-z_][A-Za-z0-9_]*))')
+
+TRUE = [(0x0, 0x0)]
+FALSE = []
+
+
+def tokenize(expression):
+
+    """
+    Will split an expression into operators and names
+
+    :param expression: an expression
+    :type expression: str
+    :return: a list of tokens
+    :rtype: list
+    """
+
+    tokens, pos, end = [], 0, len(expression.rstrip())
+
+    while pos < end:
+
+        match = TOKENS.match(expression, pos)
+
+        if match is None:
+            raise ValueError('unexpected {!r} at position {} in {!r}'.format(expression[pos], pos, expression))
+
+        tokens.append(match.group(1) or match.group(2))
+        pos = match.end()
+
+    return tokens
+
+
+def conjoin(left, right):
+
+    """
+    Will AND two disjunctions of (mask, expected) terms
+
+    :param left: terms
+    :type left: list
+    :param right: terms
+    :type right: list
+    :return: terms
+    :rtype: list
+    """
+
+    terms = []
+
+    for mask, expected in left:
+        for other_mask, other_expected in right:
+
+            if (expected ^ other_expected) & mask & other_mask:
+                continue
+
+            terms.append((mask | other_mask, expected | other_expected))
+
+    if len(terms) > MAX_TERMS:
+        raise ValueError('an expression expands to more than {} terms'.format(MAX_TERMS))
+
+    return simplify(terms)
+
+
+def negate(terms):
+
+    """
+    Will NOT a disjunction of (mask, expected) terms
+
+    :param terms: terms
+    :type terms: list
+    :return: terms
+    :rtype: list
+    """
+
+    result = TRUE
+
+    for mask, expected in terms:
+
+        literals = []
+
+        while mask:
+
+            bit = mask & -mask
+            literals.append((bit, bit & ~expected))
+            mask ^= bit
+
+        result = conjoin(result, literals)
+
+    return result
+
+
+def simplify(terms):
+
+    """
+    Will drop duplicated and absorbed terms and merge terms, which differ only by one flag
+
+    :param terms: terms
+    :type terms: list
+    :return: terms
+    :rtype: list
+    """
+
+    terms = set(terms)
+    merged = True
+
+    while merged:
+
+        merged = False
+
+        for mask, expected in list(terms):
+
+            check = mask
+
+            while check:
+
+                bit = check & -check
+                check ^= bit
+
+                if (mask, expected ^ bit) in terms:
+
+                    terms.discard((mask, expected))
+                    terms.discard((mask, expected ^ bit))
+                    terms.add((mask ^ bit, expected & ~bit))
+
+                    merged = True
+                    break
+
+            if merged:
+                break
+
+    return sorted(
+        (mask, expected) for mask, expected in terms
+        if not any(
+            (other_mask, other_expected) != (mask, expected)
+            and other_mask & mask == other_mask
+            and expected & other_mask == other_expected
+            for other_mask, other_expected in terms
+        )
+    )
+
+
+class Parser(object):
+
+    """
+    A Parser - a recursive descent parser, which builds terms directly
+    """
+
+    def __init__(self, schema, expression):
+
+        self.__schema = schema
+        self.__expression = expression
+        self.__tokens = tokenize(expression)
+        self.__pos = 0
+
+    def _peek(self):
+        return self.__tokens[self.__pos] if self.__pos < len(self.__tokens) else None
+
+    def _next(self):
+
+        token = self._peek()
+
+        if token is None:
+            raise ValueError('unexpected end of {!r}'.format(self.__expression))
+
+        self.__pos += 1
+        return token
+
+    def _expression(self):
+
+        terms = self._term()
+
+        while self._peek() == '|':
+
+            self._next()
+            terms = simplify(terms + self._term())
+
+        return terms
+
+    def _term(self):
+
+        terms = self._factor()
+
+        while self._peek() == '&':
+
+            self._next()
+            terms = conjoin(terms, self._factor())
+
+        return terms
+
+    def _factor(self):
+
+        token = self._next()
+
+        if token == '~':
+            return negate(self._factor())
+
+        if token == '(':
+
+            terms = self._expression()
+
+            if self._next() != ')':
+                raise ValueError('missing ) in {!r}'.format(self.__expression))
+
+            return terms
+
+        if token in '()&|':
+            raise ValueError('unexpected {!r} in {!r}'.format(token, self.__expression))
+
+        # a group is set when any of its flags is, and a flag when it or a flag implying it is, as in b & name
+        mask = self.__schema.implied_by_mask(self.__schema.mask_of(token))
+        return [(1 << position, 1 << position) for position in iter_positions(mask)]
+
+    def parse(self):
+
+        """
+        Will parse the whole expression
+
+        :return: terms
+        :rtype: list
+        """
+
+        terms = self._expression()
+
+        if self._peek() is not None:
+            raise ValueError('unexpected {!r} in {!r}'.format(self._peek(), self.__expression))
+
+        return terms
+
+
+class FlagPredicate(object):
+
+    """
+    A FlagPredicate - a compiled expression.
+    Call it with a BitnFly, an int, a BitnFlyArray or a uint64 array.
+    """
+
+    def __init__(self, schema, expression):
+
+        """
+        :param schema: a schema, which names are resolved against
+        :type schema: FlagSchema
+        :param expression: an expression
+        :type expression: str
+        """
+
+        self.schema = schema
+        self.expression = expression
+        self.terms = tuple(Parser(schema, expression).parse())
+
+    def __repr__(self):
+
+        return '{}({!r}, terms={})'.format(
+            self.__class__.__name__, self.expression, len(self.terms)
+        )
+
+    def __call__(self, value):
+
+        """
+        Will evaluate the predicate
+
+        :param value: a state
+        :type value: int, BitnFly, BitnFlyArray or numpy.ndarray
+        :return: True if value matches otherwise False, or a boolean array
+        :rtype: bool or numpy.ndarray
+        """
+
+        if isinstance(value, int):
+            return self.test(value)
+
+        if isinstance(value, BitnFlyArray):
+            return self.test_array(value.get())
+
+        if numpy is not None and isinstance(value, numpy.ndarray):
+            return self.test_array(value)
+
+        return self.test(value.get(output=int))
+
+    def test(self, value):
+
+        """
+        Will evaluate the predicate against a mask
+
+        :param value: a mask
+        :type value: int
+        :return: True if value matches otherwise False
+        :rtype: bool
+        """
+
+        for mask, expected in self.terms:
+            if value & mask == expected:
+                return True
+
+        return False
+
+    def test_array(self, values):
+
+        """
+        Will evaluate the predicate against many masks at once
+
+        :param values: a 1-D uint64 array or a (rows, words) uint64 matrix
+        :type values: numpy.ndarray
+        :return: a boolean array
+        :rtype: numpy.ndarray
+        """
+
+        matrix = values.reshape(-1, 1) if values.ndim == 1 else values
+        words = matrix.shape[1]
+
+        result = numpy.zeros(matrix.shape[0], dtype=bool)
+
+        for mask, expected in self.terms:
+
+            if words == 1:
+                result |= (matrix[:, 0] & numpy.uint64(mask)) == numpy.uint64(expected)
+
+            else:
+                result |= numpy.all((matrix & to_words(mask, words)) == to_words(expected, words), axis=1)
+
+        return result
+
+
+__all__ = [
+    'FlagPredicate',
+]
@@ -0,0 +1,474 @@
+"""
+A module with FlagHandle - a BitnFly compatible view on a state, which is kept elsewhere
+"""
+
+from BitnFly.api.delta import diff
+from BitnFly.api.instrument import instrumented
+from BitnFly.api.plan import Plan
+
+
+def mask_repr(mask):
+
+    """
+    Will format a mask for a repr, masks too wide for a decimal str are written in hex
+
+    :param mask: a mask or an output of it
+    :type mask: int
+    :return: a text
+    :rtype: str
+    """
+
+    try:
+        return str(mask)
+
+    except ValueError:
+        return hex(mask)
+
+
+class FlagHandle(object):
+
+    """
+    A FlagHandle - the base of BitnFly compatible handles.
+
+    A subclass keeps the state (flags, swap mask, switch state) wherever it
+    wants and only implements _load and _store. Every mutation goes through
+    _update, which a subclass can wrap with locking.
+    """
+
+    def __init__(self, schema, **kwargs):
+
+        """
+        :param schema: a schema of the state
+        :type schema: FlagSchema
+        :param kwargs: a possible key is an 'output` with callable value eg. hex, bin; default is int
+        :type kwargs: dict
+        """
+
+        self._schema = schema
+        self._output = kwargs.get('output', int)
+        self._checkpoint = None
+
+        if schema.recorder is not None:
+            self.__class__ = instrumented(self.__class__)
+
+    def _load(self):
+
+        """
+        Will read the state
+
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        raise NotImplementedError
+
+    def _store(self, flags, swap_mask, switch_state):
+
+        """
+        Will write the state
+
+        :param flags: flags
+        :type flags: int
+        :param swap_mask: a swap mask
+        :type swap_mask: int
+        :param switch_state: False after off, True after on
+        :type switch_state: bool
+        :return: void
+        :rtype: void
+        """
+
+        raise NotImplementedError
+
+    def _initial(self):
+
+        """
+        Will return the flags restored by reset
+
+        :return: flags
+        :rtype: int
+        """
+
+        return self._schema.full_mask
+
+    def _update(self, func, *args):
+
+        """
+        Will replace the state with func(flags, swap_mask, switch_state, *args)
+
+        :param func: a callable returning a new state tuple
+        :type func: callable
+        :return: void
+        :rtype: void
+        """
+
+        self._store(*func(*(self._load() + args)))
+
+    def __and__(self, other):
+
+        """
+        A bitwise operator &
+
+        :param other: can be an int or a str
+        :type other: int or str
+        :return: True if other is set in self, or implied by a set flag, otherwise False
+        :rtype: bool
+        """
+
+        if isinstance(other, int):
+            return bool(self._load()[0] & self._schema.implied_by_mask(other))
+
+        elif isinstance(other, str):
+            return bool(self._load()[0] & self._schema.implied_by_mask(self._schema.mask_of(other)))
+
+        return False
+
+    def __or__(self, other):
+
+        """
+        A bitwise operator |
+
+        :param other: can be an int, a str, a list of int or a list of str
+        :type other: int, str, list
+        :return: self
+        :rtype: self
+        """
+
+        self._update(_or, self._schema.or_mask(other))
+        return self
+
+    def __xor__(self, other):
+
+        """
+        A bitwise operator ^
+
+        :param other: can be an int, a str, a list of int or a list of str
+        :type other: int, str, list
+        :return: self
+        :rtype: self
+        """
+
+        return self.flip(other)
+
+    def __str__(self):
+        return str(self.get())
+
+    def __repr__(self):
+
+        flags, swap_mask, _ = self._load()
+
+        return '<{}({}, mask={})>'.format(self.__class__.__name__, mask_repr(flags), mask_repr(swap_mask))
+
+    def __getattr__(self, item):
+
+        bit = self._schema.options.get(item.upper()) if not item.startswith('_') else None
+
+        if bit is None:
+            raise AttributeError(item)
+
+        return bit
+
+    def flip(self, bits):
+
+        """
+        Will flip bit or bits to opposite side
+
+        :param bits: can be an int, a str, a list of int or a list of str
+        :type bits: int, str, list
+        :return: object it self
+        :rtype: object
+        """
+
+        self._update(_xor, self._schema.mask_of(bits, '__xor__'))
+        return self
+
+    def set_range(self, start, stop):
+
+        """
+        Will set the flags at positions start to stop - 1, as | does
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        self._update(_or, self._schema.range_mask(start, stop))
+        return self
+
+    def clear_range(self, start, stop):
+
+        """
+        Will flip the set flags at positions start to stop - 1, so all of them are cleared
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        self._update(_clear, self._schema.range_mask(start, stop))
+        return self
+
+    def flip_range(self, start, stop):
+
+        """
+        Will flip the flags at positions start to stop - 1
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        self._update(_xor, self._schema.range_mask(start, stop))
+        return self
+
+    def off(self):
+
+        """
+        Will turning off all bits, according to a swap mask
+
+        :return: object it self
+        :rtype: object
+        """
+
+        self._update(_off)
+        return self
+
+    def on(self):
+
+        """
+        Will turn on all flags according to swap mask
+
+        :return: object it self
+        :rtype: object
+        """
+
+        self._update(_on)
+        return self
+
+    def reset(self):
+
+        """
+        Reset all bits to initial values
+
+        :return: object it's self
+        :rtype: object
+        """
+
+        self._update(_reset, self._initial(), self._schema.full_mask)
+        return self
+
+    def apply(self, ops):
+
+        """
+        Will apply a sequence of operations as one update, see BitnFly.apply
+
+        :param ops: operations or a Plan
+        :type ops: list or Plan
+        :return: object it self
+        :rtype: object
+        """
+
+        plan = ops if isinstance(ops, Plan) else self._schema.plan(ops)
+
+        self._update(_apply, plan, self._initial())
+        return self
+
+    def state(self):
+
+        """
+        Will return the whole state
+
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        return self._load()
+
+    def freeze(self):
+
+        """
+        Will return the current flags as an interned value, see BitnFly.freeze
+
+        :return: a value
+        :rtype: FlagValue
+        """
+
+        return self._schema.value(self._load()[0])
+
+    def checkpoint(self):
+
+        """
+        Will start tracking changes from the current state, see BitnFly.checkpoint
+
+        :return: object it self
+        :rtype: object
+        """
+
+        self._checkpoint = self._load()
+        return self
+
+    def drain(self):
+
+        """
+        Will return the changes since the last checkpoint and checkpoint again, see BitnFly.drain
+
+        :return: a delta
+        :rtype: FlagDelta
+        """
+
+        assert self._checkpoint is not None, 'changes are tracked after a checkpoint'
+
+        before, self._checkpoint = self._checkpoint, self._load()
+        return diff(before, self._checkpoint)
+
+    def apply_delta(self, delta):
+
+        """
+        Will apply a delta as one update
+
+        :param delta: a delta
+        :type delta: FlagDelta
+        :return: object it self
+        :rtype: object
+        """
+
+        self._update(_apply_delta, delta)
+        return self
+
+    def batch(self):
+
+        """
+        Will return a Plan bound to this object, see BitnFly.batch
+
+        :return: a plan
+        :rtype: Plan
+        """
+
+        return Plan(self._schema, target=self)
+
+    def get(self, bit=None, output=None):
+
+        """
+        Will return current bits mask, if arg bit is None, otherwise
+        will try to extract it from the current bit mask
+
+        :param bit:
+        :type bit: str or int
+        :param output:
+        :type output:
+        :return: a bit flag
+        :rtype: int
+        """
+
+        call = output or self._output
+        flags = self._load()[0]
+
+        if bit is None:
+            return call(flags)
+
+        elif isinstance(bit, int):
+            return call(flags & bit) if self._schema.is_bit(bit) else 0
+
+        elif isinstance(bit, str):
+            return call(flags & self._schema.mask_of(bit))
+
+        else:
+            raise TypeError('A bit argument can be int or a str')
+
+    def names(self):
+
+        """
+        Will return the lower cased names of the set flags, in bit order
+
+        :return: a list of names
+        :rtype: list
+        """
+
+        return self._schema.names_of(self._load()[0])
+
+    def iter_set(self):
+
+        """
+        Will iterate the lower cased names of the set flags, visiting only the set bits
+
+        :return: a generator of names
+        :rtype: generator
+        """
+
+        return self._schema.iter_names(self._load()[0])
+
+    def flags(self):
+        """
+        Will return all flags in ordered dict
+        :return:
+        :rtype:
+        """
+        return self._schema.options
+
+    def schema(self):
+        """
+        Will return the schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self._schema
+
+    def mask(self):
+        """
+        Will return the current swap mask
+        :return:
+        :rtype:
+        """
+        return self._load()[1]
+
+
+def _xor(flags, swap_mask, switch_state, mask):
+    return flags ^ mask, swap_mask ^ mask, switch_state
+
+
+def _or(flags, swap_mask, switch_state, mask):
+    return flags | mask, swap_mask | mask, switch_state
+
+
+def _clear(flags, swap_mask, switch_state, mask):
+
+    mask &= flags
+    return flags ^ mask, swap_mask ^ mask, switch_state
+
+
+def _off(flags, swap_mask, switch_state):
+    return flags & ~swap_mask, swap_mask, False
+
+
+def _on(flags, swap_mask, switch_state):
+
+    if not switch_state:
+        return flags ^ swap_mask, swap_mask, True
+
+    return flags, swap_mask, switch_state
+
+
+def _apply(flags, swap_mask, switch_state, plan, initial):
+    return plan.run(flags, swap_mask, switch_state, initial)
+
+
+def _apply_delta(flags, swap_mask, switch_state, delta):
+    return delta.apply(flags, swap_mask, switch_state)
+
+
+def _reset(flags, swap_mask, switch_state, initial, full_mask):
+    return initial, full_mask, switch_state
+
+
+__all__ = [
+    'FlagHandle',
+    'mask_repr',
+]
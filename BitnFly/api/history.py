@@ -0,0 +1,231 @@
+"""
+A module with History - named snapshots and a bounded undo/redo stack of one state.
+
+A History keeps no copies of the state. Every step is the FlagDelta
+between two committed states and a snapshot is the delta from the state
+the history started with, so its memory follows the changed bits.
+"""
+
+import collections
+import contextlib
+
+from BitnFly.api.delta import diff
+
+UNDO_LIMIT = 100
+
+
+class History(object):
+
+    """
+    A History - undo, redo and snapshots of an object with state() and apply_delta(),
+    eg. BitnFly, SparseBitnFly, ConcurrentBitnFly or a handle of a store slot.
+
+    Changes become an undo step by commit, undo and redo commit pending
+    changes first, so nothing is lost between the steps.
+    """
+
+    def __init__(self, target, limit=UNDO_LIMIT):
+
+        """
+        :param target: an object to keep the history of
+        :type target: BitnFly
+        :param limit: max number of undo steps, the oldest ones are dropped
+        :type limit: int
+        """
+
+        assert limit > 0, 'a limit must be positive'
+
+        self.__target = target
+        self.__base = self.__state = target.state()
+        self.__undo = collections.deque(maxlen=limit)
+        self.__redo = collections.deque(maxlen=limit)
+        self.__snapshots = {}
+
+    def __repr__(self):
+
+        return '{}({} undo, {} redo, {} snapshots)'.format(
+            self.__class__.__name__, len(self.__undo), len(self.__redo), len(self.__snapshots)
+        )
+
+    def _move(self, delta):
+
+        """
+        Will apply a delta to the target and return the delta back
+        """
+
+        before = self.__state
+
+        self.__target.apply_delta(delta)
+        self.__state = self.__target.state()
+
+        return diff(self.__state, before)
+
+    def commit(self):
+
+        """
+        Will make the changes since the last commit an undo step, the redo steps are dropped
+
+        :return: True if there were changes
+        :rtype: bool
+        """
+
+        state = self.__target.state()
+        back = diff(state, self.__state)
+
+        if not back:
+            return False
+
+        self.__undo.append(back)
+        self.__redo.clear()
+        self.__state = state
+
+        return True
+
+    def rollback(self):
+
+        """
+        Will drop the changes since the last commit
+
+        :return: True if there were changes
+        :rtype: bool
+        """
+
+        back = diff(self.__target.state(), self.__state)
+
+        if back:
+            self.__target.apply_delta(back)
+
+        return bool(back)
+
+    def undo(self):
+
+        """
+        Will revert the last step
+
+        :return: False if there was no step to undo
+        :rtype: bool
+        """
+
+        self.commit()
+
+        if not self.__undo:
+            return False
+
+        self.__redo.append(self._move(self.__undo.pop()))
+        return True
+
+    def redo(self):
+
+        """
+        Will apply the last undone step again
+
+        :return: False if there was no step to redo
+        :rtype: bool
+        """
+
+        if self.commit() or not self.__redo:
+            return False
+
+        self.__undo.append(self._move(self.__redo.pop()))
+        return True
+
+    def can_undo(self):
+        """
+        Will tell whether there is a committed step to undo
+        :return:
+        :rtype: bool
+        """
+        return bool(self.__undo)
+
+    def can_redo(self):
+        """
+        Will tell whether there is an undone step
+        :return:
+        :rtype: bool
+        """
+        return bool(self.__redo)
+
+    def snapshot(self, name):
+
+        """
+        Will commit and keep the state under a name
+
+        :param name: a name of the snapshot, an existing one is replaced
+        :type name: str
+        :return: self
+        :rtype: History
+        """
+
+        self.commit()
+        self.__snapshots[name] = diff(self.__base, self.__state)
+
+        return self
+
+    def restore(self, name):
+
+        """
+        Will commit and bring back the state of a snapshot, as one undo step
+
+        :param name: a name of the snapshot
+        :type name: str
+        :return: self
+        :rtype: History
+        """
+
+        snapshot = self.__snapshots[name]
+
+        self.commit()
+
+        forward = diff(self.__state, snapshot.apply(*self.__base))
+
+        if forward:
+            self.__undo.append(self._move(forward))
+            self.__redo.clear()
+
+        return self
+
+    def drop(self, name):
+        """
+        Will forget a snapshot
+        :param name: a name of the snapshot
+        :type name: str
+        :return:
+        :rtype:
+        """
+        del self.__snapshots[name]
+
+    def snapshots(self):
+        """
+        Will return the names of the snapshots
+        :return:
+        :rtype: list
+        """
+        return sorted(self.__snapshots)
+
+    @contextlib.contextmanager
+    def transaction(self):
+
+        """
+        Will commit the changes of a with block as one undo step, or roll them back
+        when the block raised
+
+        :return: the target
+        :rtype: BitnFly
+        """
+
+        self.commit()
+
+        try:
+            yield self.__target
+
+        except BaseException:
+            self.rollback()
+            raise
+
+        self.commit()
+
+
+__all__ = [
+    'History',
+    'UNDO_LIMIT',
+]
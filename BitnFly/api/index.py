@@ -0,0 +1,335 @@
+"""
+A module with FlagIndex - an inverted index from flags to entities
+"""
+
+from BitnFly.api.bitmap import Bitmap
+from BitnFly.api.delta import ABSENT, ChangeTracking
+from BitnFly.api.handle import FlagHandle
+from BitnFly.api.schema import FlagSchema
+
+
+class IndexHandle(FlagHandle):
+
+    """
+    An IndexHandle - a BitnFly compatible handle of one entity of a FlagIndex.
+    Every mutation made through it keeps the index in sync.
+    """
+
+    def __init__(self, index, entity, **kwargs):
+
+        super(IndexHandle, self).__init__(index.schema(), **kwargs)
+
+        self._index = index
+        self._entity = entity
+
+    def _load(self):
+        return self._index.state(self._entity)
+
+    def _initial(self):
+        return self._index.initial(self._entity)
+
+    def _store(self, flags, swap_mask, switch_state):
+        self._index.store(self._entity, flags, swap_mask, switch_state)
+
+
+class FlagIndex(ChangeTracking):
+
+    """
+    A FlagIndex - keeps states of many entities together with a bitmap
+    of entity ids per flag, so boolean queries are answered by bitmap
+    intersections, unions and differences instead of scanning all states
+    """
+
+    def __init__(self, options):
+
+        """
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        """
+
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        self.__schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        self.__states = {}
+        self.__initial = {}
+        self.__entities = Bitmap()
+        self.__bitmaps = [Bitmap() for _ in range(len(self.__schema))]
+        self._log = None
+
+    def __len__(self):
+        return len(self.__states)
+
+    def __contains__(self, entity):
+        return entity in self.__states
+
+    def __getitem__(self, entity):
+
+        """
+        Will return a BitnFly compatible handle of an entity
+
+        :param entity: an entity id
+        :type entity: int
+        :return: a handle
+        :rtype: IndexHandle
+        """
+
+        if entity not in self.__states:
+            raise KeyError(entity)
+
+        return IndexHandle(self, entity)
+
+    def __setitem__(self, entity, value):
+
+        """
+        Will keep "index[entity] |= ..." working and write plain int flags of an entity
+
+        :param entity: an entity id
+        :type entity: int
+        :param value: a handle of the same entity or flags
+        :type value: IndexHandle or int
+        :return: void
+        :rtype: void
+        """
+
+        if isinstance(value, IndexHandle) and value._index is self and value._entity == entity:
+            return
+
+        assert isinstance(value, int), 'a value must be a handle of the entity or an int'
+
+        _, swap_mask, switch_state = self.state(entity)
+        self.store(entity, value, swap_mask, switch_state)
+
+    def _sync(self, entity, changed, flags):
+
+        """
+        Will update the bitmaps of the changed flags only
+
+        :param entity: an entity id
+        :type entity: int
+        :param changed: a mask of changed flags
+        :type changed: int
+        :param flags: the new flags
+        :type flags: int
+        :return: void
+        :rtype: void
+        """
+
+        bitmaps = self.__bitmaps
+
+        while changed:
+
+            bit = changed & -changed
+            changed ^= bit
+
+            if flags & bit:
+                bitmaps[bit.bit_length() - 1].add(entity)
+
+            else:
+                bitmaps[bit.bit_length() - 1].discard(entity)
+
+    def add(self, entity, mask=None):
+
+        """
+        Will add an entity, its flags are all on or mask as in BitnFly
+
+        :param entity: an entity id in [0, 2 ** 32)
+        :type entity: int
+        :param mask: initial flags
+        :type mask: int
+        :return: a handle
+        :rtype: IndexHandle
+        """
+
+        if entity in self.__states:
+            raise KeyError('entity {} is already indexed'.format(entity))
+
+        full_mask = self.__schema.full_mask
+
+        if mask is not None:
+            self.__initial[entity] = mask
+
+        flags = self.initial(entity)
+
+        self.__entities.add(entity)
+        self.__states[entity] = (flags, full_mask, True)
+        self._sync(entity, flags, flags)
+
+        if self._log is not None:
+            self._log.added(entity, self.__states[entity])
+
+        return IndexHandle(self, entity)
+
+    def remove(self, entity):
+
+        """
+        Will remove an entity
+
+        :param entity: an entity id
+        :type entity: int
+        :return: void
+        :rtype: void
+        """
+
+        state = self.__states.pop(entity)
+        self.__initial.pop(entity, None)
+
+        self._sync(entity, state[0], 0x0)
+        self.__entities.discard(entity)
+
+        if self._log is not None:
+            self._log.removed(entity, state)
+
+    def state(self, entity):
+
+        """
+        Will return the state of an entity
+
+        :param entity: an entity id
+        :type entity: int
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        return self.__states[entity]
+
+    def initial(self, entity):
+
+        """
+        Will return the flags an entity is reset to
+
+        :param entity: an entity id
+        :type entity: int
+        :return: flags
+        :rtype: int
+        """
+
+        return self.__initial.get(entity, self.__schema.full_mask)
+
+    def store(self, entity, flags, swap_mask, switch_state):
+
+        """
+        Will replace the state of an entity and update the bitmaps of changed flags
+
+        :param entity: an entity id
+        :type entity: int
+        :param flags: flags
+        :type flags: int
+        :param swap_mask: a swap mask
+        :type swap_mask: int
+        :param switch_state: False after off, True after on
+        :type switch_state: bool
+        :return: void
+        :rtype: void
+        """
+
+        before = self.__states[entity]
+
+        if self._log is not None:
+            self._log.record(entity, before, (flags, swap_mask, switch_state))
+
+        self._sync(entity, before[0] ^ flags, flags)
+        self.__states[entity] = (flags, swap_mask, switch_state)
+
+    def _apply_delta(self, entity, delta):
+
+        """
+        Will apply a delta, adding or removing the entity when the delta says so.
+        An added entity is reset to the full mask on a replica, initial masks are not replicated
+        """
+
+        if delta.presence is False:
+            self.remove(entity)
+
+        elif delta.presence:
+
+            if entity in self.__states:
+                self.remove(entity)
+
+            self.add(entity)
+            self.store(entity, *delta.apply(*ABSENT))
+
+        else:
+            self.store(entity, *delta.apply(*self.state(entity)))
+
+    def having(self, name):
+
+        """
+        Will return the entities with a flag set
+
+        :param name: an option name
+        :type name: str
+        :return: a copy of the flag bitmap
+        :rtype: Bitmap
+        """
+
+        return self.__bitmaps[self.__schema.position(name.upper())].copy()
+
+    def query(self, expression):
+
+        """
+        Will return the entities matching an expression like "can_publish & ~staff".
+        Each term of the compiled expression starts from its smallest flag bitmap.
+
+        :param expression: an expression, see FlagSchema.compile
+        :type expression: str
+        :return: entity ids
+        :rtype: Bitmap
+        """
+
+        result = Bitmap()
+
+        for mask, expected in self.__schema.compile(expression).terms:
+
+            required = self._bitmaps_of(mask & expected)
+            excluded = self._bitmaps_of(mask & ~expected)
+
+            if required:
+
+                required.sort(key=len)
+                matched = required[0]
+
+                for bitmap in required[1:]:
+                    if not matched:
+                        break
+
+                    matched = matched & bitmap
+
+            else:
+                matched = self.__entities
+
+            for bitmap in excluded:
+                if not matched:
+                    break
+
+                matched = matched - bitmap
+
+            result = result | matched
+
+        return result
+
+    def _bitmaps_of(self, mask):
+
+        bitmaps = []
+
+        while mask:
+
+            bit = mask & -mask
+            mask ^= bit
+
+            bitmaps.append(self.__bitmaps[bit.bit_length() - 1])
+
+        return bitmaps
+
+    def schema(self):
+        """
+        Will return the schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
+
+__all__ = [
+    'FlagIndex',
+    'IndexHandle',
+]
@@ -0,0 +1,215 @@
+"""
+A module with opt-in instrumentation of flag operations.
+
+Instrumentation is enabled per schema with FlagSchema.instrument. Objects
+built from an instrumented schema get a subclass of their class, whose
+operations count calls, input kinds and latencies into the schema's
+Recorder. Objects built while it is disabled keep their own class, so
+their operations run exactly the same code as without instrumentation.
+An instrumented object goes back to its own class on its first call after
+instrumentation is disabled and is pickled as an object of its own class,
+a copy of a schema is never instrumented.
+"""
+
+import copyreg
+import threading
+import time
+from functools import wraps
+
+OPERATIONS = (
+    'flip', '__or__', '__xor__', '__and__', 'get', 'off', 'on', 'reset', 'apply',
+    'set_range', 'clear_range', 'flip_range',
+)
+
+_CLASSES = {}
+
+
+def kind_of(args, kwargs):
+
+    """
+    Will name the kind of the flag argument of a call
+
+    :param args: positional arguments
+    :type args: tuple
+    :param kwargs: keyword arguments
+    :type kwargs: dict
+    :return: 'none', 'int', 'str', 'list' or a type name
+    :rtype: str
+    """
+
+    value = args[0] if args else kwargs.get('bit')
+
+    if value is None:
+        return 'none'
+
+    return type(value).__name__
+
+
+class Recorder(object):
+
+    """
+    A Recorder - counters and latency histograms of flag operations.
+
+    A histogram maps the upper bound of a power of two bucket in
+    nanoseconds to the number of calls, which took at most that long.
+    """
+
+    def __init__(self):
+
+        self.__lock = threading.Lock()
+        self.__stats = {}
+
+        self.local = threading.local()
+
+    def record(self, operation, kind, elapsed):
+
+        """
+        Will count one call
+
+        :param operation: an operation name
+        :type operation: str
+        :param kind: a kind of the argument
+        :type kind: str
+        :param elapsed: nanoseconds
+        :type elapsed: int
+        :return: void
+        :rtype: void
+        """
+
+        bucket = 1 << elapsed.bit_length()
+
+        with self.__lock:
+
+            stats = self.__stats.get(operation)
+
+            if stats is None:
+                stats = self.__stats[operation] = {'calls': 0, 'total_ns': 0, 'kinds': {}, 'histogram': {}}
+
+            stats['calls'] += 1
+            stats['total_ns'] += elapsed
+            stats['kinds'][kind] = stats['kinds'].get(kind, 0) + 1
+            stats['histogram'][bucket] = stats['histogram'].get(bucket, 0) + 1
+
+    def snapshot(self):
+
+        """
+        Will return a copy of all counters
+
+        :return: operation -> {'calls', 'total_ns', 'kinds', 'histogram'}
+        :rtype: dict
+        """
+
+        with self.__lock:
+
+            return dict(
+                (operation, {
+                    'calls': stats['calls'],
+                    'total_ns': stats['total_ns'],
+                    'kinds': dict(stats['kinds']),
+                    'histogram': dict(sorted(stats['histogram'].items())),
+                })
+                for operation, stats in self.__stats.items()
+            )
+
+    def clear(self):
+        """
+        Will drop all counters
+        :return:
+        :rtype:
+        """
+        with self.__lock:
+            self.__stats.clear()
+
+
+def _wrap(operation, func, cls):
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+
+        recorder = self.schema().recorder
+
+        if recorder is None:
+            # instrumentation was disabled, later calls run the plain methods
+            self.__class__ = cls
+            return func(self, *args, **kwargs)
+
+        # nested calls, like flip called by __xor__, belong to the outer one
+        if getattr(recorder.local, 'active', False):
+            return func(self, *args, **kwargs)
+
+        recorder.local.active = True
+        start = time.perf_counter_ns()
+
+        try:
+            return func(self, *args, **kwargs)
+
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            recorder.local.active = False
+
+            recorder.record(operation, kind_of(args, kwargs), elapsed)
+
+    return wrapper
+
+
+def _new(cls, *args):
+
+    # copyreg.__newobj__, which pickle only accepts for objects of cls itself
+    return cls.__new__(cls, *args)
+
+
+def _reduce(cls):
+
+    def reduce_ex(self, protocol):
+
+        reduced = super(type(self), self).__reduce_ex__(protocol)
+
+        # the class is found in the arguments of the reconstructor and replaced by its plain base
+        func = _new if reduced[0] is copyreg.__newobj__ else reduced[0]
+        args = tuple(cls if arg is type(self) else arg for arg in reduced[1])
+
+        return (func, args) + tuple(reduced[2:])
+
+    return reduce_ex
+
+
+def instrumented(cls):
+
+    """
+    Will return the instrumented subclass of a class, it is built once per class
+
+    :param cls: BitnFly, BitnFlyArray, a FlagHandle or a subclass of them
+    :type cls: type
+    :return: a subclass with the same name
+    :rtype: type
+    """
+
+    if cls.__dict__.get('_instrumented', False):
+        return cls
+
+    subclass = _CLASSES.get(cls)
+
+    if subclass is None:
+
+        namespace = {
+            '_instrumented': True, '__slots__': (), '__module__': cls.__module__, '__doc__': cls.__doc__,
+            '__reduce_ex__': _reduce(cls),
+        }
+
+        for operation in OPERATIONS:
+
+            func = getattr(cls, operation, None)
+
+            if func is not None:
+                namespace[operation] = _wrap(operation, func, cls)
+
+        subclass = _CLASSES[cls] = type(cls.__name__, (cls,), namespace)
+
+    return subclass
+
+
+__all__ = [
+    'OPERATIONS',
+    'Recorder',
+    'instrumented',
+]
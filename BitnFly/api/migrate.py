@@ -0,0 +1,436 @@
+"""
+A module with SchemaMigration - moves masks from one options list to another.
+
+Inserting an option in the middle of an options list shifts every bit
+after it, so masks stored with the old list read wrong with the new one.
+A migration compares the two lists - names kept, renamed, dropped and
+inserted - and remaps masks, objects, arrays and codec streams.
+
+Masks are remapped in one of two ways. When the kept flags move in a few
+runs of consecutive bits, as after an insertion or a drop, a run is one
+shift and one and. Otherwise every byte of the old mask is looked up in a
+table byte value -> bits of the new mask, and the lookups are added up -
+the bits of different bytes never collide. Arrays use the same tables as
+uint64 arrays, a gather per byte over a whole chunk, or for wide schemas
+whose tables would not fit in TABLE_LIMIT bytes a gather of the columns of
+an unpacked bit matrix.
+"""
+
+from BitnFly.api.array import BitnFlyArray, WORD_BITS, as_word_matrix, to_words
+from BitnFly.api.bitmap import BYTE_BITS
+from BitnFly.api.codec import ENCODINGS, Decoder, Encoder
+from BitnFly.api.delta import diff
+from BitnFly.api.schema import FlagSchema
+from BitnFly.api.stream import CHUNK_SIZE, chunks
+from BitnFly.api.value import FlagValue
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# max bytes of the uint64 lookup tables of an array migration
+TABLE_LIMIT = 1 << 24
+
+
+class SchemaMigration(object):
+
+    """
+    A SchemaMigration - the difference of two schemas and a remapping of their masks
+
+    :ivar old: a schema masks are migrated from
+    :ivar new: a schema masks are migrated to
+    :ivar sources: new bit position -> old bit position, None for inserted flags
+    :ivar renamed: old name -> new name of renamed flags
+    :ivar dropped: names of old flags without a new position, their bits are discarded
+    :ivar inserted: names of new flags without an old position
+    :ivar moved: names of kept flags, by their new names, whose position has changed
+    :ivar inserted_mask: a mask of the inserted flags
+    :ivar defaults: a mask of new flags set in every migrated mask
+    :ivar runs: a tuple of (old position, new position, mask) of runs of consecutive bits
+    """
+
+    def __init__(self, old, new, renames=None, defaults=None):
+
+        """
+        :param old: the old list of strings or a FlagSchema
+        :type old: list or FlagSchema
+        :param new: the new list of strings or a FlagSchema
+        :type new: list or FlagSchema
+        :param renames: old option name -> new option name, options of the same name are kept
+        :type renames: dict
+        :param defaults: names of inserted options to set in every migrated mask, eg. a new default permission
+        :type defaults: list
+        """
+
+        assert isinstance(old, (list, tuple, FlagSchema)), 'an old attribute must be a list or a FlagSchema'
+        assert isinstance(new, (list, tuple, FlagSchema)), 'a new attribute must be a list or a FlagSchema'
+
+        self.old = old if isinstance(old, FlagSchema) else FlagSchema(old)
+        self.new = new if isinstance(new, FlagSchema) else FlagSchema(new)
+
+        renames = dict((name.upper(), target.upper()) for name, target in (renames or {}).items())
+
+        for name, target in renames.items():
+            assert name in self.old.positions, 'a renamed option {!r} is not in the old schema'.format(name)
+            assert target in self.new.positions, 'a renamed option {!r} is not in the new schema'.format(target)
+
+        sources = [None] * len(self.new)
+
+        for position, name in enumerate(self.old.names):
+
+            target = self.new.positions.get(renames.get(name, name))
+
+            if target is None:
+                continue
+
+            assert sources[target] is None, 'two old options map to {!r}'.format(self.new.names[target])
+            sources[target] = position
+
+        self.sources = tuple(sources)
+        self.renamed = dict((name, target) for name, target in renames.items() if name != target)
+
+        kept = frozenset(source for source in sources if source is not None)
+
+        self.dropped = tuple(name for position, name in enumerate(self.old.names) if position not in kept)
+        self.inserted = tuple(name for name, source in zip(self.new.names, sources) if source is None)
+        self.inserted_mask = sum(1 << self.new.positions[name] for name in self.inserted)
+
+        self.moved = tuple(
+            name for position, (name, source) in enumerate(zip(self.new.names, sources))
+            if source is not None and source != position
+        )
+
+        self.defaults = 0x0
+
+        for name in defaults or ():
+            assert name.upper() in self.inserted, 'a default {!r} is not an inserted option'.format(name)
+            self.defaults |= 1 << self.new.positions[name.upper()]
+
+        self.runs = self._runs()
+
+        self.__size = (len(self.old) + 7) // 8
+        self.__tables = None
+        self.__words = None
+
+    def __repr__(self):
+
+        return '<{}({} -> {} flags, {} renamed, {} dropped, {} inserted, {} moved)>'.format(
+            self.__class__.__name__, len(self.old), len(self.new),
+            len(self.renamed), len(self.dropped), len(self.inserted), len(self.moved)
+        )
+
+    def _runs(self):
+
+        """
+        Will split the kept flags into runs of consecutive old and new positions
+        """
+
+        runs = []
+        pairs = sorted((source, position) for position, source in enumerate(self.sources) if source is not None)
+
+        for old, new in pairs:
+
+            if runs and runs[-1][0] + runs[-1][2] == old and runs[-1][1] + runs[-1][2] == new:
+                runs[-1][2] += 1
+
+            else:
+                runs.append([old, new, 1])
+
+        return tuple((old, new, (1 << length) - 1) for old, new, length in runs)
+
+    def _tables(self):
+
+        """
+        Will return per byte of an old mask a table byte value -> bits of the new mask
+        """
+
+        if self.__tables is None:
+
+            targets = [None] * len(self.old)
+
+            for position, source in enumerate(self.sources):
+                if source is not None:
+                    targets[source] = 1 << position
+
+            tables = []
+
+            for index in range(self.__size):
+
+                bits = [targets[bit] or 0 for bit in range(index << 3, min(len(self.old), (index + 1) << 3))]
+                bits += [0] * (8 - len(bits))
+
+                tables.append(tuple(sum(bits[bit] for bit in BYTE_BITS[value]) for value in range(256)))
+
+            self.__tables = tables
+
+        return self.__tables
+
+    def _word_tables(self):
+
+        """
+        Will return the tables as a uint64 array (bytes, 256, new words), None when they are too large
+        """
+
+        if self.__words is None:
+
+            words = self.new.words
+
+            if self.__size * 256 * words * 8 > TABLE_LIMIT:
+                self.__words = False
+                return None
+
+            tables = numpy.zeros((self.__size, 256, words), dtype=numpy.uint64)
+            values = numpy.arange(256, dtype=numpy.uint64)
+
+            for position, source in enumerate(self.sources):
+
+                if source is None:
+                    continue
+
+                bit = (values >> numpy.uint64(source & 7)) & numpy.uint64(1)
+                tables[source >> 3, :, position // WORD_BITS] |= bit << numpy.uint64(position % WORD_BITS)
+
+            # bytes of dropped flags only are skipped
+            self.__words = [(index, table) for index, table in enumerate(tables) if table.any()]
+
+        return self.__words or None
+
+    def is_identity(self):
+
+        """
+        Will tell whether masks are the same in both schemas, eg. when options were only appended
+
+        :return:
+        :rtype: bool
+        """
+
+        return not (self.dropped or self.moved or self.defaults)
+
+    def changes(self):
+
+        """
+        Will return the changes from the old schema to the new one
+
+        :return: a list of ('rename', old name, new name), ('drop', name, old position),
+            ('insert', name, new position) and ('move', name, old position, new position) tuples
+        :rtype: list
+        """
+
+        result = [('rename', name, target) for name, target in sorted(self.renamed.items())]
+        result.extend(('drop', name, self.old.positions[name]) for name in self.dropped)
+        result.extend(('insert', name, self.new.positions[name]) for name in self.inserted)
+
+        result.extend(
+            ('move', name, self.sources[self.new.positions[name]], self.new.positions[name]) for name in self.moved
+        )
+
+        return result
+
+    def remap(self, mask):
+
+        """
+        Will move the bits of an old mask to their new positions
+
+        :param mask: a mask of the old schema
+        :type mask: int
+        :return: a mask of the new schema
+        :rtype: int
+        """
+
+        if len(self.runs) <= self.__size:
+
+            result = self.defaults
+
+            for old, new, run_mask in self.runs:
+                result |= ((mask >> old) & run_mask) << new
+
+            return result
+
+        data = (mask & self.old.full_mask).to_bytes(self.__size, 'little')
+
+        return sum([table[value] for table, value in zip(self._tables(), data) if value], self.defaults)
+
+    def remap_swap(self, swap):
+
+        """
+        Will remap a swap mask, the swap bits of inserted flags are set
+
+        :param swap: a swap mask of the old schema
+        :type swap: int
+        :return: a swap mask of the new schema
+        :rtype: int
+        """
+
+        return (self.remap(swap) & ~self.defaults) | self.inserted_mask
+
+    def remap_many(self, masks):
+
+        """
+        Will remap many masks
+
+        :param masks: an iterable of ints
+        :type masks: iterable
+        :return: a list of masks of the new schema
+        :rtype: list
+        """
+
+        if len(self.runs) <= self.__size:
+            return [self.remap(mask) for mask in masks]
+
+        tables, size, full_mask, defaults = self._tables(), self.__size, self.old.full_mask, self.defaults
+
+        return [
+            sum([table[value] for table, value in zip(tables, (mask & full_mask).to_bytes(size, 'little')) if value],
+                defaults)
+            for mask in masks
+        ]
+
+    def iter_remap(self, masks, chunk_size=CHUNK_SIZE):
+
+        """
+        Will remap masks a chunk at a time
+
+        :param masks: an iterable of ints, a uint64 array or an iterable of uint64 arrays
+        :type masks: iterable or numpy.ndarray
+        :param chunk_size: masks per chunk
+        :type chunk_size: int
+        :return: a generator of lists of ints or uint64 arrays
+        :rtype: generator
+        """
+
+        for chunk in chunks(masks, chunk_size):
+            yield self.remap_many(chunk) if isinstance(chunk, list) else self.remap_array(chunk, chunk_size)
+
+    def remap_array(self, masks, chunk_size=CHUNK_SIZE):
+
+        """
+        Will remap a uint64 array of masks, a chunk at a time
+
+        :param masks: a 1-D uint64 array for one word schemas, a (rows, words) array or a list of ints
+        :type masks: numpy.ndarray or list
+        :param chunk_size: masks per chunk
+        :type chunk_size: int
+        :return: a uint64 array, 1-D for one word schemas otherwise (rows, words)
+        :rtype: numpy.ndarray
+        """
+
+        if numpy is None:
+            raise ImportError('SchemaMigration.remap_array requires numpy')
+
+        matrix = as_word_matrix(masks, self.old.words) & to_words(self.old.full_mask, self.old.words)
+        result = numpy.zeros((matrix.shape[0], self.new.words), dtype=numpy.uint64)
+
+        for start in range(0, matrix.shape[0], chunk_size):
+            result[start:start + chunk_size] = self._remap_chunk(matrix[start:start + chunk_size])
+
+        return result[:, 0] if self.new.words == 1 else result
+
+    def _remap_chunk(self, matrix):
+
+        """
+        Will remap a (rows, old words) uint64 matrix into a (rows, new words) one
+        """
+
+        data = numpy.ascontiguousarray(matrix, dtype='<u8').view(numpy.uint8)[:, :self.__size]
+        tables = self._word_tables()
+
+        if tables is not None:
+
+            result = numpy.tile(to_words(self.defaults, self.new.words), (matrix.shape[0], 1))
+
+            for index, table in tables:
+                result |= table[data[:, index]]
+
+            return result
+
+        width = len(self.old)
+
+        bits = numpy.zeros((matrix.shape[0], width + 1), dtype=numpy.uint8)
+        bits[:, :width] = numpy.unpackbits(data, axis=1, bitorder='little')[:, :width]
+
+        # inserted flags read the zero column after the old bits
+        columns = numpy.array([width if source is None else source for source in self.sources], dtype=numpy.intp)
+
+        rows = numpy.zeros((matrix.shape[0], self.new.words * WORD_BITS), dtype=numpy.uint8)
+        rows[:, :len(self.new)] = bits[:, columns]
+
+        result = numpy.packbits(rows, axis=1, bitorder='little').view('<u8').astype(numpy.uint64)
+
+        return result | to_words(self.defaults, self.new.words)
+
+    def migrate(self, item, factory=None):
+
+        """
+        Will migrate an int, a FlagValue, a BitnFly like object or a BitnFlyArray.
+        Swap masks are remapped as flags are, with the swap bits of inserted flags set as in a new object,
+        and switch states are kept. The defaults are set in objects which are switched on
+
+        :param item: a mask or an object of the old schema
+        :type item: int, FlagValue, BitnFly, BitnFlyArray
+        :param factory: a callable taking a mask keyword, it makes new objects, by default new.create
+        :type factory: callable
+        :return: a mask or an object of the new schema
+        :rtype: int, FlagValue, BitnFly, BitnFlyArray
+        """
+
+        if isinstance(item, int):
+            return self.remap(item)
+
+        elif isinstance(item, FlagValue):
+            return self.new.value(self.remap(item.get(output=int)))
+
+        elif isinstance(item, BitnFlyArray):
+            return item.migrate(self)
+
+        flags, swap, switch = item.state()
+
+        # while switched off the defaults are clear, as every swap bit is, and on sets them
+        flags = self.remap(flags) if switch else self.remap(flags) & ~self.defaults
+
+        result = (factory or self.new.create)(mask=flags)
+        result.apply_delta(diff(result.state(), (flags, self.remap_swap(swap), switch)))
+
+        return result
+
+    def migrate_file(self, src, dst, chunk_size=CHUNK_SIZE, encoding=None):
+
+        """
+        Will migrate a stream written by the codec with the old schema into a stream of the new one
+
+        :param src: a binary file object to read from
+        :type src: file
+        :param dst: a binary file object to write to
+        :type dst: file
+        :param chunk_size: masks per chunk
+        :type chunk_size: int
+        :param encoding: an encoding of dst, by default the one of src
+        :type encoding: str
+        :return: number of masks
+        :rtype: int
+        """
+
+        decoder = Decoder(src, self.old)
+        names = dict((value, name) for name, value in ENCODINGS.items())
+
+        array = numpy is not None and decoder.encoding == ENCODINGS['dense']
+        count = 0
+
+        with Encoder(dst, self.new, encoding or names[decoder.encoding]) as encoder:
+
+            while True:
+
+                chunk = decoder.read_array(chunk_size) if array else decoder.read(chunk_size)
+
+                if not len(chunk):
+                    break
+
+                encoder.write_many(self.remap_array(chunk, chunk_size) if array else self.remap_many(chunk))
+                count += len(chunk)
+
+        return count
+
+
+__all__ = [
+    'SchemaMigration',
+]
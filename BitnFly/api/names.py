@@ -0,0 +1,254 @@
+"""
+A module with NameDecoder - a bulk decoder of masks into flag names.
+
+A mask is read as little endian bytes and only its non zero bytes are
+visited. Every byte index has lookup tables byte value -> names, byte
+value -> pre joined text and byte value -> pre joined json, built on
+first use, so decoding a mask costs one table lookup per non zero byte
+and one join. Masks of up to SCAN_BYTES are zipped with their tables,
+wider ones are scanned for non zero bytes by a regular expression, which
+runs in C and skips the empty bytes of a wide, sparse mask. Tables are 8
+bits wide: a 16 bit table is 65536 entries per pair of bytes, too much
+for wide schemas and slower to build than it saves.
+
+Masks can be ints, BitnFly like objects or uint64 arrays - rows of an
+array are decoded from their bytes without making ints.
+"""
+
+import json
+
+from itertools import chain
+
+from BitnFly.api.array import to_words
+from BitnFly.api.schema import NONZERO_BYTE
+from BitnFly.api.stream import CHUNK_SIZE, chunks
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+FORMATS = ('text', 'json')
+
+# masks of up to this many bytes are decoded byte by byte, wider ones are scanned for non zero bytes
+SCAN_BYTES = 32
+
+
+class NameDecoder(object):
+
+    """
+    A NameDecoder - turns many masks of a schema into lists of names or text lines
+    """
+
+    def __init__(self, schema, separator='; '):
+
+        """
+        :param schema: a schema of the masks
+        :type schema: FlagSchema
+        :param separator: a separator of names in text
+        :type separator: str
+        """
+
+        self.schema = schema
+        self.separator = separator
+
+        self.__size = (len(schema) + 7) // 8
+        self.__tables = {'names': {}, 'text': {}, 'json': {}}
+
+    def _table(self, kind, index):
+
+        """
+        Will return a table byte value -> names, text or json of the flags of the byte at index
+        """
+
+        tables = self.__tables[kind]
+        table = tables.get(index)
+
+        if table is None:
+
+            names = self.schema.byte_names(index)
+
+            if kind == 'text':
+                table = tuple(self.separator.join(item) for item in names)
+
+            elif kind == 'json':
+                table = tuple(', '.join(json.dumps(name) for name in item) for item in names)
+
+            else:
+                table = names
+
+            tables[index] = table
+
+        return table
+
+    def _rows(self, masks, chunk_size):
+
+        """
+        Will turn masks into lists of little endian bytes cut to the schema, a list per chunk
+        """
+
+        full_mask, size = self.schema.full_mask, self.__size
+
+        for chunk in chunks(masks, chunk_size):
+
+            if isinstance(chunk, list):
+
+                if not isinstance(chunk[0], int):
+                    chunk = [mask.get(output=int) if hasattr(mask, 'get') else int(mask) for mask in chunk]
+
+                yield [(mask & full_mask).to_bytes(size, 'little') for mask in chunk]
+                continue
+
+            matrix = chunk.reshape(-1, 1) if chunk.ndim == 1 else chunk
+            matrix = numpy.ascontiguousarray(matrix & to_words(full_mask, self.schema.words), dtype='<u8')
+
+            data, row = matrix.tobytes(), matrix.shape[1] << 3
+            yield [data[start:start + row] for start in range(0, len(data), row)]
+
+    def _parts(self, rows, kind):
+
+        """
+        Will return the table entries of the non zero bytes of every row
+        """
+
+        if self.__size <= SCAN_BYTES:
+
+            # every byte is looked at, zip runs in C and is faster than a scan for a few bytes
+            tables = [self._table(kind, index) for index in range(self.__size)]
+            return [[table[value] for table, value in zip(tables, data) if value] for data in rows]
+
+        result = []
+        table = self._table
+
+        for data in rows:
+
+            parts = []
+
+            for match in NONZERO_BYTE.finditer(data):
+                index = match.start()
+                parts.append(table(kind, index)[data[index]])
+
+            result.append(parts)
+
+        return result
+
+    def _lines(self, rows, format):
+
+        if format == 'text':
+            return [self.separator.join(parts) for parts in self._parts(rows, 'text')]
+
+        return ['[' + ', '.join(parts) + ']' for parts in self._parts(rows, 'json')]
+
+    def names(self, mask):
+
+        """
+        Will return the names of the flags set in mask
+
+        :param mask: an int or a BitnFly like object
+        :type mask: int or BitnFly
+        :return: a list of lower cased names, in bit order
+        :rtype: list
+        """
+
+        return self.schema.names_of(mask.get(output=int) if hasattr(mask, 'get') else int(mask))
+
+    def text(self, mask):
+
+        """
+        Will return the names of the flags set in mask joined by the separator
+
+        :param mask: an int or a BitnFly like object
+        :type mask: int or BitnFly
+        :return: text
+        :rtype: str
+        """
+
+        return next(self.iter_text([mask]))
+
+    def iter_names(self, masks, chunk_size=CHUNK_SIZE):
+
+        """
+        Will decode many masks into lists of names, ready for json
+
+        :param masks: an iterable of ints or BitnFly like objects, a uint64 array or an iterable of uint64 arrays
+        :type masks: iterable or numpy.ndarray
+        :param chunk_size: masks per chunk
+        :type chunk_size: int
+        :return: a generator of lists of names
+        :rtype: generator
+        """
+
+        flatten = chain.from_iterable
+
+        for rows in self._rows(masks, chunk_size):
+            for parts in self._parts(rows, 'names'):
+                yield list(flatten(parts))
+
+    def iter_text(self, masks, chunk_size=CHUNK_SIZE):
+
+        """
+        Will decode many masks into the names joined by the separator
+
+        :param masks: see iter_names
+        :type masks: iterable or numpy.ndarray
+        :param chunk_size: masks per chunk
+        :type chunk_size: int
+        :return: a generator of str
+        :rtype: generator
+        """
+
+        for rows in self._rows(masks, chunk_size):
+            for line in self._lines(rows, 'text'):
+                yield line
+
+    def iter_json(self, masks, chunk_size=CHUNK_SIZE):
+
+        """
+        Will decode many masks into json arrays of names, the same as json.dumps of iter_names
+
+        :param masks: see iter_names
+        :type masks: iterable or numpy.ndarray
+        :param chunk_size: masks per chunk
+        :type chunk_size: int
+        :return: a generator of str
+        :rtype: generator
+        """
+
+        for rows in self._rows(masks, chunk_size):
+            for line in self._lines(rows, 'json'):
+                yield line
+
+    def write(self, masks, fp, format='text', chunk_size=CHUNK_SIZE):
+
+        """
+        Will write a line per mask into a text file, a chunk of lines per write call
+
+        :param masks: see iter_names
+        :type masks: iterable or numpy.ndarray
+        :param fp: a text file object
+        :type fp: file
+        :param format: 'text' for the names joined by the separator, 'json' for a json array per line
+        :type format: str
+        :param chunk_size: masks per chunk and lines per write call
+        :type chunk_size: int
+        :return: a number of lines written
+        :rtype: int
+        """
+
+        assert format in FORMATS, 'a format must be one of {}'.format(', '.join(FORMATS))
+
+        count = 0
+
+        for rows in self._rows(masks, chunk_size):
+
+            fp.write('\n'.join(self._lines(rows, format)))
+            fp.write('\n')
+
+            count += len(rows)
+
+        return count
+
+
+__all__ = [
+    'NameDecoder',
+]
@@ -0,0 +1,308 @@
+"""
+A module with operation sequences and their fusion.
+
+An operation is a name with an optional flag argument, written as a
+tuple like ('flip', ['admin', 'staff']) or ('or', 'can_read'), or as a
+bare name like 'off'. The names follow the BitnFly methods:
+flip, xor, or, off, on and reset.
+
+A Plan fuses a sequence into masks of one formula per bit. With f, s
+and i the flags, the swap mask and the reset flags before the plan::
+
+    flags = c0 ^ (f & c1) ^ (s & c2) ^ (f & s & c3) ^ (i & ci)
+    swap  = d0 ^ (s & d1)
+
+xor, or, on and reset only change the masks, off multiplies the flags
+formula by ~swap. The switch state before the plan only matters for an
+on before the first off or reset, so a plan is compiled once per
+starting switch state.
+"""
+
+OPERATIONS = ('flip', 'xor', 'or', 'off', 'on', 'reset')
+
+
+def normalize_ops(schema, ops):
+
+    """
+    Will resolve the flag arguments of operations into masks
+
+    :param schema: a schema
+    :type schema: FlagSchema
+    :param ops: operations
+    :type ops: iterable
+    :return: a list of (name, mask) tuples, mask is None for off, on and reset
+    :rtype: list
+    """
+
+    normalized = []
+
+    for op in ops:
+
+        name, args = (op, ()) if isinstance(op, str) else (op[0], tuple(op[1:]))
+
+        if name not in OPERATIONS:
+            raise ValueError('unknown operation {!r}'.format(name))
+
+        if name in ('flip', 'xor', 'or'):
+
+            if len(args) != 1:
+                raise ValueError('an operation {!r} needs one argument'.format(name))
+
+            if name == 'or':
+                normalized.append((name, schema.or_mask(args[0])))
+
+            else:
+                normalized.append(('xor', schema.mask_of(args[0], '__xor__')))
+
+        else:
+
+            if args:
+                raise ValueError('an operation {!r} takes no argument'.format(name))
+
+            normalized.append((name, None))
+
+    return normalized
+
+
+def fuse(schema, ops):
+
+    """
+    Will fuse operations, applied to states which all start with a full swap mask
+    and switched on, into one function flags -> (flags & and_mask) ^ xor_mask.
+    reset restores the flags the states started with.
+
+    :param schema: a schema
+    :type schema: FlagSchema
+    :param ops: operations or a Plan
+    :type ops: iterable or Plan
+    :return: a tuple of and_mask and xor_mask
+    :rtype: tuple
+    """
+
+    plan = ops if isinstance(ops, Plan) else Plan(schema, ops)
+    c0, c1, c2, c3, ci, _, _, _ = plan.program(True)
+
+    full_mask = schema.full_mask
+
+    return (c1 ^ (c3 & full_mask) ^ ci) & full_mask, (c0 ^ (c2 & full_mask)) & full_mask
+
+
+class Plan(object):
+
+    """
+    A Plan - a recorded sequence of operations fused into a few masks.
+
+    A plan can be applied to any number of states of its schema with
+    BitnFly.apply. A plan made by BitnFly.batch is bound to that object and
+    is applied by commit, or at the end of a with block.
+    """
+
+    def __init__(self, schema, ops=(), target=None):
+
+        """
+        :param schema: a schema
+        :type schema: FlagSchema
+        :param ops: operations to start with
+        :type ops: iterable
+        :param target: an object committed to
+        :type target: BitnFly
+        """
+
+        self.schema = schema
+        self.ops = []
+
+        self.__target = target
+        self.__programs = {}
+
+        self.extend(ops)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, self.ops)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+
+        if exc_type is None:
+            self.commit()
+
+    def __or__(self, bits):
+
+        """
+        Will record an or
+
+        :param bits: can be an int, a str, a list of int or a list of str
+        :type bits: int, str, list
+        :return: self
+        :rtype: Plan
+        """
+
+        return self._record('or', self.schema.or_mask(bits))
+
+    def __xor__(self, bits):
+        return self.flip(bits)
+
+    def _record(self, name, mask=None):
+
+        self.ops.append((name, mask))
+        self.__programs.clear()
+
+        return self
+
+    def extend(self, ops):
+
+        """
+        Will record more operations
+
+        :param ops: operations
+        :type ops: iterable
+        :return: self
+        :rtype: Plan
+        """
+
+        self.ops.extend(normalize_ops(self.schema, ops))
+        self.__programs.clear()
+
+        return self
+
+    def flip(self, bits):
+        """
+        Will record a flip
+        :param bits: can be an int, a str, a list of int or a list of str
+        :type bits: int, str, list
+        :return: self
+        :rtype: Plan
+        """
+        return self._record('xor', self.schema.mask_of(bits, '__xor__'))
+
+    def off(self):
+        """
+        Will record an off
+        :return: self
+        :rtype: Plan
+        """
+        return self._record('off')
+
+    def on(self):
+        """
+        Will record an on
+        :return: self
+        :rtype: Plan
+        """
+        return self._record('on')
+
+    def reset(self):
+        """
+        Will record a reset
+        :return: self
+        :rtype: Plan
+        """
+        return self._record('reset')
+
+    def program(self, switch_state):
+
+        """
+        Will fuse the operations for a starting switch state, the result is cached
+
+        :param switch_state: the switch state before the plan
+        :type switch_state: bool
+        :return: a tuple of c0, c1, c2, c3, ci, d0, d1 masks and the final switch state
+        :rtype: tuple
+        """
+
+        switch_state = bool(switch_state)
+        program = self.__programs.get(switch_state)
+
+        if program is None:
+            program = self.__programs[switch_state] = self._compile(switch_state)
+
+        return program
+
+    def _compile(self, switch_state):
+
+        c0, c1, c2, c3, ci = 0x0, -1, 0x0, 0x0, 0x0
+        d0, d1 = 0x0, -1
+
+        for name, mask in self.ops:
+
+            if name == 'xor':
+                c0 ^= mask
+                d0 ^= mask
+
+            elif name == 'or':
+
+                keep = ~mask
+
+                c0, c1, c2, c3, ci = c0 | mask, c1 & keep, c2 & keep, c3 & keep, ci & keep
+                d0, d1 = d0 | mask, d1 & keep
+
+            elif name == 'off':
+
+                # flags & ~swap == flags ^ flags * swap
+                c0, c1, c2, c3, ci = (
+                    c0 ^ (c0 & d0),
+                    c1 ^ (c1 & d0),
+                    c2 ^ (c0 & d1) ^ (c2 & d0) ^ (c2 & d1),
+                    c3 ^ (c1 & d1) ^ (c3 & d0) ^ (c3 & d1),
+                    ci ^ (ci & d0),
+                )
+
+                switch_state = False
+
+            elif name == 'on':
+
+                if switch_state is False:
+                    c0 ^= d0
+                    c2 ^= d1
+                    switch_state = True
+
+            else:
+                # as BitnFly.reset, the switch state is kept
+                c0, c1, c2, c3, ci = 0x0, 0x0, 0x0, 0x0, -1
+                d0, d1 = self.schema.full_mask, 0x0
+
+        return c0, c1, c2, c3, ci, d0, d1, switch_state
+
+    def run(self, flags, swap_mask, switch_state, initial):
+
+        """
+        Will compute the state after the plan
+
+        :param flags: flags
+        :type flags: int
+        :param swap_mask: a swap mask
+        :type swap_mask: int
+        :param switch_state: a switch state
+        :type switch_state: bool
+        :param initial: flags restored by reset
+        :type initial: int
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        c0, c1, c2, c3, ci, d0, d1, switch_state = self.program(switch_state)
+
+        flags = c0 ^ (flags & c1) ^ (swap_mask & c2) ^ (flags & swap_mask & c3) ^ (initial & ci)
+
+        return flags, d0 ^ (swap_mask & d1), switch_state
+
+    def commit(self):
+
+        """
+        Will apply the plan to the object it is bound to
+
+        :return: the object
+        :rtype: BitnFly
+        """
+
+        assert self.__target is not None, 'a plan is not bound to an object'
+        return self.__target.apply(self)
+
+
+__all__ = [
+    'OPERATIONS',
+    'Plan',
+    'fuse',
+    'normalize_ops',
+]
@@ -0,0 +1,862 @@
+"""
+A module with the flag schema - a shared, precompiled description of
+the options list used by BitnFly objects
+"""
+
+import re
+import weakref
+
+from hashlib import sha1
+
+from collections.abc import Mapping
+
+from BitnFly.api.bitmap import BYTE_BITS, iter_positions
+from BitnFly.api.cache import LRUCache
+from BitnFly.api.instrument import Recorder
+from BitnFly.api.plan import Plan, normalize_ops
+
+NONZERO_BYTE = re.compile(b'[^\\x00]')
+
+BACKENDS = ('dense', 'sparse')
+
+# types of the items of a flag argument which can be cached
+KEY_TYPES = frozenset((int, str))
+
+
+class OptionMap(Mapping):
+
+    """
+    An OptionMap - an ordered, read only mapping option name -> bit.
+
+    Bits are made on access, a schema of n options keeps n positions
+    instead of n ints of up to n bits each.
+    """
+
+    def __init__(self, names, positions):
+
+        """
+        :param names: upper cased option names in order
+        :type names: tuple
+        :param positions: option name -> bit position
+        :type positions: dict
+        """
+
+        self.__names = names
+        self.__positions = positions
+
+    def __getitem__(self, name):
+        return 1 << self.__positions[name]
+
+    def __contains__(self, name):
+        return name in self.__positions
+
+    def __iter__(self):
+        return iter(self.__names)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, list(self.items()))
+
+
+class BitMap(Mapping):
+
+    """
+    A BitMap - a read only mapping bit -> option name, the reverse of an OptionMap
+    """
+
+    def __init__(self, names):
+
+        """
+        :param names: upper cased option names in order
+        :type names: tuple
+        """
+
+        self.__names = names
+
+    def __getitem__(self, bit):
+
+        if isinstance(bit, int) and bit > 0 and not bit & (bit - 1) and bit.bit_length() <= len(self.__names):
+            return self.__names[bit.bit_length() - 1]
+
+        raise KeyError(bit)
+
+    def __iter__(self):
+        return (1 << position for position in range(len(self.__names)))
+
+    def __len__(self):
+        return len(self.__names)
+
+
+class FlagSchema(object):
+
+    """
+    A FlagSchema - holds everything that depends only on the options list.
+
+    A schema is built once and can be shared by any number of BitnFly
+    objects, so they only have to keep their own integer state.
+
+    :ivar names: a tuple of upper cased option names, a name's index is its bit position
+    :ivar options: an ordered mapping option name -> bit
+    :ivar bits: a mapping bit -> option name
+    :ivar positions: a dictionary option name -> bit position
+    :ivar full_mask: all bits of the schema set
+    :ivar words: number of 64 bit words needed to hold the full mask
+    :ivar fingerprint: 8 bytes identifying the option names and their order
+    :ivar recorder: a Recorder while instrumentation is enabled otherwise None
+    :ivar backend: 'dense' or 'sparse', the class of objects made by create
+    :ivar implied: bit position -> mask of the flag and every flag it implies, for flags with rules
+    :ivar implied_by: bit position -> mask of the flag and every flag implying it, for implied flags
+    :ivar groups: a dictionary group name -> mask of named groups of flags
+    """
+
+    def __init__(self, options, cache_size=256, backend='dense', implies=None):
+
+        """
+        The constructor will build the lookup tables of names and positions, caches, the intern table
+        and the fingerprint are built on first use, so a schema made per object stays cheap
+
+        :param options: list of strings, each value will be represented as pow(index, 2) from left to right
+        :type options: list
+        :param cache_size: how many compiled expressions, plans and argument masks to keep
+        :type cache_size: int
+        :param backend: 'dense' for BitnFly objects, 'sparse' for SparseBitnFly objects
+        :type backend: str
+        :param implies: option name -> names of options it implies, eg. {'admin': ['moderator', 'can_edit']}
+        :type implies: dict
+        """
+
+        assert isinstance(options, (list, tuple)), 'an options attribute must be a list'
+        assert backend in BACKENDS, 'a backend must be one of {}'.format(BACKENDS)
+
+        self.names = tuple(opt.upper() for opt in options)
+        self.positions = dict(zip(self.names, range(len(self.names))))
+
+        self.options = OptionMap(self.names, self.positions)
+        self.bits = BitMap(self.names)
+
+        self.full_mask = (1 << len(self.names)) - 1
+        self.words = max(1, (len(self.names) + 63) // 64)
+
+        self.__fingerprint = None
+
+        self.__cache_size = cache_size
+        self.__predicates = None
+        self.__plans = None
+        self.__masks = None
+        self.__values = None
+        self.__byte_names = {}
+
+        self.groups = {}
+
+        self.recorder = None
+        self.backend = backend
+
+        self.implied, self.implied_by = self._closures(implies) if implies else ({}, {})
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+
+        # interned values are weak references, a copy starts with none and is not instrumented
+        state = self.__dict__.copy()
+        state['_FlagSchema__values'] = None
+        state['recorder'] = None
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    @property
+    def fingerprint(self):
+
+        """
+        8 bytes identifying the option names and their order, hashed on first use
+
+        :return: a fingerprint
+        :rtype: bytes
+        """
+
+        if self.__fingerprint is None:
+            self.__fingerprint = sha1('\n'.join(self.names).encode('utf-8')).digest()[:8]
+
+        return self.__fingerprint
+
+    def __contains__(self, item):
+        return item.upper() in self.positions
+
+    def __repr__(self):
+
+        return '{}({})'.format(
+            self.__class__.__name__,
+            [flag.lower() for flag in self.names]
+        )
+
+    def is_bit(self, bit):
+
+        """
+        Test whether bit is a single bit of this schema, without scanning the options
+
+        :param bit: a bit
+        :type bit: int
+        :return: True if bit is a power of two covered by the schema otherwise False
+        :rtype: bool
+        """
+
+        return bit > 0 and not bit & (bit - 1) and bit.bit_length() <= len(self.names)
+
+    def position(self, name):
+
+        """
+        Will return the bit position of an option name
+
+        :param name: an upper cased option name
+        :type name: str
+        :return: the bit position
+        :rtype: int
+        """
+
+        try:
+            return self.positions[name]
+
+        except KeyError:
+            raise ValueError('{!r} is not an option'.format(name))
+
+    def range_mask(self, start, stop):
+
+        """
+        Will return a mask of the bit positions start, start + 1, ... stop - 1
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: a mask
+        :rtype: int
+        """
+
+        assert 0 <= start <= stop <= len(self.names), 'a range must be within 0 and {}'.format(len(self.names))
+
+        return ((1 << (stop - start)) - 1) << start
+
+    def positions_mask(self, positions):
+
+        """
+        Will return a mask of bit positions, built in one pass over a byte buffer
+        instead of one shift and or of a growing int per position
+
+        :param positions: bit positions
+        :type positions: iterable
+        :return: a mask
+        :rtype: int
+        """
+
+        size = len(self.names)
+        buf = bytearray((size + 7) // 8)
+
+        for position in positions:
+
+            assert 0 <= position < size, 'a position must be within 0 and {}'.format(size)
+            buf[position >> 3] |= 1 << (position & 7)
+
+        return int.from_bytes(bytes(buf), 'little')
+
+    def mask_of(self, bits, operation='__or__'):
+
+        """
+        Will turn a flag argument into a single mask, the same way BitnFly reads it:
+        an int is taken only if it is a single bit of the schema, a str is an option or a group name
+        and a sequence must contain only ints or only strs, otherwise nothing is taken.
+        Masks of str, list, tuple and frozenset arguments are cached
+
+        :param bits: can be an int, a str, or a list, a tuple or a frozenset of int or of str
+        :type bits: int, str, list, tuple, frozenset
+        :param operation: '__xor__' will fold a sequence with xor, so repeated flags cancel, any other with or
+        :type operation: str
+        :return: a mask
+        :rtype: int
+        """
+
+        if isinstance(bits, int):
+            return bits if self.is_bit(bits) else 0x0
+
+        key = self._key(bits, operation)
+
+        if key is None:
+            return self._resolve(bits, operation)
+
+        masks = self.__masks
+
+        if masks is None:
+            masks = self.__masks = LRUCache(self.__cache_size)
+
+        mask = masks.get(key)
+
+        if mask is None:
+            mask = masks.put(key, self._resolve(bits, operation))
+
+        return mask
+
+    def or_mask(self, bits):
+
+        """
+        Will return the mask set by |, the flags of bits with every flag they imply
+
+        :param bits: a flag argument, see mask_of
+        :type bits: int, str, list, tuple, frozenset
+        :return: a mask
+        :rtype: int
+        """
+
+        if not self.implied:
+            return self.mask_of(bits, '__or__')
+
+        key = self._key(bits, '__or__')
+
+        if key is None:
+            return self.expand(self.mask_of(bits, '__or__'))
+
+        masks = self.__masks
+
+        if masks is None:
+            masks = self.__masks = LRUCache(self.__cache_size)
+
+        key = ('implied', key)
+        mask = masks.get(key)
+
+        if mask is None:
+            mask = masks.put(key, self.expand(self.mask_of(bits, '__or__')))
+
+        return mask
+
+    def group(self, name, bits):
+
+        """
+        Will register a named group of flags, its name can be used wherever an option name can
+
+        :param name: a group name, it must not be an option name
+        :type name: str
+        :param bits: the flags of the group, see mask_of
+        :type bits: int, str, list, tuple, frozenset
+        :return: the mask of the group
+        :rtype: int
+        """
+
+        name = name.upper()
+
+        assert name not in self.positions, '{!r} is an option name'.format(name)
+
+        mask = self.mask_of(bits, '__or__')
+
+        self.groups[name] = mask
+
+        # masks, predicates and plans made with an old definition of the group are dropped
+        for cache in (self.__masks, self.__predicates, self.__plans):
+            if cache is not None:
+                cache.clear()
+
+        return mask
+
+    def positions_of(self, bits, operation='__or__'):
+
+        """
+        Will turn a flag argument into a set of bit positions, read the same way as mask_of
+
+        :param bits: can be an int, a str, or a list, a tuple or a frozenset of int or of str
+        :type bits: int, str, list, tuple, frozenset
+        :param operation: '__xor__' will fold a sequence with xor, so repeated flags cancel, any other with or
+        :type operation: str
+        :return: bit positions
+        :rtype: set
+        """
+
+        if isinstance(bits, int):
+            return set((bits.bit_length() - 1,)) if self.is_bit(bits) else set()
+
+        if isinstance(bits, str):
+            return self._name_positions(bits)
+
+        positions = set()
+
+        if isinstance(bits, (list, tuple, frozenset)):
+
+            if all(isinstance(bit, int) for bit in bits):
+                parts = [set((bit.bit_length() - 1,)) for bit in bits if self.is_bit(bit)]
+
+            elif all(isinstance(bit, str) for bit in bits):
+                parts = [self._name_positions(bit) for bit in bits]
+
+            else:
+                return positions
+
+            if operation == '__xor__':
+                for part in parts:
+                    positions ^= part
+
+            else:
+                for part in parts:
+                    positions |= part
+
+        return positions
+
+    @staticmethod
+    def _key(bits, operation):
+
+        """
+        Will return a cache key of a flag argument or None if it can not be cached
+
+        :param bits: a flag argument
+        :type bits: str, list, tuple, frozenset
+        :param operation: an operation
+        :type operation: str
+        :return: a key
+        :rtype: object
+        """
+
+        kind = type(bits)
+
+        # a str reads the same for both operations, a group in a sequence folds differently under xor
+        if kind is str:
+            return bits
+
+        if kind is tuple or kind is list or kind is frozenset:
+
+            # 1.0 or True are equal to 1 and would share its key, only exact ints and strs are cached
+            if not KEY_TYPES.issuperset(map(type, bits)):
+                return None
+
+            return operation, bits if kind is frozenset else tuple(bits)
+
+        return None
+
+    def _name_mask(self, name):
+
+        name = name.upper()
+        position = self.positions.get(name)
+
+        if position is not None:
+            return 1 << position
+
+        mask = self.groups.get(name)
+
+        if mask is None:
+            raise ValueError('{!r} is not an option'.format(name))
+
+        return mask
+
+    def _name_positions(self, name):
+
+        position = self.positions.get(name.upper())
+
+        if position is not None:
+            return set((position,))
+
+        return set(iter_positions(self._name_mask(name)))
+
+    def _resolve(self, bits, operation):
+
+        """
+        Will resolve a str or a sequence argument without the cache
+        """
+
+        if isinstance(bits, str):
+            return self._name_mask(bits)
+
+        mask = 0x0
+
+        if isinstance(bits, (list, tuple, frozenset)):
+
+            if all(isinstance(bit, int) for bit in bits):
+                bits = [bit for bit in bits if self.is_bit(bit)]
+
+            elif all(isinstance(bit, str) for bit in bits):
+                bits = [self._name_mask(bit) for bit in bits]
+
+            else:
+                return mask
+
+            if operation == '__xor__':
+                for bit in bits:
+                    mask ^= bit
+
+            else:
+                for bit in bits:
+                    mask |= bit
+
+        return mask
+
+    def byte_names(self, index):
+
+        """
+        Will return a table byte value -> names of the flags set in it, for the byte at index
+        of a mask. Tables are built on first use, so wide schemas only pay for the bytes seen
+
+        :param index: a byte index, the lowest byte is 0
+        :type index: int
+        :return: a tuple of 256 tuples of lower cased names
+        :rtype: tuple
+        """
+
+        table = self.__byte_names.get(index)
+
+        if table is None:
+
+            names = tuple(name.lower() for name in self.names[index << 3:(index << 3) + 8])
+            count = len(names)
+
+            table = self.__byte_names[index] = tuple(
+                tuple(names[bit] for bit in BYTE_BITS[value] if bit < count) for value in range(256)
+            )
+
+        return table
+
+    def iter_names(self, mask):
+
+        """
+        Will iterate the lower cased names of the flags set in mask, in bit order.
+        Zero bytes are skipped by a regular expression scan, so the work follows the set bits
+
+        :param mask: a mask, bits outside of the schema are ignored
+        :type mask: int
+        :return: a generator of names
+        :rtype: generator
+        """
+
+        mask &= self.full_mask
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+        for match in NONZERO_BYTE.finditer(data):
+
+            index = match.start()
+
+            for name in self.byte_names(index)[data[index]]:
+                yield name
+
+    def names_of(self, mask):
+
+        """
+        Will return the lower cased names of the flags set in mask, see iter_names
+
+        :param mask: a mask
+        :type mask: int
+        :return: a list of names
+        :rtype: list
+        """
+
+        mask &= self.full_mask
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+        names = []
+
+        for match in NONZERO_BYTE.finditer(data):
+            index = match.start()
+            names.extend(self.byte_names(index)[data[index]])
+
+        return names
+
+    def expand(self, mask):
+
+        """
+        Will add every flag implied by a flag of mask
+
+        :param mask: a mask
+        :type mask: int
+        :return: a mask
+        :rtype: int
+        """
+
+        implied = self.implied
+
+        if not implied:
+            return mask
+
+        for position in iter_positions(mask & self.full_mask):
+            mask |= implied.get(position, 0x0)
+
+        return mask
+
+    def implied_by_mask(self, mask):
+
+        """
+        Will add every flag implying a flag of mask, flags & implied_by_mask(mask)
+        tests mask against the effective flags
+
+        :param mask: a mask
+        :type mask: int
+        :return: a mask
+        :rtype: int
+        """
+
+        implied_by = self.implied_by
+
+        if not implied_by:
+            return mask
+
+        # bits outside of the schema, eg. of a negative int, have no rules
+        for position in iter_positions(mask & self.full_mask):
+            mask |= implied_by.get(position, 0x0)
+
+        return mask
+
+    def compile(self, expression):
+
+        """
+        Will compile an expression like "can_read & can_edit & ~anonymous | admin"
+        into a FlagPredicate. Compiled expressions are cached by their text.
+        A name tests the effective flags, as & does: it matches when the flag or any flag
+        implying it is set. get and names return the stored flags only.
+
+        :param expression: option names combined with &, |, ~ and parentheses
+        :type expression: str
+        :return: a predicate
+        :rtype: FlagPredicate
+        """
+
+        if self.__predicates is None:
+            self.__predicates = LRUCache(self.__cache_size)
+
+        predicate = self.__predicates.get(expression)
+
+        if predicate is None:
+
+            from BitnFly.api.expr import FlagPredicate
+            predicate = self.__predicates.put(expression, FlagPredicate(self, expression))
+
+        return predicate
+
+    def plan(self, ops):
+
+        """
+        Will return a fused Plan of operations, plans are cached by their resolved operations
+
+        :param ops: operations, see BitnFly.api.plan
+        :type ops: iterable
+        :return: a plan
+        :rtype: Plan
+        """
+
+        if self.__plans is None:
+            self.__plans = LRUCache(self.__cache_size)
+
+        key = tuple(normalize_ops(self, ops))
+        plan = self.__plans.get(key)
+
+        if plan is None:
+
+            plan = Plan(self)
+            plan.ops.extend(key)
+
+            self.__plans.put(key, plan)
+
+        return plan
+
+    def create(self, **kwargs):
+
+        """
+        Will create an object of the schema backend
+
+        :param kwargs: passed to the constructor, eg. an 'output' or a 'mask'
+        :type kwargs: dict
+        :return: a new object
+        :rtype: BitnFly or SparseBitnFly
+        """
+
+        if self.backend == 'sparse':
+            from BitnFly.api.sparse import SparseBitnFly
+            return SparseBitnFly(self, **kwargs)
+
+        from BitnFly.api import BitnFly
+        return BitnFly(self, **kwargs)
+
+    def value(self, mask=None):
+
+        """
+        Will return the interned FlagValue of a mask, one object per distinct mask
+        while any of them is referenced
+
+        :param mask: flags, all flags by default
+        :type mask: int
+        :return: an interned value
+        :rtype: FlagValue
+        """
+
+        mask = self.full_mask if mask is None else int(mask) & self.full_mask
+
+        if self.__values is None:
+            self.__values = weakref.WeakValueDictionary()
+
+        value = self.__values.get(mask)
+
+        if value is None:
+
+            from BitnFly.api.value import FlagValue
+            value = self.__values.setdefault(mask, FlagValue(self, mask))
+
+        return value
+
+    def is_interned(self, value):
+
+        """
+        Will tell whether a value is the interned one of its mask
+
+        :param value: a value of this schema
+        :type value: FlagValue
+        :return:
+        :rtype: bool
+        """
+
+        return self.__values is not None and self.__values.get(value.get()) is value
+
+    def migration(self, new, renames=None, defaults=None):
+
+        """
+        Will compare this schema with a new one and return a migration of masks, see BitnFly.api.migrate
+
+        :param new: the new list of strings or a FlagSchema
+        :type new: list or FlagSchema
+        :param renames: old option name -> new option name
+        :type renames: dict
+        :param defaults: names of inserted options to set in every migrated mask
+        :type defaults: list
+        :return: a migration
+        :rtype: SchemaMigration
+        """
+
+        from BitnFly.api.migrate import SchemaMigration
+        return SchemaMigration(self, new, renames, defaults)
+
+    def make_class(self, typename, properties=False, base=None, module=None):
+
+        """
+        Will generate a BitnFly subclass bound to this schema, see BitnFly.api.classes
+
+        :param typename: a class name
+        :type typename: str
+        :param properties: add is_<name> properties and set_<name> methods
+        :type properties: bool
+        :param base: a class taking a schema as its first argument, BitnFly by default
+        :type base: type
+        :param module: the __module__ of the class, by default the caller's
+        :type module: str
+        :return: a new class
+        :rtype: type
+        """
+
+        from BitnFly.api.classes import caller_module, make_class
+        return make_class(typename, self, properties, base, module or caller_module())
+
+    def instrument(self, recorder=None):
+
+        """
+        Will enable instrumentation of objects built from now on with this schema
+
+        :param recorder: a recorder to count into, by default a new one
+        :type recorder: Recorder
+        :return: the recorder
+        :rtype: Recorder
+        """
+
+        self.recorder = recorder or Recorder()
+        return self.recorder
+
+    def uninstrument(self):
+
+        """
+        Will disable instrumentation, objects built while it was enabled stop recording
+        and go back to their own class on their next call
+
+        :return: the recorder which was used or None
+        :rtype: Recorder
+        """
+
+        recorder, self.recorder = self.recorder, None
+        return recorder
+
+    def _closures(self, implies):
+
+        """
+        Will compute the transitive closures of implication rules, both ways
+
+        :param implies: option name -> names of options it implies
+        :type implies: dict
+        :return: a tuple of implied and implied_by dictionaries
+        :rtype: tuple
+        """
+
+        edges, reverse = {}, {}
+
+        for name, targets in implies.items():
+
+            source = self.position(name.upper())
+
+            for target in ([targets] if isinstance(targets, str) else targets):
+
+                target = self.position(target.upper())
+
+                edges.setdefault(source, set()).add(target)
+                reverse.setdefault(target, set()).add(source)
+
+        return self._closure(edges), self._closure(reverse)
+
+    def _closure(self, edges):
+
+        """
+        Will compute position -> mask of the position and every position reachable from it,
+        in reverse topological order with an iterative depth first search, so every edge
+        is visited once
+
+        :param edges: position -> positions
+        :type edges: dict
+        :return: position -> mask, for positions with edges
+        :rtype: dict
+        """
+
+        closure, opened = {}, set()
+
+        for root in edges:
+
+            if root in closure:
+                continue
+
+            path, stack = [root], [iter(edges[root])]
+            opened.add(root)
+
+            while stack:
+
+                position = next(stack[-1], None)
+
+                if position is None:
+
+                    done = path.pop()
+                    stack.pop()
+                    opened.discard(done)
+
+                    mask = 1 << done
+
+                    for target in edges[done]:
+                        mask |= closure.get(target, 1 << target)
+
+                    closure[done] = mask
+
+                elif position in opened:
+
+                    cycle = path[path.index(position):] + [position]
+                    raise ValueError('an implication cycle {}'.format(' -> '.join(self.names[x] for x in cycle)))
+
+                elif position in edges and position not in closure:
+
+                    opened.add(position)
+                    path.append(position)
+                    stack.append(iter(edges[position]))
+
+        return closure
+
+
+__all__ = [
+    'BitMap',
+    'FlagSchema',
+    'OptionMap',
+]
@@ -0,0 +1,400 @@
+"""
+A module with SharedFlagTable - flag states in shared memory, visible to every process.
+
+The segment has the layout of a FlagStore file: a HEADER_SIZE bytes header
+and the initial flags of the slots followed by one [state][flags words][swap
+words] record per slot. Bit 0 of
+the state word is the switch state as in a store, the other bits are a
+seqlock counter: a writer makes it odd, writes the record and makes it
+even again. Writers of a slot serialize on one of a few striped locks,
+readers take no lock and retry when the counter was odd or changed while
+they read.
+"""
+
+import struct
+import time
+
+from BitnFly.api.delta import ChangeTracking
+from BitnFly.api.handle import FlagHandle
+from BitnFly.api.schema import FlagSchema
+from BitnFly.api.store import (
+    HEADER, HEADER_SIZE, MAGIC, SWITCHED_OFF, VERSION, WRITE_RECORDS, data_offset, pack_record, record_size,
+    unpack_record,
+)
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+STRIPES = 64
+
+STATE = struct.Struct('<Q')
+COUNTER_MASK = (1 << 63) - 1
+
+SPINS = 100
+
+
+class SharedHandle(FlagHandle):
+
+    """
+    A SharedHandle - a BitnFly compatible handle of one slot of a SharedFlagTable
+    """
+
+    def __init__(self, table, slot, **kwargs):
+
+        super(SharedHandle, self).__init__(table.schema(), **kwargs)
+
+        self._table = table
+        self._slot = slot
+
+    def _load(self):
+        return self._table.state(self._slot)
+
+    def _initial(self):
+        return self._table.initial()
+
+    def _store(self, flags, swap_mask, switch_state):
+        self._table.store(self._slot, flags, swap_mask, switch_state)
+
+    def _update(self, func, *args):
+        self._table.update(self._slot, func, *args)
+
+
+class SharedFlagTable(ChangeTracking):
+
+    """
+    A SharedFlagTable - states of many entities in a shared memory segment.
+
+    A table is created once with SharedFlagTable.create, before workers are
+    started, and handed to them as a Process argument or by fork. It can be
+    opened by name without locks for reading only.
+    """
+
+    def __init__(self, name, options, locks=None):
+
+        """
+        Will attach to an existing segment
+
+        :param name: a name of the segment
+        :type name: str
+        :param options: list of strings or a FlagSchema, it must match the schema of the table
+        :type options: list or FlagSchema
+        :param locks: the multiprocessing locks of the table, without them it is read only
+        :type locks: list
+        """
+
+        if shared_memory is None:
+            raise ImportError('SharedFlagTable requires multiprocessing.shared_memory')
+
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        self.__schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        self.__words = self.__schema.words
+        self.__record_size = record_size(self.__words)
+        self.__locks = locks
+
+        self.__shm = shared_memory.SharedMemory(name=name)
+        self.__buf = self.__shm.buf
+
+        magic, version, words, size, fingerprint = HEADER.unpack_from(self.__buf, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a flag table'.format(name))
+
+        if words != self.__words or fingerprint != self.__schema.fingerprint:
+            self.close()
+            raise ValueError('{} was created with another schema'.format(name))
+
+        self.__size = size
+        self.__data = data_offset(words)
+        self.__initial = int.from_bytes(self.__buf[HEADER_SIZE:self.__data], 'little')
+        self._log = None
+
+    @classmethod
+    def create(cls, options, size, mask=None, stripes=STRIPES, name=None):
+
+        """
+        Will create a segment with size slots, all with flags on or mask and a full swap mask
+
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        :param size: number of slots
+        :type size: int
+        :param mask: initial flags of every slot, they are restored by reset
+        :type mask: int
+        :param stripes: number of locks shared by the slots
+        :type stripes: int
+        :param name: a name of the segment, by default a random one
+        :type name: str
+        :return: an attached table, its creator should unlink it
+        :rtype: SharedFlagTable
+        """
+
+        if shared_memory is None:
+            raise ImportError('SharedFlagTable requires multiprocessing.shared_memory')
+
+        import multiprocessing
+
+        schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        full_mask = schema.full_mask
+
+        start = data_offset(schema.words)
+        total = start + size * record_size(schema.words)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=total)
+
+        try:
+            shm.buf[:HEADER.size] = HEADER.pack(MAGIC, VERSION, schema.words, size, schema.fingerprint)
+
+            initial = full_mask if mask is None else mask & full_mask
+            shm.buf[HEADER_SIZE:start] = initial.to_bytes(8 * schema.words, 'little')
+
+            record = pack_record(initial, full_mask, 0x0, schema.words)
+            chunk = record * max(1, min(WRITE_RECORDS, size))
+
+            # slots are filled a chunk at a time, a copy of the whole segment is never made
+            for offset in range(start, total, len(chunk)):
+                end = min(total, offset + len(chunk))
+                shm.buf[offset:end] = chunk[:end - offset]
+
+            name = shm.name
+
+        finally:
+            shm.close()
+
+        return cls(name, schema, [multiprocessing.Lock() for _ in range(max(1, stripes))])
+
+    def __getstate__(self):
+        return self.name(), self.__schema, self.__locks
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __len__(self):
+        return self.__size
+
+    def __getitem__(self, slot):
+
+        """
+        Will return a BitnFly compatible handle of a slot
+
+        :param slot: a slot
+        :type slot: int
+        :return: a handle
+        :rtype: SharedHandle
+        """
+
+        self._offset(slot)
+        return SharedHandle(self, slot)
+
+    def __setitem__(self, slot, value):
+
+        """
+        Will keep "table[slot] |= ..." working and write plain int flags of a slot
+
+        :param slot: a slot
+        :type slot: int
+        :param value: a handle of the same slot or flags
+        :type value: SharedHandle or int
+        :return: void
+        :rtype: void
+        """
+
+        if isinstance(value, SharedHandle) and value._table is self and value._slot == slot:
+            return
+
+        assert isinstance(value, int), 'a value must be a handle of the slot or an int'
+
+        self.update(slot, _set_flags, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _offset(self, slot):
+
+        if not 0 <= slot < self.__size:
+            raise IndexError('slot {} is out of range'.format(slot))
+
+        return self.__data + slot * self.__record_size
+
+    def initial(self):
+
+        """
+        Will return the initial flags of the slots, restored by reset
+
+        :return: flags
+        :rtype: int
+        """
+
+        return self.__initial
+
+    def state(self, slot):
+
+        """
+        Will read a consistent state of a slot without locking
+
+        :param slot: a slot
+        :type slot: int
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        offset = self._offset(slot)
+        end = offset + self.__record_size
+        buf = self.__buf
+        spins = 0
+
+        while True:
+
+            before = STATE.unpack_from(buf, offset)[0]
+
+            if not before & 0x2:
+
+                record = bytes(buf[offset:end])
+
+                if STATE.unpack_from(buf, offset)[0] == before:
+                    flags, swap_mask, _ = unpack_record(record, self.__words)
+                    return flags, swap_mask, not before & SWITCHED_OFF
+
+            spins += 1
+
+            if spins % SPINS == 0:
+                time.sleep(0)
+
+    def update(self, slot, func, *args):
+
+        """
+        Will replace the state of a slot with func(flags, swap_mask, switch_state, *args) atomically
+
+        :param slot: a slot
+        :type slot: int
+        :param func: a callable returning a new state tuple
+        :type func: callable
+        :return: void
+        :rtype: void
+        """
+
+        assert self.__locks is not None, 'a table opened without locks is read only'
+
+        offset = self._offset(slot)
+        end = offset + self.__record_size
+        buf = self.__buf
+
+        with self.__locks[slot % len(self.__locks)]:
+
+            # only writers change a record and they hold the lock, so it is read as is
+            flags, swap_mask, before = unpack_record(bytes(buf[offset:end]), self.__words)
+            state = flags, swap_mask, not before & SWITCHED_OFF
+            flags, swap_mask, switch_state = func(*(state + args))
+
+            if self._log is not None:
+                self._log.record(slot, state, (flags, swap_mask, switch_state))
+
+            record = pack_record(flags, swap_mask, 0x0, self.__words)[8:]
+            counter = before >> 1
+
+            # an odd counter tells readers a write is in progress
+            STATE.pack_into(buf, offset, ((counter + 1) & COUNTER_MASK) << 1 | before & SWITCHED_OFF)
+            buf[offset + 8:end] = record
+
+            STATE.pack_into(
+                buf, offset, ((counter + 2) & COUNTER_MASK) << 1 | (0x0 if switch_state else SWITCHED_OFF)
+            )
+
+    def store(self, slot, flags, swap_mask, switch_state):
+
+        """
+        Will write the state of a slot
+
+        :param slot: a slot
+        :type slot: int
+        :param flags: flags
+        :type flags: int
+        :param swap_mask: a swap mask
+        :type swap_mask: int
+        :param switch_state: False after off, True after on
+        :type switch_state: bool
+        :return: void
+        :rtype: void
+        """
+
+        self.update(slot, _replace, flags, swap_mask, switch_state)
+
+    def _apply_delta(self, slot, delta):
+        self.update(slot, _apply_delta, delta)
+
+    def records(self):
+
+        """
+        Will return a zero copy view of all records, it is not guarded by the seqlock
+
+        :return: a uint64 matrix with shape (len(self), 1 + 2 * schema.words)
+        :rtype: numpy.ndarray
+        """
+
+        if numpy is None:
+            raise ImportError('SharedFlagTable.records requires numpy')
+
+        return numpy.frombuffer(
+            self.__buf, dtype='<u8', count=self.__size * (1 + 2 * self.__words), offset=self.__data
+        ).reshape(self.__size, 1 + 2 * self.__words)
+
+    def name(self):
+        """
+        Will return the name of the segment
+        :return:
+        :rtype: str
+        """
+        return self.__shm.name
+
+    def schema(self):
+        """
+        Will return the schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
+    def close(self):
+        """
+        Will detach from the segment, all numpy views must be released before
+        :return:
+        :rtype:
+        """
+        self.__buf = None
+        self.__shm.close()
+
+    def unlink(self):
+        """
+        Will destroy the segment, once every process closed it
+        :return:
+        :rtype:
+        """
+        self.__shm.unlink()
+
+
+def _replace(flags, swap_mask, switch_state, new_flags, new_swap_mask, new_switch_state):
+    return new_flags, new_swap_mask, new_switch_state
+
+
+def _apply_delta(flags, swap_mask, switch_state, delta):
+    return delta.apply(flags, swap_mask, switch_state)
+
+
+def _set_flags(flags, swap_mask, switch_state, new_flags):
+    return new_flags, swap_mask, switch_state
+
+
+__all__ = [
+    'SharedFlagTable',
+    'SharedHandle',
+]
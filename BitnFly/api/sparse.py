@@ -0,0 +1,677 @@
+"""
+A module with SparseBitnFly - a BitnFly for wide schemas with few flags set.
+
+Flags and the swap mask are kept as a pair (inverted, positions): the
+positions of the set bits, or of the clear bits when inverted. A default
+state - all flags on and a full swap mask - is two empty sets, so memory
+follows the number of changed flags instead of the schema width, and
+every operation costs the positions it touches.
+
+When the pairs grow past density * len(schema) positions the state
+switches to plain ints as in BitnFly, and back once they shrink below half
+of that.
+"""
+
+from BitnFly.api.bitmap import iter_positions, popcount
+from BitnFly.api.delta import FlagDelta
+from BitnFly.api.handle import mask_repr
+from BitnFly.api.instrument import instrumented
+from BitnFly.api.plan import Plan
+from BitnFly.api.schema import FlagSchema
+
+DENSITY = 1.0 / 256
+
+
+def to_pair(mask, schema):
+
+    """
+    Will convert a mask into the smaller of its pairs
+
+    :param mask: a mask of the schema
+    :type mask: int
+    :param schema: a schema
+    :type schema: FlagSchema
+    :return: a list [inverted, positions]
+    :rtype: list
+    """
+
+    if popcount(mask) * 2 > len(schema):
+        return [True, set(iter_positions(schema.full_mask ^ mask))]
+
+    return [False, set(iter_positions(mask))]
+
+
+def to_mask(pair, schema):
+
+    """
+    Will convert a pair into a mask
+
+    :param pair: a list [inverted, positions]
+    :type pair: list
+    :param schema: a schema
+    :type schema: FlagSchema
+    :return: a mask
+    :rtype: int
+    """
+
+    mask = schema.positions_mask(pair[1])
+    return schema.full_mask ^ mask if pair[0] else mask
+
+
+def _contains(pair, position):
+    return (position in pair[1]) != pair[0]
+
+
+def _or_in(pair, positions):
+
+    if pair[0]:
+        pair[1].difference_update(positions)
+
+    else:
+        pair[1].update(positions)
+
+
+def _and_not(left, right):
+
+    """
+    Will return left & ~right
+    """
+
+    if left[0]:
+        return [True, left[1] | right[1]] if not right[0] else [False, right[1] - left[1]]
+
+    return [False, left[1] - right[1]] if not right[0] else [False, left[1] & right[1]]
+
+
+def _xor(left, right):
+    return [left[0] != right[0], left[1] ^ right[1]]
+
+
+class SparseBitnFly(object):
+
+    """
+    A SparseBitnFly - the BitnFly API over sets of positions
+    """
+
+    def __init__(self, options, **kwargs):
+
+        """
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        :param kwargs: possible keys are an 'output' and a 'mask' as in BitnFly,
+            and a 'density' - the share of the schema width above which plain ints are used
+        :type kwargs: dict
+        """
+
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        self.__schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        self.__output = kwargs.get('output', int)
+        self.__limit = max(1, int(len(self.__schema) * kwargs.get('density', DENSITY)))
+
+        mask = kwargs.get('mask', None)
+
+        self.__initial = [True, frozenset()] if mask is None else to_pair(mask & self.__schema.full_mask, self.__schema)
+
+        self.__dense = False
+        self.__opt_flags = None
+        self.__flags_swap_mask = None
+        self.__switch_state = True
+        self.__checkpoint = None
+
+        self._init()
+
+        if self.__schema.recorder is not None:
+            self.__class__ = instrumented(self.__class__)
+
+    def __and__(self, other):
+
+        """
+        A bitwise operator &
+
+        :param other: can be an int or a str
+        :type other: int or str
+        :return: True if other is set in self, or implied by a set flag, otherwise False
+        :rtype: bool
+        """
+
+        if isinstance(other, int):
+
+            if self.__dense:
+                return bool(self.__opt_flags & self.__schema.implied_by_mask(other))
+
+            # a negative int is masked as the dense path does, -1 tests every flag
+            positions = iter_positions(other & self.__schema.full_mask)
+
+        elif isinstance(other, str):
+            positions = iter_positions(self.__schema.mask_of(other))
+
+        else:
+            return False
+
+        implied_by = self.__schema.implied_by
+
+        if implied_by:
+            positions = set(positions)
+
+            for position in list(positions):
+                positions.update(iter_positions(implied_by.get(position, 0x0)))
+
+        return any(self._is_set(position) for position in positions)
+
+    def __or__(self, other):
+
+        """
+        A bitwise operator |
+
+        :param other: can be an int, a str, a list of int or a list of str
+        :type other: int, str, list
+        :return: self
+        :rtype: self
+        """
+
+        positions = self.__schema.positions_of(other, '__or__')
+        implied = self.__schema.implied
+
+        if implied:
+            for position in list(positions):
+                positions.update(iter_positions(implied.get(position, 0x0)))
+
+        if self.__dense:
+            mask = self.__schema.positions_mask(positions)
+
+            self.__opt_flags |= mask
+            self.__flags_swap_mask |= mask
+
+        else:
+            _or_in(self.__opt_flags, positions)
+            _or_in(self.__flags_swap_mask, positions)
+
+        self._balance()
+        return self
+
+    def __xor__(self, other):
+        return self.flip(other)
+
+    def __str__(self):
+        return str(self.get())
+
+    def __repr__(self):
+
+        return '<{}({}, mask={})>'.format(
+            self.__class__.__name__, mask_repr(self.get(output=int)), mask_repr(self.mask())
+        )
+
+    def __getattr__(self, item):
+
+        bit = self.__schema.options.get(item.upper()) if not item.startswith('_') else None
+
+        if bit is None:
+            raise AttributeError(item)
+
+        return bit
+
+    def _init(self):
+
+        """
+        Will initialize the flags and the swap mask, the switch state is kept as in BitnFly
+        """
+
+        self.__dense = False
+        self.__opt_flags = [self.__initial[0], set(self.__initial[1])]
+        self.__flags_swap_mask = [True, set()]
+
+        self._balance()
+
+    def _is_set(self, position):
+
+        if self.__dense:
+            return bool(self.__opt_flags >> position & 1)
+
+        return _contains(self.__opt_flags, position)
+
+    def _to_dense(self):
+
+        if not self.__dense:
+            self.__opt_flags = to_mask(self.__opt_flags, self.__schema)
+            self.__flags_swap_mask = to_mask(self.__flags_swap_mask, self.__schema)
+            self.__dense = True
+
+    def _balance(self):
+
+        """
+        Will switch the representation, when the number of kept positions crossed the limit
+        """
+
+        if not self.__dense:
+
+            if len(self.__opt_flags[1]) + len(self.__flags_swap_mask[1]) <= self.__limit:
+                return
+
+            # the other side of a pair may still be small, eg. after all flags were set
+            self._to_dense()
+
+        width = len(self.__schema)
+        size = 0
+
+        for mask in (self.__opt_flags, self.__flags_swap_mask):
+            count = popcount(mask)
+            size += min(count, width - count)
+
+        if size * 2 <= self.__limit:
+            self.__opt_flags = to_pair(self.__opt_flags, self.__schema)
+            self.__flags_swap_mask = to_pair(self.__flags_swap_mask, self.__schema)
+            self.__dense = False
+
+    def _range(self, start, stop):
+
+        assert 0 <= start <= stop <= len(self.__schema), 'a range must be within 0 and {}'.format(len(self.__schema))
+        return set(range(start, stop))
+
+    def _flip_positions(self, positions):
+
+        if self.__dense:
+            mask = self.__schema.positions_mask(positions)
+
+            self.__opt_flags ^= mask
+            self.__flags_swap_mask ^= mask
+
+        else:
+            self.__opt_flags[1].symmetric_difference_update(positions)
+            self.__flags_swap_mask[1].symmetric_difference_update(positions)
+
+        self._balance()
+        return self
+
+    def is_sparse(self):
+        """
+        Will tell whether the state is kept as positions
+        :return:
+        :rtype: bool
+        """
+        return not self.__dense
+
+    def flip(self, bits):
+
+        """
+        Will flip bit or bits to opposite side
+
+        :param bits: can be an int, a str, a list of int or a list of str
+        :type bits: int, str, list
+        :return: object it self
+        :rtype: object
+        """
+
+        return self._flip_positions(self.__schema.positions_of(bits, '__xor__'))
+
+    def set_range(self, start, stop):
+
+        """
+        Will set the flags at positions start to stop - 1, as | does
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        if self.__dense:
+            mask = self.__schema.range_mask(start, stop)
+
+            self.__opt_flags |= mask
+            self.__flags_swap_mask |= mask
+
+        else:
+            positions = self._range(start, stop)
+
+            _or_in(self.__opt_flags, positions)
+            _or_in(self.__flags_swap_mask, positions)
+
+        self._balance()
+        return self
+
+    def clear_range(self, start, stop):
+
+        """
+        Will flip the set flags at positions start to stop - 1, so all of them are cleared
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        positions = set(position for position in self._range(start, stop) if self._is_set(position))
+        return self._flip_positions(positions)
+
+    def flip_range(self, start, stop):
+
+        """
+        Will flip the flags at positions start to stop - 1
+
+        :param start: the first position
+        :type start: int
+        :param stop: the position after the last one
+        :type stop: int
+        :return: object it self
+        :rtype: object
+        """
+
+        return self._flip_positions(self._range(start, stop))
+
+    def off(self):
+
+        """
+        Will turning off all bits, according to a swap mask
+
+        :return: object it self
+        :rtype: object
+        """
+
+        if self.__dense:
+            self.__opt_flags &= ~self.__flags_swap_mask
+
+        else:
+            self.__opt_flags = _and_not(self.__opt_flags, self.__flags_swap_mask)
+
+        self.__switch_state = False
+
+        self._balance()
+        return self
+
+    def on(self):
+
+        """
+        Will turn on all flags according to swap mask
+
+        :return: object it self
+        :rtype: object
+        """
+
+        if self.__switch_state is False:
+
+            if self.__dense:
+                self.__opt_flags ^= self.__flags_swap_mask
+
+            else:
+                self.__opt_flags = _xor(self.__opt_flags, self.__flags_swap_mask)
+
+            self.__switch_state = True
+            self._balance()
+
+        return self
+
+    def reset(self):
+
+        """
+        Reset all bits to initial values
+
+        :return: object it's self
+        :rtype: object
+        """
+
+        self._init()
+        return self
+
+    def apply(self, ops):
+
+        """
+        Will apply a sequence of operations at once, see BitnFly.apply.
+        The fused plan works on ints, so the state is converted for it
+
+        :param ops: operations or a Plan
+        :type ops: list or Plan
+        :return: object it self
+        :rtype: object
+        """
+
+        plan = ops if isinstance(ops, Plan) else self.__schema.plan(ops)
+
+        assert plan.schema is self.__schema or plan.schema.fingerprint == self.__schema.fingerprint, \
+            'a plan must be made for the same schema'
+
+        self._to_dense()
+
+        self.__opt_flags, self.__flags_swap_mask, self.__switch_state = plan.run(
+            self.__opt_flags, self.__flags_swap_mask, self.__switch_state, to_mask(self.__initial, self.__schema)
+        )
+
+        self._balance()
+        return self
+
+    def state(self):
+
+        """
+        Will return the whole state, the masks are built from the positions
+
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        return self.get(output=int), self.mask(), self.__switch_state
+
+    def _copy(self):
+
+        if self.__dense:
+            return self.__opt_flags, self.__flags_swap_mask
+
+        return (
+            [self.__opt_flags[0], set(self.__opt_flags[1])],
+            [self.__flags_swap_mask[0], set(self.__flags_swap_mask[1])]
+        )
+
+    def _changed(self, before, after):
+
+        """
+        Will return before ^ after of two masks or pairs, from the positions when both are pairs
+        """
+
+        if isinstance(before, int) or isinstance(after, int):
+
+            if not isinstance(before, int):
+                before = to_mask(before, self.__schema)
+
+            if not isinstance(after, int):
+                after = to_mask(after, self.__schema)
+
+            return before ^ after
+
+        changed = _xor(before, after)
+        return to_mask(changed, self.__schema) if changed[0] else self.__schema.positions_mask(changed[1])
+
+    def freeze(self):
+
+        """
+        Will return the current flags as an interned value, see BitnFly.freeze
+
+        :return: a value
+        :rtype: FlagValue
+        """
+
+        return self.__schema.value(self.get(output=int))
+
+    def checkpoint(self):
+
+        """
+        Will start tracking changes from the current state, see BitnFly.checkpoint
+
+        :return: object it self
+        :rtype: object
+        """
+
+        self.__checkpoint = self._copy() + (self.__switch_state,)
+        return self
+
+    def drain(self):
+
+        """
+        Will return the changes since the last checkpoint and checkpoint again, see BitnFly.drain.
+        While both states are kept as positions, only the changed ones are visited
+
+        :return: a delta
+        :rtype: FlagDelta
+        """
+
+        assert self.__checkpoint is not None, 'changes are tracked after a checkpoint'
+
+        flags, swap_mask, switch_state = self.__checkpoint
+
+        delta = FlagDelta(
+            self._changed(flags, self.__opt_flags),
+            self._changed(swap_mask, self.__flags_swap_mask),
+            None if switch_state == self.__switch_state else self.__switch_state
+        )
+
+        self.checkpoint()
+        return delta
+
+    def apply_delta(self, delta):
+
+        """
+        Will apply a delta, flipping the positions it changes
+
+        :param delta: a delta
+        :type delta: FlagDelta
+        :return: object it self
+        :rtype: object
+        """
+
+        if self.__dense:
+            self.__opt_flags ^= delta.flags
+            self.__flags_swap_mask ^= delta.swap_mask
+
+        else:
+            self.__opt_flags[1].symmetric_difference_update(iter_positions(delta.flags))
+            self.__flags_swap_mask[1].symmetric_difference_update(iter_positions(delta.swap_mask))
+
+        if delta.switch_state is not None:
+            self.__switch_state = delta.switch_state
+
+        self._balance()
+        return self
+
+    def batch(self):
+
+        """
+        Will return a Plan bound to this object, see BitnFly.batch
+
+        :return: a plan
+        :rtype: Plan
+        """
+
+        return Plan(self.__schema, target=self)
+
+    def get(self, bit=None, output=None):
+
+        """
+        Will return current bits mask, if arg bit is None, otherwise
+        will try to extract it from the current bit mask
+
+        :param bit:
+        :type bit: str or int
+        :param output:
+        :type output:
+        :return: a bit flag
+        :rtype: int
+        """
+
+        call = output or self.__output
+
+        if bit is None:
+            return call(self.__opt_flags if self.__dense else to_mask(self.__opt_flags, self.__schema))
+
+        elif isinstance(bit, int):
+
+            if self.__schema.is_bit(bit):
+                return call(bit if self._is_set(bit.bit_length() - 1) else 0)
+
+            return 0
+
+        elif isinstance(bit, str):
+            mask = self.__schema.mask_of(bit)
+
+            if self.__dense:
+                return self.__output(self.__opt_flags & mask)
+
+            return self.__output(sum(1 << position for position in iter_positions(mask) if self._is_set(position)))
+
+        else:
+            raise TypeError('A bit argument can be int or a str')
+
+    def positions(self):
+
+        """
+        Will return the positions of set flags in ascending order, without building the mask
+        when few flags are set
+
+        :return: a list of positions
+        :rtype: list
+        """
+
+        if self.__dense:
+            return list(iter_positions(self.__opt_flags))
+
+        if not self.__opt_flags[0]:
+            return sorted(self.__opt_flags[1])
+
+        cleared = self.__opt_flags[1]
+        return [position for position in range(len(self.__schema)) if position not in cleared]
+
+    def names(self):
+
+        """
+        Will return the lower cased names of the set flags, in bit order
+
+        :return: a list of names
+        :rtype: list
+        """
+
+        if self.__dense:
+            return self.__schema.names_of(self.__opt_flags)
+
+        names = self.__schema.names
+        return [names[position].lower() for position in self.positions()]
+
+    def iter_set(self):
+
+        """
+        Will iterate the lower cased names of the set flags, visiting only the set bits
+
+        :return: a generator of names
+        :rtype: generator
+        """
+
+        return iter(self.names())
+
+    def mask(self):
+        """
+        Will return the current swap mask
+        :return:
+        :rtype:
+        """
+        return self.__flags_swap_mask if self.__dense else to_mask(self.__flags_swap_mask, self.__schema)
+
+    def flags(self):
+        """
+        Will return all flags in ordered dict
+        :return:
+        :rtype:
+        """
+        return self.__schema.options
+
+    def schema(self):
+        """
+        Will return the schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
+
+__all__ = [
+    'SparseBitnFly',
+]
@@ -0,0 +1,576 @@
+"""
+A module with SQLiteFlagTable - flag states in SQLite columns, queried and updated in SQL.
+
+SQLite integers are signed 64 bit, so flags are split into columns of
+COLUMN_BITS bits: one column named like the column argument for schemas
+up to 63 flags, otherwise <column>_0, <column>_1, ... With state=True a
+row also keeps its swap mask in <column>_swap columns and its switch
+state in <column>_on, so off and on work as in BitnFly.
+
+Predicates are compiled into bit tests of integer literals, so a test of
+one flag reads exactly as the WHERE clause of a partial index made by
+create_index and SQLite can use it. Updates are fused plans, see
+BitnFly.api.plan, turned into one UPDATE statement; SQLite has no XOR,
+a ^ b is written as (a | b) - (a & b). reset restores all flags on.
+"""
+
+import sqlite3
+
+from BitnFly.api.plan import Plan
+from BitnFly.api.schema import FlagSchema
+
+COLUMN_BITS = 63
+COLUMN_MASK = (1 << COLUMN_BITS) - 1
+
+
+def quote(name):
+
+    """
+    Will quote an SQL identifier
+
+    :param name: a name of a table, a column or an index
+    :type name: str
+    :return: a quoted name
+    :rtype: str
+    """
+
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def xor(left, right):
+
+    """
+    Will return an SQL expression of left ^ right
+
+    :param left: an SQL expression
+    :type left: str
+    :param right: an SQL expression
+    :type right: str
+    :return: an SQL expression
+    :rtype: str
+    """
+
+    return '(({0}) | ({1})) - (({0}) & ({1}))'.format(left, right)
+
+
+class SQLiteFlagTable(object):
+
+    """
+    A SQLiteFlagTable - an adapter of a table with a key column and flag columns
+    """
+
+    def __init__(self, connection, table, options, key='id', column='flags', state=True):
+
+        """
+        :param connection: a connection
+        :type connection: sqlite3.Connection
+        :param table: a table name
+        :type table: str
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        :param key: a name of the key column
+        :type key: str
+        :param column: a name of the flags column, or a prefix of the flags columns
+        :type column: str
+        :param state: keep the swap mask and the switch state too
+        :type state: bool
+        """
+
+        assert isinstance(connection, sqlite3.Connection), 'a connection must be a sqlite3.Connection'
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        self.__connection = connection
+        self.__schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        self.__table = quote(table)
+        self.__key = quote(key)
+        self.__state = state
+
+        count = max(1, (len(self.__schema) + COLUMN_BITS - 1) // COLUMN_BITS)
+
+        if count == 1:
+            self.__columns = (column,)
+            self.__swap_columns = (column + '_swap',) if state else ()
+
+        else:
+            self.__columns = tuple('{}_{}'.format(column, x) for x in range(count))
+            self.__swap_columns = tuple('{}_swap_{}'.format(column, x) for x in range(count)) if state else ()
+
+        self.__switch_column = column + '_on' if state else None
+        self.__full = self.split(self.__schema.full_mask)
+        self.__indexed = [0x0] * count
+
+    def __len__(self):
+        return self.__connection.execute('SELECT count(*) FROM {}'.format(self.__table)).fetchone()[0]
+
+    def split(self, mask):
+
+        """
+        Will split a mask into column values, the lowest bits first
+
+        :param mask: a mask
+        :type mask: int
+        :return: a tuple of ints in [0, 2 ** 63)
+        :rtype: tuple
+        """
+
+        return tuple((mask >> (COLUMN_BITS * x)) & COLUMN_MASK for x in range(len(self.__columns)))
+
+    def join(self, values):
+
+        """
+        Will join column values into a mask
+
+        :param values: ints, the lowest bits first
+        :type values: iterable
+        :return: a mask
+        :rtype: int
+        """
+
+        mask = 0x0
+
+        for x, value in enumerate(values):
+            mask |= value << (COLUMN_BITS * x)
+
+        return mask
+
+    def columns(self):
+
+        """
+        Will return the names of all columns kept by the adapter, except the key
+
+        :return: names of flags columns, then of swap mask columns and the switch state column
+        :rtype: tuple
+        """
+
+        return self.__columns + self.__swap_columns + ((self.__switch_column,) if self.__state else ())
+
+    def create_table(self):
+
+        """
+        Will create the table if it does not exist, new rows have all flags on and a full swap mask
+
+        :return: void
+        :rtype: void
+        """
+
+        definitions = ['{} INTEGER PRIMARY KEY'.format(self.__key)]
+
+        for name, default in zip(self.__columns + self.__swap_columns, self.__full * 2):
+            definitions.append('{} INTEGER NOT NULL DEFAULT {}'.format(quote(name), default))
+
+        if self.__state:
+            definitions.append('{} INTEGER NOT NULL DEFAULT 1'.format(quote(self.__switch_column)))
+
+        with self.__connection:
+            self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS {} ({})'.format(self.__table, ', '.join(definitions))
+            )
+
+    def insert(self, rows):
+
+        """
+        Will insert or replace rows in one executemany
+
+        :param rows: (key, value) pairs, a value is an int mask, a FlagValue or a BitnFly like
+            object, which state is kept when the table keeps states
+        :type rows: iterable
+        :return: number of rows
+        :rtype: int
+        """
+
+        names = (self.__key,) + tuple(quote(name) for name in self.columns())
+
+        sql = 'INSERT OR REPLACE INTO {} ({}) VALUES ({})'.format(
+            self.__table, ', '.join(names), ', '.join('?' * len(names))
+        )
+
+        with self.__connection:
+            return self.__connection.executemany(sql, (self._row(key, value) for key, value in rows)).rowcount
+
+    def _row(self, key, value):
+
+        if isinstance(value, int):
+            flags, swap_mask, switch_state = value, self.__schema.full_mask, True
+
+        elif hasattr(value, 'state'):
+            flags, swap_mask, switch_state = value.state()
+
+        else:
+            flags, swap_mask, switch_state = value.get(output=int), self.__schema.full_mask, True
+
+        row = (key,) + self.split(flags & self.__schema.full_mask)
+
+        if self.__state:
+            row += self.split(swap_mask & self.__schema.full_mask) + (1 if switch_state else 0,)
+
+        return row
+
+    def state(self, key):
+
+        """
+        Will read the state of a row
+
+        :param key: a key
+        :type key: int
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        row = self.__connection.execute(
+            'SELECT {} FROM {} WHERE {} = ?'.format(
+                ', '.join(quote(name) for name in self.columns()), self.__table, self.__key
+            ),
+            (key,)
+        ).fetchone()
+
+        if row is None:
+            raise KeyError(key)
+
+        count = len(self.__columns)
+
+        if not self.__state:
+            return self.join(row), self.__schema.full_mask, True
+
+        return self.join(row[:count]), self.join(row[count:2 * count]), bool(row[-1])
+
+    def get(self, key):
+
+        """
+        Will return the flags of a row
+
+        :param key: a key
+        :type key: int
+        :return: flags
+        :rtype: int
+        """
+
+        return self.state(key)[0]
+
+    def where(self, expression):
+
+        """
+        Will translate an expression, see FlagSchema.compile, into an SQL condition
+
+        :param expression: an expression like "can_read & ~anonymous"
+        :type expression: str
+        :return: an SQL condition
+        :rtype: str
+        """
+
+        terms = []
+
+        for mask, expected in self.__schema.compile(expression).terms:
+
+            tests = []
+
+            columns = zip(self.__columns, self.split(mask), self.split(expected), self.__indexed)
+
+            for name, part, value, indexed in columns:
+
+                # set flags with a partial index are tested alone, as the index condition reads
+                single = part & value & indexed
+
+                for position in range(single.bit_length()):
+                    if single >> position & 1:
+                        tests.append('({} & {}) != 0'.format(quote(name), 1 << position))
+
+                part ^= single
+                value ^= single
+
+                if not part:
+                    continue
+
+                if part & (part - 1) == 0:
+                    tests.append('({} & {}) {} 0'.format(quote(name), part, '!=' if value else '='))
+
+                else:
+                    tests.append('({} & {}) = {}'.format(quote(name), part, value))
+
+            terms.append(' AND '.join(tests) if tests else '1')
+
+        if not terms:
+            return '0'
+
+        return terms[0] if len(terms) == 1 else ' OR '.join('({})'.format(term) for term in terms)
+
+    def select(self, expression, columns=None):
+
+        """
+        Will select the rows matching an expression, the filter runs in SQLite
+
+        :param expression: an expression
+        :type expression: str
+        :param columns: names of the columns to select, the key by default
+        :type columns: list
+        :return: a cursor
+        :rtype: sqlite3.Cursor
+        """
+
+        names = ', '.join(quote(name) for name in columns) if columns else self.__key
+
+        return self.__connection.execute(
+            'SELECT {} FROM {} WHERE {}'.format(names, self.__table, self.where(expression))
+        )
+
+    def keys(self, expression):
+
+        """
+        Will return the keys of the rows matching an expression
+
+        :param expression: an expression
+        :type expression: str
+        :return: a list of keys
+        :rtype: list
+        """
+
+        return [row[0] for row in self.select(expression)]
+
+    def count(self, expression):
+
+        """
+        Will count the rows matching an expression
+
+        :param expression: an expression
+        :type expression: str
+        :return: a count
+        :rtype: int
+        """
+
+        return self.__connection.execute(
+            'SELECT count(*) FROM {} WHERE {}'.format(self.__table, self.where(expression))
+        ).fetchone()[0]
+
+    def _expressions(self, program):
+
+        """
+        Will write the column expressions of a compiled plan
+
+        :return: a list of expressions per flags column, then per swap mask column
+        :rtype: list
+        """
+
+        c0, c1, c2, c3, ci, d0, d1, _ = program
+        full_mask = self.__schema.full_mask
+
+        constant = self.split((c0 ^ (full_mask & ci)) & full_mask)
+        parts = [self.split(c1 & full_mask), self.split(c2 & full_mask), self.split(c3 & full_mask)]
+
+        flags, swap_masks = [], []
+
+        for x, name in enumerate(self.__columns):
+
+            column = quote(name)
+            swap = quote(self.__swap_columns[x]) if self.__state else None
+
+            terms = []
+
+            if parts[0][x]:
+                terms.append(column if parts[0][x] == self.__full[x] else '{} & {}'.format(column, parts[0][x]))
+
+            if parts[1][x]:
+                terms.append('{} & {}'.format(swap, parts[1][x]))
+
+            if parts[2][x]:
+                terms.append('{} & {} & {}'.format(column, swap, parts[2][x]))
+
+            if constant[x] or not terms:
+                terms.append(str(constant[x]))
+
+            expression = terms[0]
+
+            for term in terms[1:]:
+                expression = xor(expression, term)
+
+            flags.append(expression)
+
+            if self.__state:
+
+                d0_part, d1_part = self.split(d0 & full_mask)[x], self.split(d1 & full_mask)[x]
+
+                if not d1_part:
+                    swap_masks.append(str(d0_part))
+
+                else:
+                    term = swap if d1_part == self.__full[x] else '{} & {}'.format(swap, d1_part)
+                    swap_masks.append(xor(term, str(d0_part)) if d0_part else term)
+
+        return flags + swap_masks
+
+    def update_sql(self, ops):
+
+        """
+        Will return the UPDATE statement of operations, without a WHERE clause
+
+        :param ops: operations or a Plan, see BitnFly.apply
+        :type ops: list or Plan
+        :return: an SQL statement
+        :rtype: str
+        """
+
+        plan = ops if isinstance(ops, Plan) else self.__schema.plan(ops)
+        names = self.__columns + self.__swap_columns
+
+        on, off = plan.program(True), plan.program(False)
+
+        if not self.__state:
+
+            c2, c3 = on[2], on[3]
+            assert not (c2 | c3) & self.__schema.full_mask, 'off and on need a table, which keeps states'
+
+            expressions = self._expressions(on)
+            assignments = ['{} = {}'.format(quote(name), value) for name, value in zip(names, expressions)]
+
+        else:
+
+            switch = quote(self.__switch_column)
+            assignments = []
+
+            for name, when_on, when_off in zip(names, self._expressions(on), self._expressions(off)):
+
+                if when_on == when_off:
+                    value = when_on
+
+                else:
+                    value = 'CASE WHEN {} THEN {} ELSE {} END'.format(switch, when_on, when_off)
+
+                if value != quote(name):
+                    assignments.append('{} = {}'.format(quote(name), value))
+
+            if on[-1] == off[-1]:
+                value = '1' if on[-1] else '0'
+
+            else:
+                value = 'CASE WHEN {} THEN {} ELSE {} END'.format(switch, int(on[-1]), int(off[-1]))
+
+            if value != switch:
+                assignments.append('{} = {}'.format(switch, value))
+
+        if not assignments:
+            return None
+
+        return 'UPDATE {} SET {}'.format(self.__table, ', '.join(assignments))
+
+    def apply(self, ops, where=None, keys=None):
+
+        """
+        Will apply operations to rows in SQLite, as one UPDATE or one executemany over keys
+
+        :param ops: operations or a Plan, see BitnFly.apply
+        :type ops: list or Plan
+        :param where: an expression selecting the rows, all rows by default
+        :type where: str
+        :param keys: keys of the rows, instead of where
+        :type keys: iterable
+        :return: number of updated rows
+        :rtype: int
+        """
+
+        assert where is None or keys is None, 'rows are selected by where or by keys'
+
+        sql = self.update_sql(ops)
+
+        if sql is None:
+            return 0
+
+        with self.__connection:
+
+            if keys is not None:
+                return self.__connection.executemany(
+                    '{} WHERE {} = ?'.format(sql, self.__key), ((key,) for key in keys)
+                ).rowcount
+
+            if where is not None:
+                sql = '{} WHERE {}'.format(sql, self.where(where))
+
+            return self.__connection.execute(sql).rowcount
+
+    def flip(self, bits, where=None, keys=None):
+        """
+        Will flip bits of rows, see apply
+        :param bits: can be an int, a str, a list of int or a list of str
+        :type bits: int, str, list
+        :return: number of updated rows
+        :rtype: int
+        """
+        return self.apply([('flip', bits)], where, keys)
+
+    def set(self, bits, where=None, keys=None):
+        """
+        Will set bits of rows as | does, see apply
+        :param bits: can be an int, a str, a list of int or a list of str
+        :type bits: int, str, list
+        :return: number of updated rows
+        :rtype: int
+        """
+        return self.apply([('or', bits)], where, keys)
+
+    def off(self, where=None, keys=None):
+        """
+        Will turn off rows according to their swap masks, see apply
+        :return: number of updated rows
+        :rtype: int
+        """
+        return self.apply(['off'], where, keys)
+
+    def on(self, where=None, keys=None):
+        """
+        Will turn on switched off rows according to their swap masks, see apply
+        :return: number of updated rows
+        :rtype: int
+        """
+        return self.apply(['on'], where, keys)
+
+    def create_index(self, name, index=None, partial=True):
+
+        """
+        Will create an index for a hot flag. A partial index holds the keys of the rows
+        with the flag set and serves where() tests of that flag, otherwise the index is
+        on the expression of the flag bit. Call it for existing indexes too, so where()
+        knows about them
+
+        :param name: an option name
+        :type name: str
+        :param index: a name of the index, by default <table>_<column>_<option>
+        :type index: str
+        :param partial: make a partial index
+        :type partial: bool
+        :return: the name of the index
+        :rtype: str
+        """
+
+        position = self.__schema.position(name.upper())
+        column = quote(self.__columns[position // COLUMN_BITS])
+        bit = 1 << (position % COLUMN_BITS)
+
+        if index is None:
+            index = '{}_{}_{}'.format(self.__table.strip('"'), self.__columns[0], name.lower())
+
+        if partial:
+
+            sql = 'CREATE INDEX IF NOT EXISTS {} ON {} ({}) WHERE ({} & {}) != 0'.format(
+                quote(index), self.__table, self.__key, column, bit
+            )
+
+            self.__indexed[position // COLUMN_BITS] |= bit
+
+        else:
+            sql = 'CREATE INDEX IF NOT EXISTS {} ON {} (({} & {}))'.format(quote(index), self.__table, column, bit)
+
+        with self.__connection:
+            self.__connection.execute(sql)
+
+        return index
+
+    def schema(self):
+        """
+        Will return the schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
+
+__all__ = [
+    'COLUMN_BITS',
+    'SQLiteFlagTable',
+]
@@ -0,0 +1,567 @@
+"""
+A module with FlagStore - a memory mapped file of fixed width flag records.
+
+The file starts with a HEADER_SIZE bytes header and the initial flags of
+the slots, restored by reset, in schema.words little endian uint64 words,
+followed by one record per slot. A record is 1 + 2 * schema.words little
+endian uint64 words::
+
+    [state][flags word 0 .. flags word k-1][swap word 0 .. swap word k-1]
+
+Bit 0 of the state word is set after off() and cleared by on(), the
+other bits are free for users of the layout.
+
+A StoreSnapshot is copy on write: taking one costs nothing and the store
+copies a chunk of CHUNK_SLOTS records into every live snapshot the first
+time the chunk is written after it was taken.
+"""
+
+import mmap
+import struct
+import weakref
+
+from BitnFly.api.delta import ChangeTracking
+from BitnFly.api.handle import FlagHandle
+from BitnFly.api.schema import FlagSchema
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+MAGIC = b'BNFSTORE'
+VERSION = 2
+
+HEADER = struct.Struct('<8sIIQ8s')
+HEADER_SIZE = 64
+
+SWITCHED_OFF = 0x1
+
+WRITE_RECORDS = 1 << 16
+
+CHUNK_SLOTS = 1 << 10
+
+
+def record_size(words):
+
+    """
+    Will return the size of one record in bytes
+
+    :param words: schema.words
+    :type words: int
+    :return: bytes
+    :rtype: int
+    """
+
+    return (1 + 2 * words) * 8
+
+
+def data_offset(words):
+
+    """
+    Will return the offset of the first record, after the header and the initial flags
+
+    :param words: schema.words
+    :type words: int
+    :return: bytes
+    :rtype: int
+    """
+
+    return HEADER_SIZE + 8 * words
+
+
+def pack_record(flags, swap_mask, state, words):
+
+    """
+    Will pack a state into a record
+
+    :param flags: flags
+    :type flags: int
+    :param swap_mask: a swap mask
+    :type swap_mask: int
+    :param state: a state word
+    :type state: int
+    :param words: schema.words
+    :type words: int
+    :return: a record
+    :rtype: bytes
+    """
+
+    return state.to_bytes(8, 'little') + flags.to_bytes(8 * words, 'little') + swap_mask.to_bytes(8 * words, 'little')
+
+
+def unpack_record(record, words):
+
+    """
+    Will unpack a record
+
+    :param record: a record
+    :type record: bytes
+    :param words: schema.words
+    :type words: int
+    :return: a tuple of flags, swap mask and state word
+    :rtype: tuple
+    """
+
+    end = 8 + 8 * words
+
+    return (
+        int.from_bytes(record[8:end], 'little'),
+        int.from_bytes(record[end:end + 8 * words], 'little'),
+        int.from_bytes(record[:8], 'little'),
+    )
+
+
+class StoreHandle(FlagHandle):
+
+    """
+    A StoreHandle - a BitnFly compatible handle of one slot of a FlagStore
+    """
+
+    def __init__(self, store, slot, **kwargs):
+
+        super(StoreHandle, self).__init__(store.schema(), **kwargs)
+
+        self._table = store
+        self._slot = slot
+
+    def _load(self):
+        return self._table.state(self._slot)
+
+    def _initial(self):
+        return self._table.initial()
+
+    def _store(self, flags, swap_mask, switch_state):
+        self._table.store(self._slot, flags, swap_mask, switch_state)
+
+
+class StoreSnapshot(object):
+
+    """
+    A StoreSnapshot - the slots of a FlagStore as they were when it was taken.
+    It keeps only the chunks written since then, the others are read from the store
+    """
+
+    def __init__(self, store):
+
+        self.__store = store
+        self.__chunks = {}
+
+    def __len__(self):
+        return len(self.__store)
+
+    def __repr__(self):
+        return '{}({} chunks copied)'.format(self.__class__.__name__, len(self.__chunks))
+
+    def holds(self, chunk):
+        """
+        Will tell whether a chunk was copied
+        :param chunk: a chunk
+        :type chunk: int
+        :return:
+        :rtype: bool
+        """
+        return chunk in self.__chunks
+
+    def keep(self, chunk, data):
+        """
+        Will keep a copy of a chunk, called by the store before it is written
+        :param chunk: a chunk
+        :type chunk: int
+        :param data: the records of the chunk
+        :type data: bytes
+        :return:
+        :rtype:
+        """
+        self.__chunks[chunk] = data
+
+    def chunks(self):
+        """
+        Will return the copied chunks
+        :return: a list of (chunk, records) tuples
+        :rtype: list
+        """
+        return sorted(self.__chunks.items())
+
+    def state(self, slot):
+
+        """
+        Will read the state of a slot as it was, see FlagStore.state
+
+        :param slot: a slot
+        :type slot: int
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        if not 0 <= slot < len(self.__store):
+            raise IndexError('slot {} is out of range'.format(slot))
+
+        data = self.__chunks.get(slot // CHUNK_SLOTS)
+
+        if data is None:
+            return self.__store.state(slot)
+
+        size = record_size(self.__store.schema().words)
+        offset = slot % CHUNK_SLOTS * size
+
+        flags, swap_mask, state = unpack_record(data[offset:offset + size], self.__store.schema().words)
+
+        return flags, swap_mask, not state & SWITCHED_OFF
+
+
+class FlagStore(ChangeTracking):
+
+    """
+    A FlagStore - states of many entities kept in a memory mapped file.
+
+    Opening a store maps the file without reading it, only the pages of
+    slots, which are accessed, are ever loaded.
+    """
+
+    def __init__(self, path, options, readonly=False):
+
+        """
+        Will open an existing store
+
+        :param path: a path of a store file
+        :type path: str
+        :param options: list of strings or a FlagSchema, it must match the schema of the file
+        :type options: list or FlagSchema
+        :param readonly: map the file read only
+        :type readonly: bool
+        """
+
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        self.__schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        self.__words = self.__schema.words
+        self.__record_size = record_size(self.__words)
+
+        self.__file = open(path, 'rb' if readonly else 'r+b')
+
+        try:
+            self.__mmap = mmap.mmap(
+                self.__file.fileno(), 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+            )
+
+        except Exception:
+            self.__file.close()
+            raise
+
+        magic, version, words, size, fingerprint = HEADER.unpack_from(self.__mmap, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a flag store'.format(path))
+
+        if words != self.__words or fingerprint != self.__schema.fingerprint:
+            self.close()
+            raise ValueError('{} was created with another schema'.format(path))
+
+        self.__data = data_offset(words)
+
+        if len(self.__mmap) < self.__data + size * self.__record_size:
+            self.close()
+            raise ValueError('{} is truncated'.format(path))
+
+        self.__size = size
+        self.__initial = int.from_bytes(self.__mmap[HEADER_SIZE:self.__data], 'little')
+        self._log = None
+        self.__snapshots = weakref.WeakSet()
+
+    @classmethod
+    def create(cls, path, options, size, mask=None):
+
+        """
+        Will create a store with size slots, all with flags on or mask and a full swap mask
+
+        :param path: a path of a new store file
+        :type path: str
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        :param size: number of slots
+        :type size: int
+        :param mask: initial flags of every slot, they are restored by reset
+        :type mask: int
+        :return: an opened store
+        :rtype: FlagStore
+        """
+
+        schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        full_mask = schema.full_mask
+
+        initial = full_mask if mask is None else mask & full_mask
+        record = pack_record(initial, full_mask, 0x0, schema.words)
+
+        with open(path, 'wb') as fp:
+
+            fp.write(HEADER.pack(MAGIC, VERSION, schema.words, size, schema.fingerprint).ljust(HEADER_SIZE, b'\0'))
+            fp.write(initial.to_bytes(8 * schema.words, 'little'))
+
+            for start in range(0, size, WRITE_RECORDS):
+                fp.write(record * min(WRITE_RECORDS, size - start))
+
+        return cls(path, schema)
+
+    def __len__(self):
+        return self.__size
+
+    def __getitem__(self, slot):
+
+        """
+        Will return a BitnFly compatible handle of a slot
+
+        :param slot: a slot
+        :type slot: int
+        :return: a handle
+        :rtype: StoreHandle
+        """
+
+        self._offset(slot)
+        return StoreHandle(self, slot)
+
+    def __setitem__(self, slot, value):
+
+        """
+        Will keep "store[slot] |= ..." working and write plain int flags of a slot
+
+        :param slot: a slot
+        :type slot: int
+        :param value: a handle of the same slot or flags
+        :type value: StoreHandle or int
+        :return: void
+        :rtype: void
+        """
+
+        if isinstance(value, StoreHandle) and value._table is self and value._slot == slot:
+            return
+
+        assert isinstance(value, int), 'a value must be a handle of the slot or an int'
+
+        _, swap_mask, switch_state = self.state(slot)
+        self.store(slot, value, swap_mask, switch_state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _offset(self, slot):
+
+        if not 0 <= slot < self.__size:
+            raise IndexError('slot {} is out of range'.format(slot))
+
+        return self.__data + slot * self.__record_size
+
+    def initial(self):
+
+        """
+        Will return the initial flags of the slots, restored by reset
+
+        :return: flags
+        :rtype: int
+        """
+
+        return self.__initial
+
+    def state(self, slot):
+
+        """
+        Will read the state of a slot
+
+        :param slot: a slot
+        :type slot: int
+        :return: a tuple of flags, swap mask and switch state
+        :rtype: tuple
+        """
+
+        offset = self._offset(slot)
+        flags, swap_mask, state = unpack_record(self.__mmap[offset:offset + self.__record_size], self.__words)
+
+        return flags, swap_mask, not state & SWITCHED_OFF
+
+    def store(self, slot, flags, swap_mask, switch_state):
+
+        """
+        Will write the state of a slot
+
+        :param slot: a slot
+        :type slot: int
+        :param flags: flags
+        :type flags: int
+        :param swap_mask: a swap mask
+        :type swap_mask: int
+        :param switch_state: False after off, True after on
+        :type switch_state: bool
+        :return: void
+        :rtype: void
+        """
+
+        if self._log is not None:
+            self._log.record(slot, self.state(slot), (flags, swap_mask, switch_state))
+
+        offset = self._offset(slot)
+
+        if self.__snapshots:
+            self._preserve(slot // CHUNK_SLOTS)
+
+        self.__mmap[offset:offset + self.__record_size] = pack_record(
+            flags, swap_mask, 0x0 if switch_state else SWITCHED_OFF, self.__words
+        )
+
+    def _chunk(self, chunk):
+
+        """
+        Will return the offsets of a chunk
+        """
+
+        start = self.__data + chunk * CHUNK_SLOTS * self.__record_size
+        return start, min(start + CHUNK_SLOTS * self.__record_size, self.__data + self.__size * self.__record_size)
+
+    def _preserve(self, chunk):
+
+        """
+        Will copy a chunk into the live snapshots, which do not hold it yet
+        """
+
+        start, end = self._chunk(chunk)
+        data = None
+
+        for snapshot in self.__snapshots:
+
+            if not snapshot.holds(chunk):
+
+                if data is None:
+                    data = self.__mmap[start:end]
+
+                snapshot.keep(chunk, data)
+
+    def snapshot(self):
+
+        """
+        Will take a copy on write snapshot of all slots, it costs nothing until slots are written.
+        Writes made through the numpy views of records are not seen by snapshots
+
+        :return: a snapshot, it is kept up to date until it is released or garbage collected
+        :rtype: StoreSnapshot
+        """
+
+        snapshot = StoreSnapshot(self)
+        self.__snapshots.add(snapshot)
+
+        return snapshot
+
+    def release(self, snapshot):
+
+        """
+        Will stop keeping a snapshot up to date, it must not be read after
+
+        :param snapshot: a snapshot of this store
+        :type snapshot: StoreSnapshot
+        :return: void
+        :rtype: void
+        """
+
+        self.__snapshots.discard(snapshot)
+
+    def restore(self, snapshot):
+
+        """
+        Will bring back the slots of a snapshot, only the chunks written since it was taken
+        are copied. Other live snapshots and a tracking log see the change as usual writes
+
+        :param snapshot: a snapshot of this store
+        :type snapshot: StoreSnapshot
+        :return: void
+        :rtype: void
+        """
+
+        assert snapshot in self.__snapshots, 'a snapshot must be taken from this store and not released'
+
+        for chunk, data in snapshot.chunks():
+
+            if self._log is not None:
+
+                first = chunk * CHUNK_SLOTS
+
+                for slot in range(first, first + len(data) // self.__record_size):
+                    state = snapshot.state(slot)
+
+                    if state != self.state(slot):
+                        self.store(slot, *state)
+
+                continue
+
+            self._preserve(chunk)
+
+            start, end = self._chunk(chunk)
+            self.__mmap[start:end] = data
+
+    def records(self):
+
+        """
+        Will return a zero copy view of all records
+
+        :return: a uint64 matrix with shape (len(self), 1 + 2 * schema.words)
+        :rtype: numpy.ndarray
+        """
+
+        if numpy is None:
+            raise ImportError('FlagStore.records requires numpy')
+
+        return numpy.frombuffer(
+            self.__mmap, dtype='<u8', count=self.__size * (1 + 2 * self.__words), offset=self.__data
+        ).reshape(self.__size, 1 + 2 * self.__words)
+
+    def flags_array(self):
+        """
+        Will return a zero copy view of the flags of all slots
+        :return: a uint64 matrix with shape (len(self), schema.words)
+        :rtype: numpy.ndarray
+        """
+        return self.records()[:, 1:1 + self.__words]
+
+    def mask_array(self):
+        """
+        Will return a zero copy view of the swap masks of all slots
+        :return: a uint64 matrix with shape (len(self), schema.words)
+        :rtype: numpy.ndarray
+        """
+        return self.records()[:, 1 + self.__words:]
+
+    def schema(self):
+        """
+        Will return the schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
+    def flush(self):
+        """
+        Will write modified pages back to the file
+        :return:
+        :rtype:
+        """
+        self.__mmap.flush()
+
+    def close(self):
+        """
+        Will unmap and close the file, all numpy views must be released before
+        :return:
+        :rtype:
+        """
+        if not self.__mmap.closed:
+            self.__mmap.close()
+
+        self.__file.close()
+
+
+__all__ = [
+    'CHUNK_SLOTS',
+    'FlagStore',
+    'StoreHandle',
+    'StoreSnapshot',
+]
@@ -0,0 +1,152 @@
+"""
+A module for applying operations to streams of stored masks.
+
+Every mask is treated as BitnFly(schema, mask=mask): it starts with a
+full swap mask and switched on, so a whole operation sequence reduces to
+one and/xor pair, which is applied to a chunk at a time.
+"""
+
+from itertools import islice
+
+from BitnFly.api.array import as_word_matrix, to_words
+from BitnFly.api.codec import ENCODINGS, Decoder, Encoder
+from BitnFly.api.plan import fuse
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+CHUNK_SIZE = 1 << 16
+
+
+def chunks(masks, chunk_size=CHUNK_SIZE):
+
+    """
+    Will split masks into chunks
+
+    :param masks: an iterable of ints, a uint64 array or an iterable of uint64 arrays
+    :type masks: iterable or numpy.ndarray
+    :param chunk_size: masks per chunk
+    :type chunk_size: int
+    :return: a generator of lists of ints or uint64 arrays
+    :rtype: generator
+    """
+
+    if numpy is not None and isinstance(masks, numpy.ndarray):
+
+        for start in range(0, masks.shape[0], chunk_size):
+            yield masks[start:start + chunk_size]
+
+        return
+
+    masks = iter(masks)
+
+    for first in masks:
+
+        if numpy is not None and isinstance(first, numpy.ndarray):
+
+            for part in chunks(first, chunk_size):
+                yield part
+
+            for array in masks:
+                for part in chunks(array, chunk_size):
+                    yield part
+
+            return
+
+        yield [first] + list(islice(masks, chunk_size - 1))
+
+
+def transform(masks, schema, ops, chunk_size=CHUNK_SIZE):
+
+    """
+    Will apply operations to every mask, with the same semantics as calling
+    the BitnFly methods on BitnFly(schema, mask=mask). Bits outside of the schema are dropped.
+
+    :param masks: an iterable of ints, a uint64 array or an iterable of uint64 arrays
+    :type masks: iterable or numpy.ndarray
+    :param schema: a schema of the masks
+    :type schema: FlagSchema
+    :param ops: operations, see BitnFly.api.plan
+    :type ops: iterable
+    :param chunk_size: masks per chunk
+    :type chunk_size: int
+    :return: a generator of transformed chunks, lists of ints or uint64 arrays like the input
+    :rtype: generator
+    """
+
+    and_mask, xor_mask = fuse(schema, ops)
+
+    and_words, xor_words = None, None
+
+    for chunk in chunks(masks, chunk_size):
+
+        if isinstance(chunk, list):
+            yield [(mask & and_mask) ^ xor_mask for mask in chunk]
+            continue
+
+        if and_words is None:
+            and_words = to_words(and_mask, schema.words)
+            xor_words = to_words(xor_mask, schema.words)
+
+        if chunk.ndim == 1:
+            yield (chunk & and_words[0]) ^ xor_words[0]
+
+        else:
+            yield (as_word_matrix(chunk, schema.words) & and_words) ^ xor_words
+
+
+def transform_file(src, dst, schema, ops, chunk_size=CHUNK_SIZE, encoding=None):
+
+    """
+    Will apply operations to a stream written by the codec and write the result into another one
+
+    :param src: a binary file object to read from
+    :type src: file
+    :param dst: a binary file object to write to
+    :type dst: file
+    :param schema: a schema of the masks
+    :type schema: FlagSchema
+    :param ops: operations, see BitnFly.api.plan
+    :type ops: iterable
+    :param chunk_size: masks per chunk
+    :type chunk_size: int
+    :param encoding: an encoding of dst, by default the one of src
+    :type encoding: str
+    :return: number of masks
+    :rtype: int
+    """
+
+    decoder = Decoder(src, schema)
+    names = dict((value, name) for name, value in ENCODINGS.items())
+
+    read = decoder.read_array if numpy is not None else decoder.read
+    count = 0
+
+    def read_chunks():
+
+        while True:
+
+            chunk = read(chunk_size)
+
+            if not len(chunk):
+                return
+
+            yield chunk
+
+    with Encoder(dst, schema, encoding or names[decoder.encoding]) as encoder:
+
+        for chunk in transform(read_chunks(), schema, ops, chunk_size):
+
+            encoder.write_many(chunk)
+            count += len(chunk)
+
+    return count
+
+
+__all__ = [
+    'chunks',
+    'transform',
+    'transform_file',
+]
@@ -0,0 +1,235 @@
+"""
+A module with FlagValue - an immutable, hashable set of flags of a schema.
+
+A FlagValue is a schema and a mask, nothing else: it has no swap mask
+and no switch state, it can be a dict key or a set member, and |, ^ and
+flip return new values. FlagSchema.value returns interned values, one
+object per distinct mask, so a population with few distinct sets of
+flags costs about a pointer per entity.
+"""
+
+from BitnFly.api.handle import mask_repr
+from BitnFly.api.schema import FlagSchema
+
+
+class FlagValue(object):
+
+    """
+    A FlagValue - frozen flags with the read API of BitnFly
+    """
+
+    __slots__ = ('__schema', '__mask', '__hash', '__weakref__')
+
+    def __init__(self, options, mask=None):
+
+        """
+        :param options: list of strings or a FlagSchema
+        :type options: list or FlagSchema
+        :param mask: flags, all flags by default as in BitnFly, bits outside of the schema are dropped
+        :type mask: int
+        """
+
+        assert isinstance(options, (list, FlagSchema)), 'an options attribute must be a list or a FlagSchema'
+
+        schema = options if isinstance(options, FlagSchema) else FlagSchema(options)
+        mask = schema.full_mask if mask is None else int(mask) & schema.full_mask
+
+        object.__setattr__(self, '_FlagValue__schema', schema)
+        object.__setattr__(self, '_FlagValue__mask', mask)
+        object.__setattr__(self, '_FlagValue__hash', hash((schema.fingerprint, mask)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable'.format(self.__class__.__name__))
+
+    def __reduce__(self):
+        return self.__class__, (self.__schema, self.__mask)
+
+    def __hash__(self):
+        return self.__hash
+
+    def __eq__(self, other):
+
+        if not isinstance(other, FlagValue):
+            return NotImplemented
+
+        if self is other:
+            return True
+
+        return self.__mask == other.get(output=int) and self.__schema.fingerprint == other.schema().fingerprint
+
+    def __ne__(self, other):
+
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __int__(self):
+        return self.__mask
+
+    def __and__(self, other):
+
+        """
+        A bitwise operator &
+
+        :param other: can be an int, an option or a group name
+        :type other: int or str
+        :return: True if other is set in self, or implied by a set flag, otherwise False
+        :rtype: bool
+        """
+
+        if isinstance(other, str):
+            other = self.__schema.mask_of(other)
+
+        elif not isinstance(other, int):
+            return False
+
+        if self.__schema.implied_by:
+            other = self.__schema.implied_by_mask(other)
+
+        return bool(self.__mask & other)
+
+    def __or__(self, other):
+
+        """
+        A bitwise operator |
+
+        :param other: can be an int, a str, or a list, a tuple or a frozenset of int or of str
+        :type other: int, str, list, tuple, frozenset
+        :return: a new value with other and the flags it implies set
+        :rtype: FlagValue
+        """
+
+        return self._derive(self.__mask | self.__schema.or_mask(other))
+
+    def __xor__(self, other):
+        return self.flip(other)
+
+    def __str__(self):
+        return str(self.__mask)
+
+    def __repr__(self):
+        return '<{}({})>'.format(self.__class__.__name__, mask_repr(self.__mask))
+
+    def __getattr__(self, item):
+
+        bit = self.__schema.options.get(item.upper()) if not item.startswith('_') else None
+
+        if bit is None:
+            raise AttributeError(item)
+
+        return bit
+
+    def _derive(self, mask):
+
+        """
+        Will return a value of the same schema, interned when this one is
+        """
+
+        if self.__schema.is_interned(self):
+            return self.__schema.value(mask)
+
+        return FlagValue(self.__schema, mask)
+
+    def flip(self, bits):
+
+        """
+        Will return a value with bit or bits flipped
+
+        :param bits: can be an int, a str, or a list, a tuple or a frozenset of int or of str
+        :type bits: int, str, list, tuple, frozenset
+        :return: a new value
+        :rtype: FlagValue
+        """
+
+        return self._derive(self.__mask ^ self.__schema.mask_of(bits, '__xor__'))
+
+    def intern(self):
+
+        """
+        Will return the interned value with the same flags
+
+        :return: an interned value
+        :rtype: FlagValue
+        """
+
+        return self.__schema.value(self.__mask)
+
+    def get(self, bit=None, output=int):
+
+        """
+        Will return the mask, if arg bit is None, otherwise the mask of bit if it is set
+
+        :param bit:
+        :type bit: str or int
+        :param output: a callable eg. hex, bin
+        :type output: callable
+        :return: a bit flag
+        :rtype: int
+        """
+
+        if bit is None:
+            return output(self.__mask)
+
+        elif isinstance(bit, int):
+            return output(self.__mask & bit) if self.__schema.is_bit(bit) else 0
+
+        elif isinstance(bit, str):
+            return output(self.__mask & self.__schema.mask_of(bit))
+
+        else:
+            raise TypeError('A bit argument can be int or a str')
+
+    def names(self):
+
+        """
+        Will return the lower cased names of the set flags, in bit order
+
+        :return: a list of names
+        :rtype: list
+        """
+
+        return self.__schema.names_of(self.__mask)
+
+    def iter_set(self):
+
+        """
+        Will iterate the lower cased names of the set flags, visiting only the set bits
+
+        :return: a generator of names
+        :rtype: generator
+        """
+
+        return self.__schema.iter_names(self.__mask)
+
+    def flags(self):
+        """
+        Will return all flags in ordered dict
+        :return:
+        :rtype:
+        """
+        return self.__schema.options
+
+    def schema(self):
+        """
+        Will return the schema
+        :return:
+        :rtype: FlagSchema
+        """
+        return self.__schema
+
+    def thaw(self, **kwargs):
+        """
+        Will return a new BitnFly starting with these flags
+        :param kwargs: passed to the constructor, eg. an 'output'
+        :type kwargs: dict
+        :return:
+        :rtype: BitnFly
+        """
+        return self.__schema.create(mask=self.__mask, **kwargs)
+
+
+__all__ = [
+    'FlagValue',
+]
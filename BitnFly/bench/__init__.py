@@ -0,0 +1,65 @@
+"""
+A package with BitnFly benchmarks, run them with ``python -m BitnFly.bench``
+"""
+
+import timeit
+
+
+def make_options(size):
+
+    """
+    Will create a list of option names
+
+    :param size: number of options
+    :type size: int
+    :return: a list of strings
+    :rtype: list
+    """
+
+    return ['flag_{}'.format(x) for x in range(size)]
+
+
+def measure(func, number, repeat=3):
+
+    """
+    Will time a callable and return the best time per call
+
+    :param func: a callable without arguments
+    :type func: callable
+    :param number: calls per round
+    :type number: int
+    :param repeat: rounds, the best one is taken
+    :type repeat: int
+    :return: nanoseconds per call
+    :rtype: float
+    """
+
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1e9
+
+
+def format_table(rows, columns):
+
+    """
+    Will render a list of dictionaries as a plain text table
+
+    :param rows: a list of dictionaries
+    :type rows: list
+    :param columns: keys to show, in order
+    :type columns: list
+    :return: the table
+    :rtype: str
+    """
+
+    cells = [[str(col) for col in columns]]
+
+    for row in rows:
+        cells.append([
+            '{:.1f}'.format(row[col]) if isinstance(row[col], float) else str(row[col]) for col in columns
+        ])
+
+    widths = [max(len(line[x]) for line in cells) for x in range(len(columns))]
+
+    return '\n'.join(
+        '  '.join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells
+    )
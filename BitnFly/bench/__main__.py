@@ -0,0 +1,115 @@
+"""
+Command line entry point: python -m BitnFly.bench
+"""
+
+import argparse
+import json
+import platform
+import sys
+
+from BitnFly.bench import format_table, hotpath, instrument, population, shared, threads
+
+COLUMNS = {
+    'hotpath': ['size', 'operation', 'ns', 'ops/s'],
+    'instrument': ['size', 'operation', 'variant', 'ns', 'ops/s'],
+    'population': ['size', 'population', 'variant', 'ops/s', 'bytes/object'],
+    'threads': ['variant', 'readers', 'writers', 'reads/s', 'writes/s'],
+    'shared': ['readers', 'writers', 'reads/s', 'updates/s'],
+}
+
+KEYS = {
+    'hotpath': ('size', 'operation'),
+    'instrument': ('size', 'operation', 'variant'),
+    'population': ('size', 'population', 'variant'),
+    'threads': ('variant', 'readers', 'writers'),
+    'shared': ('readers', 'writers'),
+}
+
+
+def compare(rows, baseline):
+
+    """
+    Will add a 'change' column - ops/s (or reads/s) relative to a previous run
+
+    :param rows: rows of this run
+    :type rows: list
+    :param baseline: rows of a previous run
+    :type baseline: list
+    :return: void
+    :rtype: void
+    """
+
+    def key(row):
+        return (row['suite'],) + tuple(row[name] for name in KEYS[row['suite']])
+
+    old = dict((key(row), row) for row in baseline)
+
+    for row in rows:
+
+        metric = 'reads/s' if row['suite'] in ('threads', 'shared') else 'ops/s'
+        previous = old.get(key(row))
+
+        row['change'] = '{:+.1%}'.format(row[metric] / previous[metric] - 1) if previous else '-'
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='python -m BitnFly.bench')
+    parser.add_argument('suites', nargs='*', metavar='suite',
+                        help='one of {}, by default hotpath and population'.format(', '.join(sorted(COLUMNS))))
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(hotpath.SIZES), help='schema widths')
+    parser.add_argument('--populations', type=int, nargs='+', default=list(population.POPULATIONS),
+                        help='numbers of objects')
+    parser.add_argument('--number', type=int, default=20000, help='calls per measurement')
+    parser.add_argument('--duration', type=float, default=1.0, help='seconds per threaded measurement')
+    parser.add_argument('--json', metavar='PATH', help='write the results as json')
+    parser.add_argument('--compare', metavar='PATH', help='json results of a previous run')
+
+    args = parser.parse_args(argv)
+
+    for suite in args.suites:
+        if suite not in COLUMNS:
+            parser.error('unknown suite {!r}'.format(suite))
+
+    rows = []
+
+    for suite in args.suites or ['hotpath', 'population']:
+
+        if suite == 'hotpath':
+            result = hotpath.run(sizes=args.sizes, number=args.number)
+
+        elif suite == 'instrument':
+            result = instrument.run(number=args.number)
+
+        elif suite == 'population':
+            result = population.run(populations=args.populations, sizes=[size for size in args.sizes if size <= 1024])
+
+        elif suite == 'shared':
+            result = shared.run(duration=args.duration)
+
+        else:
+            result = [dict(row, suite='threads') for row in threads.run(duration=args.duration)]
+
+        if args.compare:
+            with open(args.compare) as fp:
+                compare(result, json.load(fp)['results'])
+
+        columns = COLUMNS[suite] + (['change'] if args.compare else [])
+
+        print(format_table(result, columns))
+        print('')
+
+        rows.extend(result)
+
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump({
+                'python': sys.version.split()[0],
+                'implementation': platform.python_implementation(),
+                'machine': platform.machine(),
+                'results': rows,
+            }, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Every BitnFly operation against schemas of growing width
+"""
+
+from BitnFly.api import BitnFly, FlagSchema
+from BitnFly.bench import make_options, measure
+
+SIZES = (4, 64, 256, 1024, 10000, 100000)
+
+
+def cases(b, options):
+
+    """
+    Will return the timed operations of one object
+
+    :param b: an object
+    :type b: BitnFly
+    :param options: its option names
+    :type options: list
+    :return: a list of (name, callable, calls per measurement factor) tuples
+    :rtype: list
+    """
+
+    name, bit = options[-1], 1 << (len(options) - 1)
+    names, bits = options[-3:], [1 << x for x in range(max(0, len(options) - 3), len(options))]
+    group = tuple(names)
+
+    if 'bench_group' not in b.schema().groups:
+        b.schema().group('bench_group', group)
+
+    return [
+        ('flip(int)', lambda: b.flip(bit), 1.0),
+        ('flip(str)', lambda: b.flip(name), 1.0),
+        ('flip([int])', lambda: b.flip(bits), 1.0),
+        ('flip([str])', lambda: b.flip(names), 1.0),
+        ('flip((str))', lambda: b.flip(group), 1.0),
+        ('flip(group)', lambda: b.flip('bench_group'), 1.0),
+        ('|= str', lambda: b.__or__(name), 1.0),
+        ('|= [str]', lambda: b.__or__(names), 1.0),
+        ('^= str', lambda: b.__xor__(name), 1.0),
+        ('& int', lambda: b & bit, 1.0),
+        ('& str', lambda: b & name, 1.0),
+        ('get()', lambda: b.get(), 1.0),
+        ('get(int)', lambda: b.get(bit), 1.0),
+        ('get(str)', lambda: b.get(name), 1.0),
+        ('names()', lambda: b.names(), 0.1),
+        ('flip_range', lambda: b.flip_range(0, len(options) // 2), 1.0),
+        ('off/on', lambda: b.off().on(), 1.0),
+        ('reset', lambda: b.reset(), 1.0),
+        ('repr', lambda: repr(b), 0.01),
+    ]
+
+
+def run(sizes=SIZES, number=20000, cls=BitnFly):
+
+    """
+    Will time every operation for every schema size
+
+    :param sizes: schema widths
+    :type sizes: tuple
+    :param number: calls per measurement, fewer for slow operations
+    :type number: int
+    :param cls: a class taking a schema
+    :type cls: type
+    :return: a list of rows
+    :rtype: list
+    """
+
+    rows = []
+
+    for size in sizes:
+
+        options = make_options(size)
+        schema = FlagSchema(options)
+        b = cls(schema)
+
+        timed = [('construct', lambda: cls(schema), 1.0)] + cases(b, options)
+
+        for operation, func, factor in timed:
+
+            ns = measure(func, max(10, int(number * factor)))
+
+            rows.append({
+                'suite': 'hotpath', 'size': size, 'operation': operation,
+                'ns': ns, 'ops/s': 1e9 / ns,
+            })
+
+    return rows
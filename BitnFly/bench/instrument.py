@@ -0,0 +1,53 @@
+"""
+The cost of instrumentation: objects of a schema which was never instrumented,
+of an instrumented one, and objects built while instrumented after it was disabled
+"""
+
+from BitnFly.api import BitnFly, FlagSchema
+from BitnFly.bench import make_options, measure
+from BitnFly.bench.hotpath import cases
+
+
+def run(size=64, number=20000):
+
+    """
+    Will time the hot path operations in every variant
+
+    :param size: a schema width
+    :type size: int
+    :param number: calls per measurement
+    :type number: int
+    :return: a list of rows
+    :rtype: list
+    """
+
+    options = make_options(size)
+
+    plain = BitnFly(FlagSchema(options))
+
+    schema = FlagSchema(options)
+    schema.instrument()
+    enabled = BitnFly(schema)
+
+    schema = FlagSchema(options)
+    schema.instrument()
+    disabled = BitnFly(schema)
+    schema.uninstrument()
+
+    rows = []
+
+    for variant, b in (('plain', plain), ('enabled', enabled), ('disabled', disabled)):
+
+        for operation, func, factor in cases(b, options):
+
+            if operation == 'repr':
+                continue
+
+            ns = measure(func, max(10, int(number * factor)))
+
+            rows.append({
+                'suite': 'instrument', 'size': size, 'operation': operation, 'variant': variant,
+                'ns': ns, 'ops/s': 1e9 / ns,
+            })
+
+    return rows
@@ -0,0 +1,80 @@
+"""
+Building populations of objects and the memory they take
+"""
+
+import gc
+import itertools
+import time
+import tracemalloc
+
+from BitnFly.api import BitnFly, FlagSchema, SparseBitnFly
+from BitnFly.bench import make_options
+
+POPULATIONS = (1000, 100000, 1000000)
+SIZES = (4, 64, 1024)
+
+
+def _build(factory, count):
+
+    gc.collect()
+    tracemalloc.start()
+
+    start = time.perf_counter()
+    objects = [factory() for _ in range(count)]
+    elapsed = time.perf_counter() - start
+
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # the list itself is not a part of an object
+    per_object = (size - 8 * count) / float(count)
+
+    del objects
+    return elapsed, per_object
+
+
+def run(populations=POPULATIONS, sizes=SIZES):
+
+    """
+    Will build populations with a shared schema, and with an options list for small ones
+
+    :param populations: numbers of objects
+    :type populations: tuple
+    :param sizes: schema widths
+    :type sizes: tuple
+    :return: a list of rows
+    :rtype: list
+    """
+
+    rows = []
+
+    for size in sizes:
+
+        options = make_options(size)
+        schema = FlagSchema(options)
+
+        for count in populations:
+
+            # a few distinct permission sets shared by the whole population
+            masks = [schema.full_mask >> shift for shift in range(8)]
+            picks = itertools.count()
+
+            variants = [
+                ('schema', lambda: BitnFly(schema)),
+                ('sparse', lambda: SparseBitnFly(schema)),
+                ('interned', lambda: schema.value(masks[next(picks) % 8])),
+            ]
+
+            if count * size <= 10 ** 7:
+                variants.append(('list', lambda: BitnFly(options)))
+
+            for variant, factory in variants:
+
+                elapsed, per_object = _build(factory, count)
+
+                rows.append({
+                    'suite': 'population', 'size': size, 'population': count, 'variant': variant,
+                    'ops/s': count / elapsed, 'bytes/object': per_object,
+                })
+
+    return rows
@@ -0,0 +1,95 @@
+"""
+Read and update throughput of a SharedFlagTable from many processes.
+Readers check a flag of a random slot, writers flip two flags of a random slot.
+"""
+
+import multiprocessing
+import random
+import time
+
+from BitnFly.api import FlagSchema, SharedFlagTable
+from BitnFly.bench import make_options
+
+
+def _worker(table, kind, slots, start, stop, counts, index):
+
+    rand = random.Random(index)
+    count = 0
+
+    while time.time() < start:
+        pass
+
+    while time.time() < stop:
+
+        for _ in range(100):
+
+            handle = table[rand.randrange(slots)]
+
+            if kind == 'read':
+                handle & 'flag_1'
+
+            else:
+                handle.flip(['flag_1', 'flag_2'])
+
+        count += 100
+
+    counts[index] = count
+    table.close()
+
+
+def run(readers=(1, 4), writers=(0, 1, 4), duration=1.0, size=64, slots=100000):
+
+    """
+    Will measure reads and updates per second for every mix of reader and writer processes
+
+    :param readers: numbers of reader processes
+    :type readers: tuple
+    :param writers: numbers of writer processes
+    :type writers: tuple
+    :param duration: seconds per measurement
+    :type duration: float
+    :param size: schema width
+    :type size: int
+    :param slots: table size
+    :type slots: int
+    :return: a list of rows
+    :rtype: list
+    """
+
+    context = multiprocessing.get_context('fork')
+    table = SharedFlagTable.create(FlagSchema(make_options(size)), slots)
+
+    rows = []
+
+    try:
+        for reader_count in readers:
+            for writer_count in writers:
+
+                kinds = ['read'] * reader_count + ['write'] * writer_count
+                counts = context.Array('q', len(kinds))
+
+                start = time.time() + 0.5
+                stop = start + duration
+
+                processes = [
+                    context.Process(target=_worker, args=(table, kind, slots, start, stop, counts, index))
+                    for index, kind in enumerate(kinds)
+                ]
+
+                for process in processes:
+                    process.start()
+
+                for process in processes:
+                    process.join()
+
+                rows.append({
+                    'suite': 'shared', 'readers': reader_count, 'writers': writer_count,
+                    'reads/s': sum(counts[:reader_count]) / duration,
+                    'updates/s': sum(counts[reader_count:]) / duration,
+                })
+
+    finally:
+        table.close()
+        table.unlink()
+
+    return rows
@@ -0,0 +1,106 @@
+"""
+Read throughput of a shared state under write contention.
+A BitnFly guarded by one lock for reads and writes is compared with ConcurrentBitnFly,
+where only writers take a lock.
+"""
+
+import threading
+import time
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagSchema
+from BitnFly.bench import make_options
+
+
+class LockedBitnFly(object):
+
+    """
+    The baseline - every call of a shared BitnFly goes through one lock
+    """
+
+    def __init__(self, schema):
+
+        self.__lock = threading.Lock()
+        self.__b = BitnFly(schema)
+
+    def __and__(self, other):
+        with self.__lock:
+            return self.__b & other
+
+    def flip(self, bits):
+        with self.__lock:
+            self.__b.flip(bits)
+
+
+def _run(shared, readers, writers, duration):
+
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0] * writers
+
+    def read(index):
+
+        count = 0
+
+        while not stop.is_set():
+            for _ in range(100):
+                shared & 'flag_1'
+            count += 100
+
+        reads[index] = count
+
+    def write(index):
+
+        count = 0
+
+        while not stop.is_set():
+            shared.flip(['flag_1', 'flag_2'])
+            count += 1
+
+        writes[index] = count
+
+    threads = [threading.Thread(target=read, args=(x,)) for x in range(readers)]
+    threads += [threading.Thread(target=write, args=(x,)) for x in range(writers)]
+
+    for thread in threads:
+        thread.start()
+
+    time.sleep(duration)
+    stop.set()
+
+    for thread in threads:
+        thread.join()
+
+    return sum(reads) / duration, sum(writes) / duration
+
+
+def run(readers=4, writers=(0, 1, 4), duration=1.0, size=64):
+
+    """
+    Will measure reads and writes per second for every number of writer threads
+
+    :param readers: reader threads
+    :type readers: int
+    :param writers: numbers of writer threads
+    :type writers: tuple
+    :param duration: seconds per measurement
+    :type duration: float
+    :param size: schema width
+    :type size: int
+    :return: a list of rows
+    :rtype: list
+    """
+
+    schema = FlagSchema(make_options(size))
+    rows = []
+
+    for count in writers:
+        for name, shared in (('locked', LockedBitnFly(schema)), ('concurrent', ConcurrentBitnFly(schema))):
+
+            reads, writes = _run(shared, readers, count, duration)
+
+            rows.append({
+                'variant': name, 'readers': readers, 'writers': count,
+                'reads/s': float(reads), 'writes/s': float(writes),
+            })
+
+    return rows
@@ -0,0 +1,118 @@
+import io
+import random
+import unittest
+
+from BitnFly.api import BitnFly, BitnFlyArray, FlagSchema
+from BitnFly.api import analytics
+from BitnFly.api.analytics import analyze, analyze_file, flag_counts, numpy
+from BitnFly.api.array import as_word_matrix
+from BitnFly.api.codec import dump
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+def _expected(masks, schema):
+
+    width = len(schema)
+
+    counts = [sum(1 for mask in masks if mask >> x & 1) for x in range(width)]
+    pairs = [[sum(1 for mask in masks if mask >> x & 1 and mask >> y & 1) for y in range(width)] for x in range(width)]
+    histogram = [sum(1 for mask in masks if bin(mask & schema.full_mask).count('1') == n) for n in range(width + 1)]
+
+    return counts, pairs, histogram
+
+
+class TestAnalytics(unittest.TestCase):
+
+    def setUp(self):
+
+        rnd = random.Random(7)
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.wide = FlagSchema(['flag_{}'.format(x) for x in range(70)])
+        self.masks = [rnd.getrandbits(8) for _ in range(500)]
+        self.wide_masks = [rnd.getrandbits(70) for _ in range(300)]
+
+    def _check(self, stats, masks, schema):
+
+        counts, pairs, histogram = _expected(masks, schema)
+
+        self.assertEqual(len(masks), stats.total)
+        self.assertEqual(counts, list(stats.counts))
+        self.assertEqual(histogram, list(stats.histogram))
+        self.assertEqual(pairs, [list(row) for row in stats.pairs])
+
+    def test_ints(self):
+
+        self._check(analyze(self.masks, self.schema, chunk_size=64), self.masks, self.schema)
+        self._check(analyze(self.wide_masks, self.wide, chunk_size=64), self.wide_masks, self.wide)
+
+    def test_objects(self):
+
+        objects = [BitnFly(self.schema, mask=mask) for mask in self.masks]
+        stats = analyze(objects, self.schema)
+
+        self._check(stats, self.masks, self.schema)
+        self.assertEqual(stats.counts[0], stats.count(self.schema.names[0]))
+        self.assertEqual(stats.pairs[0][3], stats.pair(self.schema.names[0], self.schema.names[3]))
+
+    def test_outside_bits(self):
+
+        stats = analyze([0b1 | 1 << 40], self.schema, pairs=False)
+
+        self.assertIsNone(stats.pairs)
+        self.assertEqual(1, stats.histogram[1])
+
+    def test_flag_counts(self):
+
+        counts = flag_counts(self.masks, self.schema)
+        self.assertEqual(_expected(self.masks, self.schema)[0], [counts[name] for name in self.schema.names])
+
+    def test_add(self):
+
+        stats = analyze(self.masks[:200], self.schema) + analyze(self.masks[200:], self.schema)
+        self._check(stats, self.masks, self.schema)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_arrays(self):
+
+        array = numpy.array(self.masks, dtype=numpy.uint64)
+        self._check(analyze(array, self.schema, chunk_size=100), self.masks, self.schema)
+
+        matrix = as_word_matrix(self.wide_masks, self.wide.words)
+        self._check(analyze([matrix[:100], matrix[100:]], self.wide), self.wide_masks, self.wide)
+
+        rows = BitnFlyArray(self.wide, masks=self.wide_masks)
+        self._check(analyze(rows.get(), self.wide, chunk_size=32), self.wide_masks, self.wide)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_exact_rows(self):
+
+        saved = analytics.EXACT_ROWS
+        analytics.EXACT_ROWS = 7
+
+        # pairs of a chunk longer than a float32 product can count are added up block by block
+        try:
+            array = numpy.array(self.masks, dtype=numpy.uint64)
+            self._check(analyze(array, self.schema, chunk_size=100), self.masks, self.schema)
+
+        finally:
+            analytics.EXACT_ROWS = saved
+
+    def test_file(self):
+
+        fp = io.BytesIO()
+        dump(self.wide_masks, fp, self.wide, encoding='auto')
+        fp.seek(0)
+
+        self._check(analyze_file(fp, self.wide, chunk_size=50), self.wide_masks, self.wide)
+
+    def test_without_numpy(self):
+
+        saved = analytics.numpy
+        analytics.numpy = None
+
+        try:
+            self._check(analyze(self.wide_masks, self.wide, chunk_size=64), self.wide_masks, self.wide)
+
+        finally:
+            analytics.numpy = saved
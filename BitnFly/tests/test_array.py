@@ -0,0 +1,87 @@
+import unittest
+
+from BitnFly.api import BitnFly, BitnFlyArray, FlagSchema
+from BitnFly.api.array import numpy
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestBitnFlyArray(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.users = BitnFlyArray(self.schema, size=4)
+
+    def test_init(self):
+
+        self.assertEqual(4, len(self.users))
+        self.assertEqual([255] * 4, self.users.to_ints())
+        self.assertEqual([255] * 4, self.users.mask().tolist())
+
+        users = BitnFlyArray(self.schema, masks=[1, 2, 3])
+        self.assertEqual([1, 2, 3], users.get().tolist())
+
+        with self.assertRaises(ValueError):
+            users.get()[0] = 0
+
+    def test_same_as_bitnfly(self):
+
+        users = BitnFlyArray(self.schema, masks=[1, 0x11, 0xf0])
+        single = [BitnFly(self.schema, mask=mask) for mask in (1, 0x11, 0xf0)]
+
+        for target in [users] + single:
+            target.flip(['admin', 'staff'])
+            target |= [16, 32]
+            target ^= 2
+            target.off()
+            target.flip('can_publish')
+            target.on()
+
+        self.assertEqual([b.get() for b in single], users.to_ints())
+        self.assertEqual([b.mask() for b in single], users.mask().tolist())
+
+        users.reset()
+        self.assertEqual([1, 0x11, 0xf0], users.to_ints())
+
+    def test_and_get(self):
+
+        users = BitnFlyArray(self.schema, masks=[1, 0x11, 0xf0])
+
+        self.assertEqual([True, True, False], (users & 'admin').tolist())
+        self.assertEqual([False, True, True], (users & 16).tolist())
+        self.assertEqual([0, 16, 16], users.get('can_read').tolist())
+        self.assertEqual([0, 0, 0], users.get(3).tolist())
+
+        with self.assertRaises(TypeError):
+            users.get(['admin'])
+
+    def test_per_row(self):
+
+        users = BitnFlyArray(self.schema, masks=[0, 0, 0])
+        users.flip(numpy.array([1, 2, 4], dtype=numpy.uint64))
+
+        self.assertEqual([1, 2, 4], users.to_ints())
+        self.assertEqual([254, 253, 251], users.mask().tolist())
+
+        users.off()
+        self.assertEqual([1, 2, 4], users.to_ints())
+
+        users |= numpy.array([8, 8, 8], dtype=numpy.uint64)
+        users.off()
+        self.assertEqual([1, 2, 4], users.to_ints())
+
+    def test_wide(self):
+
+        options = ['flag_{}'.format(x) for x in range(130)]
+        masks = [1 << 129 | 1, 1 << 64]
+
+        users = BitnFlyArray(options, masks=masks)
+        self.assertEqual((2, 3), users.get().shape)
+        self.assertEqual(masks, users.to_ints())
+
+        self.assertEqual([True, False], (users & 'flag_129').tolist())
+        self.assertEqual([False, True], (users & 'flag_64').tolist())
+
+        users.flip(['flag_129', 'flag_64'])
+        self.assertEqual([1 << 64 | 1, 1 << 129], users.to_ints())
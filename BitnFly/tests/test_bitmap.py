@@ -0,0 +1,61 @@
+import random
+import unittest
+
+from BitnFly.api import Bitmap
+
+
+class TestBitmap(unittest.TestCase):
+
+    def setUp(self):
+
+        rnd = random.Random(7)
+
+        self.left = set(rnd.sample(range(200000), 9000)) | set(range(70000, 80000))
+        self.right = set(rnd.sample(range(200000), 3000)) | set(range(75000, 76000))
+
+    def test_add_discard(self):
+
+        bitmap = Bitmap([5, 1, 70000, 5])
+
+        self.assertEqual([1, 5, 70000], list(bitmap))
+        self.assertTrue(70000 in bitmap)
+        self.assertFalse(2 in bitmap)
+
+        bitmap.discard(5)
+        bitmap.discard(6)
+        self.assertEqual(2, len(bitmap))
+
+        with self.assertRaises(AssertionError):
+            bitmap.add(1 << 32)
+
+    def test_dense(self):
+
+        bitmap = Bitmap(range(10000))
+        self.assertEqual(10000, len(bitmap))
+
+        for value in range(9000):
+            bitmap.discard(value)
+
+        self.assertEqual(list(range(9000, 10000)), list(bitmap))
+
+    def test_set_algebra(self):
+
+        left, right = Bitmap(self.left), Bitmap(self.right)
+
+        self.assertEqual(sorted(self.left & self.right), list(left & right))
+        self.assertEqual(sorted(self.left | self.right), list(left | right))
+        self.assertEqual(sorted(self.left - self.right), list(left - right))
+        self.assertEqual(sorted(self.right - self.left), list(right - left))
+
+    def test_copy(self):
+
+        left = Bitmap([1, 2])
+        union = left | Bitmap([3])
+        union.add(4)
+
+        copy = left.copy()
+        copy.add(5)
+
+        self.assertEqual([1, 2], list(left))
+        self.assertEqual([1, 2, 3, 4], list(union))
+        self.assertEqual(Bitmap([1, 2, 5]), copy)
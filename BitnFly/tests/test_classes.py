@@ -0,0 +1,89 @@
+import pickle
+import unittest
+import weakref
+
+from BitnFly.api import BitnFly, FlagSchema, SparseBitnFly, make_class
+from BitnFly.tests.test_bits_fly import UserSettings
+
+# a global of this module, so that its instances can be pickled
+Account = FlagSchema(['read', 'write', 'admin'], implies={'admin': 'write'}).make_class('Account', properties=True)
+
+
+class TestMakeClass(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options, implies={'admin': 'can_edit'})
+        self.User = self.schema.make_class('User', properties=True)
+
+    def test_class(self):
+
+        user = self.User(mask=0x0)
+
+        self.assertIsInstance(user, BitnFly)
+        self.assertIs(self.schema, user.schema())
+        self.assertIs(self.schema, self.User.schema_)
+        self.assertEqual('User', type(user).__name__)
+        self.assertEqual(128, self.User.CAN_PUBLISH)
+        self.assertEqual(1, user.ADMIN)
+        self.assertFalse(hasattr(user, '__dict__'))
+
+        with self.assertRaises(AttributeError):
+            user.anything = 1
+
+    def test_properties(self):
+
+        user = self.User(mask=0x0)
+
+        self.assertFalse(user.is_admin)
+        self.assertIs(user, user.set_admin())
+
+        # set_ and is_ follow the implication rules as | and & do
+        self.assertTrue(user.is_admin)
+        self.assertTrue(user.is_can_edit)
+        self.assertEqual(0b1000001, user.get())
+        self.assertEqual(self.schema.full_mask, user.mask())
+
+        other = self.User(mask=0x1)
+        self.assertTrue(other.is_can_edit)
+        self.assertFalse(other.is_can_read)
+
+    def test_other_base(self):
+
+        sparse_user = make_class('SparseUser', self.schema, properties=True, base=SparseBitnFly)
+        flags = sparse_user(mask=0x0).set_admin()
+
+        self.assertTrue(flags.is_can_edit)
+        self.assertEqual(0b1000001, flags.get())
+
+    def test_collision(self):
+
+        with self.assertRaises(ValueError):
+            make_class('Bad', ['schema', 'get', 'on'], properties=True, base=type('Base', (BitnFly,), {'ON': 1}))
+
+    def test_pickle(self):
+
+        account = Account(mask=0x0).set_admin()
+        copy = pickle.loads(pickle.dumps(account))
+
+        self.assertEqual(__name__, Account.__module__)
+        self.assertIs(Account, type(copy))
+        self.assertEqual(account.get(), copy.get())
+        self.assertTrue(copy.is_write)
+
+        self.assertEqual('accounts', make_class('Account', ['read'], module='accounts').__module__)
+        self.assertEqual('accounts', Account.schema_.make_class('Account', module='accounts').__module__)
+
+    def test_slots(self):
+
+        b = BitnFly(self.schema)
+
+        self.assertFalse(hasattr(b, '__dict__'))
+        self.assertIs(b, weakref.ref(b)())
+
+        with self.assertRaises(AttributeError):
+            b._private
+
+        copy = pickle.loads(pickle.dumps(b))
+        self.assertEqual(b.get(), copy.get())
+        self.assertEqual(1, copy.admin)
@@ -0,0 +1,130 @@
+import io
+import random
+import unittest
+
+from BitnFly.api import FlagSchema
+from BitnFly.api.codec import Decoder, Encoder, dump, load, numpy
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestCodec(unittest.TestCase):
+
+    def setUp(self):
+
+        rnd = random.Random(3)
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.wide = FlagSchema(['flag_{}'.format(x) for x in range(1000)])
+
+        self.masks = list(range(256))
+        self.sparse = [0, 1 << 999] + [
+            sum(1 << rnd.randrange(1000) for _ in range(rnd.randrange(10))) for _ in range(100)
+        ] + [self.wide.full_mask]
+
+    def roundtrip(self, masks, schema, encoding, buffer_size=7):
+
+        fp = io.BytesIO()
+        dump(masks, fp, schema, encoding)
+
+        fp.seek(0)
+        self.assertEqual(masks, list(Decoder(fp, schema, buffer_size=buffer_size)))
+
+        return len(fp.getvalue())
+
+    def test_roundtrip(self):
+
+        self.assertEqual(16 + 256, self.roundtrip(self.masks, self.schema, 'dense'))
+
+        for encoding in ('dense', 'sparse', 'auto'):
+            self.roundtrip(self.masks, self.schema, encoding)
+            self.roundtrip(self.sparse, self.wide, encoding)
+
+    def test_sizes(self):
+
+        dense = self.roundtrip(self.sparse, self.wide, 'dense')
+        sparse = self.roundtrip(self.sparse, self.wide, 'sparse')
+        auto = self.roundtrip(self.sparse, self.wide, 'auto')
+
+        self.assertTrue(sparse < dense / 3)
+        self.assertTrue(auto < sparse)
+        self.assertTrue(auto < dense / 5)
+
+    def test_chunks(self):
+
+        fp = io.BytesIO()
+
+        with Encoder(fp, self.schema, buffer_size=10) as encoder:
+            for mask in self.masks:
+                encoder.write(mask)
+
+        fp.seek(0)
+        decoder = Decoder(fp, self.schema, buffer_size=3)
+
+        self.assertEqual(self.masks[:100], decoder.read(100))
+        self.assertEqual(self.masks[100:], decoder.read(1000))
+        self.assertEqual([], decoder.read(1))
+
+    def test_errors(self):
+
+        fp = io.BytesIO()
+        dump(self.masks, fp, self.schema)
+
+        fp.seek(0)
+        with self.assertRaises(ValueError):
+            load(fp, self.wide)
+
+        with self.assertRaises(ValueError):
+            load(io.BytesIO(b'nothing here at all'), self.schema)
+
+        with self.assertRaises(AssertionError):
+            Encoder(io.BytesIO(), self.schema, 'zip')
+
+    def test_truncated(self):
+
+        fp = io.BytesIO()
+        dump(self.masks[:3], fp, self.wide)
+
+        data = fp.getvalue()[:-1]
+
+        # a truncated last record raises, whichever way it is read
+        for read in (list, lambda decoder: decoder.read(10), lambda decoder: decoder.read(3)):
+            with self.assertRaises(ValueError):
+                read(Decoder(io.BytesIO(data), self.wide))
+
+        decoder = Decoder(io.BytesIO(data), self.wide)
+        self.assertEqual(self.masks[:2], decoder.read(2))
+
+        if numpy is not None:
+            with self.assertRaises(ValueError):
+                Decoder(io.BytesIO(data), self.wide).read_array(10)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array(self):
+
+        fp = io.BytesIO()
+        dump(numpy.array(self.masks, dtype=numpy.uint64), fp, self.schema)
+
+        fp.seek(0)
+        self.assertEqual(self.masks, Decoder(fp, self.schema).read_array(1000).tolist())
+
+        # bits above the schema are dropped, as write drops them
+        fp = io.BytesIO()
+        dump(numpy.array([0x3ff], dtype=numpy.uint64), fp, FlagSchema(['read', 'write', 'delete']))
+
+        fp.seek(0)
+        self.assertEqual([0x7], load(fp, FlagSchema(['read', 'write', 'delete'])))
+
+        from BitnFly.api.array import as_word_matrix
+
+        fp = io.BytesIO()
+        dump(as_word_matrix(self.sparse, self.wide.words), fp, self.wide, 'auto')
+
+        fp.seek(0)
+        self.assertEqual(self.sparse, load(fp, self.wide))
+
+        fp = io.BytesIO()
+        dump(as_word_matrix(self.sparse, self.wide.words), fp, self.wide)
+
+        fp.seek(0)
+        matrix = Decoder(fp, self.wide).read_array(1000)
+        self.assertTrue((as_word_matrix(self.sparse, self.wide.words) == matrix).all())
@@ -0,0 +1,61 @@
+import threading
+import unittest
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagSchema
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestConcurrentBitnFly(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.shared = ConcurrentBitnFly(self.schema, mask=0x11)
+
+    def test_same_as_bitnfly(self):
+
+        single = BitnFly(self.schema, mask=0x11)
+
+        for target in (self.shared, single):
+            target.flip(['admin', 'staff'])
+            target |= 'can_read'
+            target ^= 2
+            target.off()
+            target.on()
+
+        self.assertEqual(single.get(), self.shared.get())
+        self.assertEqual(single.mask(), self.shared.mask())
+        self.assertEqual(single.get('staff'), self.shared.get('staff'))
+        self.assertEqual(single.STAFF, self.shared.STAFF)
+
+        self.shared.reset()
+        self.assertEqual(0x11, self.shared.get())
+
+    def test_threads(self):
+
+        # every writer flips two flags together, readers must never see only one of them
+        self.shared = ConcurrentBitnFly(self.schema, mask=0x10)
+        torn = []
+
+        def write():
+            for _ in range(2000):
+                self.shared.flip(['admin', 'moderator'])
+                self.shared |= 'staff'
+
+        def read():
+            for _ in range(2000):
+                flags = self.shared.get()
+                if bool(flags & 1) != bool(flags & 2):
+                    torn.append(flags)
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], torn)
+        self.assertEqual(0x10 | 4, self.shared.get())
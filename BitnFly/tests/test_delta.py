@@ -0,0 +1,253 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from BitnFly.api import (
+    BitnFly, BitnFlyArray, ConcurrentBitnFly, DeltaLog, FlagDelta, FlagIndex, FlagSchema, FlagStore, SparseBitnFly,
+)
+from BitnFly.api.array import as_word_matrix, numpy
+from BitnFly.api.delta import ADDED, REMOVED, diff, dumps, loads
+from BitnFly.api.shared import SharedFlagTable, shared_memory
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+def _state(obj):
+    return obj.get(), obj.mask()
+
+
+class TestFlagDelta(unittest.TestCase):
+
+    def test_bytes(self):
+
+        for delta in (FlagDelta(), FlagDelta(0b101, 0b1, False), FlagDelta(1 << 70, 0x0, True)):
+            self.assertEqual(delta, FlagDelta.from_bytes(delta.to_bytes()))
+
+        self.assertEqual(3, len(FlagDelta().to_bytes()))
+        self.assertRaises(ValueError, FlagDelta.from_bytes, b'\x07')
+
+    def test_merge(self):
+
+        first, second = FlagDelta(0b11, 0b11, False), FlagDelta(0b01, 0b01, True)
+
+        self.assertEqual(FlagDelta(0b10, 0b10, True), first.merge(second))
+        self.assertEqual((0b01, 0b01, True), first.merge(second).apply(0b11, 0b11, True))
+
+    def test_diff(self):
+
+        self.assertFalse(diff((0b1, 0b1, True), (0b1, 0b1, True)))
+        self.assertEqual(FlagDelta(0b1, 0x0, False), diff((0b1, 0b1, True), (0x0, 0b1, False)))
+
+    def test_feed(self):
+
+        deltas = {3: FlagDelta(0b1, 0b1), 300: FlagDelta(0x0, 0x0, False)}
+        self.assertEqual(deltas, loads(dumps(deltas)))
+
+
+class TestBitnFlyDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+
+    def test_compacted(self):
+
+        b = BitnFly(self.schema).checkpoint()
+        b.flip('admin').flip('admin')
+
+        self.assertFalse(b.drain())
+
+        b.flip(['admin', 'staff']).flip('staff')
+        self.assertEqual(FlagDelta(b.ADMIN, b.ADMIN), b.drain())
+
+    def test_drain_checkpoints(self):
+
+        b = BitnFly(self.schema).checkpoint()
+        b.off()
+
+        self.assertEqual(FlagDelta(self.schema.full_mask, 0x0, False), b.drain())
+        self.assertFalse(b.drain())
+
+    def test_not_tracked(self):
+        self.assertRaises(AssertionError, BitnFly(self.schema).drain)
+
+    def test_replicate(self):
+
+        for cls in (BitnFly, ConcurrentBitnFly, SparseBitnFly):
+
+            source, replica = cls(self.schema).checkpoint(), cls(self.schema)
+
+            source.flip(['admin', 'can_read']).off()
+            source |= 'can_edit'
+            replica.apply_delta(FlagDelta.from_bytes(source.drain().to_bytes()))
+
+            source.on().reset().flip('staff')
+            replica.apply_delta(source.drain())
+
+            self.assertEqual(_state(source), _state(replica))
+
+            source.off()
+            replica.apply_delta(source.drain()).on()
+            source.on()
+
+            self.assertEqual(_state(source), _state(replica))
+
+    def test_sparse_wide(self):
+
+        schema = FlagSchema(['flag_{}'.format(x) for x in range(10000)])
+
+        source, replica = SparseBitnFly(schema).checkpoint(), SparseBitnFly(schema)
+        source.flip(['flag_5', 'flag_9000']).flip('flag_5')
+
+        delta = source.drain()
+
+        self.assertEqual(FlagDelta(1 << 9000, 1 << 9000), delta)
+        self.assertTrue(replica.apply_delta(delta).is_sparse())
+        self.assertEqual(source.positions(), replica.positions())
+
+
+class TestDeltaLog(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_log(self):
+
+        log = DeltaLog()
+
+        log.record(1, (0b1, 0b1, True), (0x0, 0x0, False))
+        log.record(1, (0x0, 0x0, False), (0b1, 0b1, True))
+        log.record(2, (0b1, 0b1, True), (0b11, 0b11, True))
+
+        self.assertEqual(2, len(log))
+        self.assertEqual({2: FlagDelta(0b10, 0b10)}, log.drain())
+        self.assertEqual(0, len(log))
+
+    def test_store(self):
+
+        paths = [os.path.join(self.tmp, name) for name in ('source.store', 'replica.store')]
+
+        with FlagStore.create(paths[0], self.schema, 1000) as source, \
+                FlagStore.create(paths[1], self.schema, 1000) as replica:
+
+            source.track()
+
+            source[7].flip('admin').off()
+            source[9].flip('staff').flip('staff')
+            source[999].flip(['can_edit', 'can_read'])
+            source[999] |= 'can_edit'
+
+            deltas = source.drain()
+
+            self.assertEqual([7, 999], sorted(deltas))
+
+            replica.apply_deltas(loads(dumps(deltas)))
+
+            for slot in (7, 9, 999):
+                self.assertEqual(source.state(slot), replica.state(slot))
+
+            source.untrack()
+            self.assertRaises(AssertionError, source.drain)
+
+    def test_index(self):
+
+        source, replica = FlagIndex(self.schema), FlagIndex(self.schema)
+
+        for index in (source, replica):
+            index.add(1)
+            index.add(2, mask=0x0)
+
+        source.track()
+        source[1].flip('admin')
+        source[2] |= 'staff'
+
+        replica.apply_deltas(source.drain())
+
+        self.assertEqual(list(source.query('staff & ~admin')), list(replica.query('staff & ~admin')))
+        self.assertEqual(source.state(1), replica.state(1))
+
+        # added and removed entities reach a replica, an entity added and removed again does not
+        source[2].flip('staff')
+        source.remove(2)
+        source.add(3, mask=0x0).flip('admin').off()
+        source.add(4)
+        source.remove(4)
+
+        deltas = loads(dumps(source.drain()))
+
+        self.assertEqual({2: False, 3: True}, dict((key, delta.presence) for key, delta in deltas.items()))
+
+        replica.apply_deltas(deltas)
+
+        self.assertEqual([1, 3], sorted(replica.query('admin | ~admin')))
+        self.assertEqual(source.state(3), replica.state(3))
+        self.assertEqual(list(source.query('admin')), list(replica.query('admin')))
+
+        # an entity removed and added again is a plain change
+        source.remove(3)
+        source.add(3).flip('staff')
+        source.remove(1)
+
+        replica.apply_deltas(loads(dumps(source.drain())))
+
+        self.assertEqual([3], sorted(replica.query('admin | ~admin')))
+        self.assertEqual(source.state(3), replica.state(3))
+
+    def test_presence(self):
+
+        added, removed = FlagDelta(0x5, 0xff, presence=True), FlagDelta(0x5, 0xff, presence=False)
+
+        self.assertEqual(added, FlagDelta.from_bytes(added.to_bytes()))
+        self.assertEqual(removed, FlagDelta.from_bytes(removed.to_bytes()))
+        self.assertEqual(FlagDelta(), added.merge(removed))
+        self.assertIsNone(removed.merge(FlagDelta(0x4, 0xff, presence=True)).presence)
+
+        with self.assertRaises(ValueError):
+            FlagDelta.from_bytes(bytes((ADDED | REMOVED, 0, 0)))
+
+    @unittest.skipIf(shared_memory is None, 'multiprocessing.shared_memory is not available')
+    def test_shared(self):
+
+        source = SharedFlagTable.create(self.schema, 4, stripes=2)
+        replica = SharedFlagTable.create(self.schema, 4, stripes=2)
+
+        try:
+            source.track()
+            source[2].flip('admin').off()
+
+            replica.apply_deltas(source.drain())
+
+            self.assertEqual(source.state(2), replica.state(2))
+
+        finally:
+            for table in (source, replica):
+                table.close()
+                table.unlink()
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestBitnFlyArrayDelta(unittest.TestCase):
+
+    def test_replicate(self):
+
+        schema = FlagSchema(['flag_{}'.format(x) for x in range(100)])
+        masks = [0x0] * 50
+
+        masks[3], masks[8] = 1 << 70, 0b1
+
+        source, replica = BitnFlyArray(schema, 50).checkpoint(), BitnFlyArray(schema, 50)
+        source.flip(as_word_matrix(masks, schema.words))
+
+        deltas = source.drain()
+
+        self.assertEqual([3, 8], sorted(deltas))
+        self.assertEqual(FlagDelta(1 << 70, 1 << 70), deltas[3])
+
+        replica.apply_deltas(deltas)
+
+        self.assertEqual(source.to_ints(), replica.to_ints())
+        self.assertEqual({}, source.drain())
@@ -0,0 +1,80 @@
+import unittest
+
+from BitnFly.api import BitnFly, BitnFlyArray, FlagSchema
+from BitnFly.api.cache import LRUCache
+from BitnFly.api.expr import numpy
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestFlagPredicate(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options, cache_size=2)
+        self.expression = 'can_read & can_edit & ~anonymous | admin'
+
+    def test_terms(self):
+
+        predicate = self.schema.compile(self.expression)
+        self.assertEqual(((1, 1), (8 | 16 | 64, 16 | 64)), predicate.terms)
+
+        self.assertEqual(((0, 0),), self.schema.compile('admin | ~admin').terms)
+        self.assertEqual((), self.schema.compile('admin & ~admin').terms)
+        self.assertEqual(((1, 1),), self.schema.compile('admin & staff | (admin & ~staff)').terms)
+        self.assertEqual(((1, 0), (2, 0)), self.schema.compile('~(ADMIN & moderator)').terms)
+
+    def test_same_as_and(self):
+
+        predicate = self.schema.compile(self.expression)
+
+        for mask in range(256):
+
+            b = BitnFly(self.schema, mask=mask)
+            expected = bool(b & 'can_read' and b & 'can_edit' and not b & 'anonymous' or b & 'admin')
+
+            self.assertEqual(expected, predicate(b))
+            self.assertEqual(expected, predicate(mask))
+
+    def test_cache(self):
+
+        predicate = self.schema.compile(self.expression)
+        self.assertIs(predicate, self.schema.compile(self.expression))
+
+        self.schema.compile('admin')
+        self.schema.compile('staff')
+        self.assertIsNot(predicate, self.schema.compile(self.expression))
+
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(2, len(cache))
+
+    def test_errors(self):
+
+        for expression in ['admin &', '(admin', 'admin)', 'admin & | staff', 'admin + staff', '']:
+            with self.assertRaises(ValueError):
+                self.schema.compile(expression)
+
+        with self.assertRaises(ValueError):
+            self.schema.compile('nothere')
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array(self):
+
+        predicate = self.schema.compile(self.expression)
+
+        masks = list(range(256))
+        expected = [predicate(mask) for mask in masks]
+
+        self.assertEqual(expected, predicate(BitnFlyArray(self.schema, masks=masks)).tolist())
+        self.assertEqual(expected, predicate(numpy.array(masks, dtype=numpy.uint64)).tolist())
+
+        wide = FlagSchema(['flag_{}'.format(x) for x in range(100)])
+        users = BitnFlyArray(wide, masks=[1 << 99, 1 << 99 | 1, 0])
+
+        self.assertEqual([True, False, False], wide.compile('flag_99 & ~flag_0')(users).tolist())
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagSchema, FlagStore, History, SparseBitnFly
+from BitnFly.api.store import CHUNK_SLOTS
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+
+    def test_undo_redo(self):
+
+        for cls in (BitnFly, ConcurrentBitnFly, SparseBitnFly):
+
+            b = cls(self.schema)
+            history = History(b)
+            states = [b.state()]
+
+            b.flip('admin')
+            history.commit()
+            states.append(b.state())
+
+            b.off()
+            b |= 'can_read'
+            states.append(b.state())
+
+            self.assertTrue(history.undo())
+            self.assertEqual(states[1], b.state())
+
+            self.assertTrue(history.undo())
+            self.assertEqual(states[0], b.state())
+            self.assertFalse(history.undo())
+
+            self.assertTrue(history.redo())
+            self.assertTrue(history.redo())
+            self.assertEqual(states[2], b.state())
+            self.assertFalse(history.redo())
+
+    def test_commit_drops_redo(self):
+
+        b = BitnFly(self.schema)
+        history = History(b)
+
+        b.flip('admin')
+        history.undo()
+        b.flip('staff')
+
+        self.assertFalse(history.redo())
+        self.assertFalse(history.can_redo())
+        self.assertTrue(history.can_undo())
+
+    def test_limit(self):
+
+        b = BitnFly(self.schema)
+        history = History(b, limit=2)
+
+        for bit in ('admin', 'staff', 'can_read'):
+            b.flip(bit)
+            history.commit()
+
+        while history.undo():
+            pass
+
+        self.assertEqual(self.schema.full_mask ^ b.ADMIN, b.get())
+
+    def test_snapshots(self):
+
+        b = BitnFly(self.schema)
+        history = History(b)
+
+        b.flip(['admin', 'staff']).off()
+        history.snapshot('before')
+
+        b.on().reset()
+        history.restore('before')
+
+        self.assertEqual(b.state(), (0x0, self.schema.full_mask ^ (b.ADMIN | b.STAFF), False))
+
+        history.undo()
+        self.assertEqual(self.schema.full_mask, b.get())
+
+        self.assertEqual(['before'], history.snapshots())
+        history.drop('before')
+        self.assertRaises(KeyError, history.restore, 'before')
+
+    def test_transaction(self):
+
+        b = BitnFly(self.schema)
+        history = History(b)
+
+        with history.transaction() as user:
+            user.flip('admin')
+
+        try:
+            with history.transaction() as user:
+                user.flip('staff').off()
+                raise RuntimeError
+
+        except RuntimeError:
+            pass
+
+        self.assertEqual(self.schema.full_mask ^ b.ADMIN, b.get())
+        self.assertTrue(history.undo())
+        self.assertFalse(history.undo())
+
+
+class TestStoreSnapshot(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp = tempfile.mkdtemp()
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.store = FlagStore.create(os.path.join(self.tmp, 'flags.store'), self.schema, 3 * CHUNK_SLOTS + 5)
+
+    def tearDown(self):
+
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def test_copy_on_write(self):
+
+        snapshot = self.store.snapshot()
+        self.assertEqual([], snapshot.chunks())
+
+        self.store[1].flip('admin')
+        self.store[2].off()
+        self.store[3 * CHUNK_SLOTS + 4].flip('staff')
+
+        self.assertEqual([0, 3], [chunk for chunk, _ in snapshot.chunks()])
+        self.assertEqual((255, 255, True), snapshot.state(1))
+        self.assertEqual((255, 255, True), snapshot.state(3 * CHUNK_SLOTS + 4))
+        self.assertNotEqual(snapshot.state(2), self.store.state(2))
+        self.assertRaises(IndexError, snapshot.state, len(self.store))
+
+    def test_restore(self):
+
+        self.store[7].flip('admin')
+
+        first = self.store.snapshot()
+        self.store[7].flip('staff')
+
+        second = self.store.snapshot()
+        self.store[CHUNK_SLOTS].off()
+
+        self.store.restore(first)
+
+        self.assertEqual(first.state(7), self.store.state(7))
+        self.assertEqual((255, 255, True), self.store.state(CHUNK_SLOTS))
+
+        mask = 255 ^ self.schema.mask_of(['admin', 'staff'])
+        self.assertEqual((mask, mask, True), second.state(7))
+
+        self.store.release(first)
+        self.assertRaises(AssertionError, self.store.restore, first)
+
+    def test_restore_tracked(self):
+
+        snapshot = self.store.snapshot()
+        self.store[5].flip('admin')
+
+        log = self.store.track()
+        self.store.restore(snapshot)
+
+        self.assertEqual([5], list(log.drain()))
+        self.assertEqual((255, 255, True), self.store.state(5))
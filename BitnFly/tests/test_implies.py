@@ -0,0 +1,142 @@
+import sqlite3
+import unittest
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagIndex, FlagSchema, SparseBitnFly
+from BitnFly.api.array import numpy, BitnFlyArray
+from BitnFly.api.sql import SQLiteFlagTable
+from BitnFly.tests.test_bits_fly import UserSettings
+
+RULES = {
+    'admin': ['moderator', 'can_delete', 'can_publish'],
+    'moderator': ['staff', 'can_edit'],
+    'staff': 'can_read',
+}
+
+
+class TestImplies(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options, implies=RULES)
+
+    def test_closures(self):
+
+        self.assertEqual(0b11110111, self.schema.implied[0])
+        self.assertEqual(0b01010110, self.schema.implied[1])
+        self.assertEqual(0b00010100, self.schema.implied[2])
+        self.assertNotIn(3, self.schema.implied)
+
+        self.assertEqual(0b10111, self.schema.implied_by[4])
+        self.assertNotIn(0, self.schema.implied_by)
+
+        self.assertEqual(0b10100, self.schema.expand(0b100))
+        self.assertEqual(0b1000, self.schema.expand(0b1000))
+
+    def test_or(self):
+
+        for cls in (BitnFly, ConcurrentBitnFly, SparseBitnFly):
+
+            b = cls(self.schema, mask=0x0)
+            b |= 'moderator'
+
+            self.assertEqual(0b01010110, b.get())
+            self.assertEqual(self.schema.full_mask, b.mask())
+
+            b = cls(self.schema, mask=0x0)
+            b |= [1]
+
+            self.assertEqual(0b11110111, b.get())
+
+    def test_and(self):
+
+        for cls in (BitnFly, ConcurrentBitnFly, SparseBitnFly):
+
+            b = cls(self.schema, mask=0x0).flip('admin')
+
+            self.assertTrue(b & 'can_edit')
+            self.assertTrue(b & 'staff')
+            self.assertTrue(b & 64)
+            self.assertFalse(b & 'anonymous')
+            self.assertTrue(b & -1)
+            self.assertEqual(-1, self.schema.implied_by_mask(-1))
+
+            b.flip('admin').flip('staff')
+
+            self.assertTrue(b & 'can_read')
+            self.assertFalse(b & 'can_edit')
+
+    def test_predicates(self):
+
+        masks = [0x0, self.schema.mask_of('admin'), self.schema.mask_of('staff'), self.schema.mask_of('can_read')]
+        objects = [BitnFly(self.schema, mask=mask) for mask in masks]
+
+        index = FlagIndex(self.schema)
+        table = SQLiteFlagTable(sqlite3.connect(':memory:'), 'users', self.schema)
+        table.create_table()
+
+        for entity, b in enumerate(objects):
+            index.add(entity, b.get())
+
+        table.insert(enumerate(objects))
+
+        for expression in ('can_read', 'can_edit & ~admin', '~staff', 'moderator | can_read & ~can_delete'):
+
+            predicate = self.schema.compile(expression)
+            expected = [entity for entity, b in enumerate(objects) if predicate(b)]
+
+            self.assertEqual(expected, list(index.query(expression)))
+            self.assertEqual(expected, sorted(table.keys(expression)))
+
+        self.assertEqual([False, True, True, True], [self.schema.compile('can_read')(b) for b in objects])
+        self.assertEqual([b & 'can_read' for b in objects], [self.schema.compile('can_read')(b) for b in objects])
+
+        # get and names read the stored flags only
+        self.assertEqual(0, objects[1].get('can_read'))
+        self.assertEqual(['admin'], objects[1].names())
+
+    def test_flip_not_expanded(self):
+
+        b = BitnFly(self.schema, mask=0x0).flip('admin')
+        self.assertEqual(1, b.get())
+
+    def test_plan(self):
+
+        ops = ['off', ('or', 'staff')]
+
+        b = BitnFly(self.schema).apply(ops)
+        c = BitnFly(self.schema).off()
+        c |= 'staff'
+
+        self.assertEqual(c.get(), b.get())
+        self.assertEqual(0b10100, b.get())
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array(self):
+
+        array = BitnFlyArray(self.schema, size=2, mask=0x0)
+        array |= numpy.array([0b100, 0b1000], dtype=numpy.uint64)
+
+        self.assertEqual([0b10100, 0b1000], array.to_ints())
+        self.assertEqual([True, False], (array & 'can_read').tolist())
+
+    def test_cycles(self):
+
+        with self.assertRaises(ValueError) as context:
+            FlagSchema(['a', 'b', 'c', 'd'], implies={'a': 'b', 'b': ['c', 'd'], 'd': 'a'})
+
+        self.assertIn('A -> B -> D -> A', str(context.exception))
+
+        with self.assertRaises(ValueError):
+            FlagSchema(['a'], implies={'a': 'a'})
+
+        with self.assertRaises(ValueError):
+            FlagSchema(['a'], implies={'a': 'nothere'})
+
+    def test_many_rules(self):
+
+        names = ['flag_{}'.format(x) for x in range(5000)]
+        rules = dict((names[x], [names[x + 1], names[max(x + 1, (x * 7 + 3) % 5000)]]) for x in range(4999))
+
+        schema = FlagSchema(names, implies=rules)
+
+        self.assertEqual(schema.full_mask ^ 0b111, schema.implied[3])
+        self.assertEqual(0b1111, schema.implied_by[3])
@@ -0,0 +1,74 @@
+import unittest
+
+from BitnFly.api import BitnFly, FlagIndex, FlagSchema
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestFlagIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.index = FlagIndex(self.schema)
+
+        for entity in range(256):
+            self.index.add(entity, mask=entity)
+
+    def test_query(self):
+
+        expected = [mask for mask in range(256) if mask & 128 and not mask & 4]
+        self.assertEqual(expected, list(self.index.query('can_publish & ~staff')))
+
+        expected = [mask for mask in range(256) if not mask & 1 or mask & 2]
+        self.assertEqual(expected, list(self.index.query('~admin | moderator')))
+
+        self.assertEqual(list(range(1, 256, 2)), list(self.index.having('admin')))
+
+    def test_handles(self):
+
+        handle = self.index[0]
+        single = BitnFly(self.schema, mask=0)
+
+        for target in (handle, single):
+            target.flip(['admin', 'staff'])
+            target |= 'can_read'
+            target ^= 1
+            target.off()
+            target.on()
+
+        self.assertEqual(single.get(), handle.get())
+        self.assertEqual(single.mask(), handle.mask())
+        self.assertEqual(handle.CAN_READ, single.CAN_READ)
+
+        self.assertTrue(0 in self.index.query('staff & can_read & admin'))
+
+        handle.off()
+        self.assertEqual(4, handle.get())
+        self.assertTrue(0 in self.index.query('staff & ~admin & ~can_read'))
+
+        handle.reset()
+        self.assertEqual(0, handle.get())
+
+    def test_add_remove(self):
+
+        self.assertEqual(256, len(self.index))
+
+        with self.assertRaises(KeyError):
+            self.index.add(1)
+
+        self.index.remove(255)
+        self.assertFalse(255 in self.index)
+        self.assertFalse(255 in self.index.query('admin & can_publish'))
+
+        with self.assertRaises(KeyError):
+            self.index[255]
+
+        self.index[254] |= 'admin'
+        self.assertTrue(254 in self.index.having('admin'))
+
+        self.index[254] = 0
+        self.assertFalse(254 in self.index.query('admin | staff'))
+
+        self.index.add(1000)
+        self.assertEqual(255, self.index[1000].get())
+        self.assertTrue(1000 in self.index.query('admin & can_publish'))
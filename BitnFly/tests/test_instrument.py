@@ -0,0 +1,109 @@
+import pickle
+import unittest
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagSchema
+from BitnFly.api.array import numpy, BitnFlyArray
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = FlagSchema(['read', 'write', 'delete', 'execute'])
+
+    def test_disabled(self):
+
+        b = BitnFly(self.schema)
+
+        self.assertIs(type(b), BitnFly)
+        self.assertIsNone(self.schema.recorder)
+
+    def test_counters(self):
+
+        recorder = self.schema.instrument()
+        b = BitnFly(self.schema)
+
+        b.flip('read').flip(2).flip(['write', 'delete'])
+        b ^= 'read'
+        b |= [1, 2]
+
+        self.assertTrue(b & 'read')
+        self.assertEqual(b.get('read'), 1)
+
+        snapshot = recorder.snapshot()
+
+        self.assertEqual(snapshot['flip']['calls'], 3)
+        self.assertEqual(snapshot['flip']['kinds'], {'str': 1, 'int': 1, 'list': 1})
+
+        # flip called by __xor__ and get called by __and__ are not counted again
+        self.assertEqual(snapshot['__xor__']['calls'], 1)
+        self.assertEqual(snapshot['__or__']['kinds'], {'list': 1})
+        self.assertEqual(snapshot['__and__']['calls'], 1)
+        self.assertEqual(snapshot['get']['calls'], 1)
+
+        histogram = snapshot['flip']['histogram']
+
+        self.assertEqual(sum(histogram.values()), 3)
+        self.assertTrue(all(bucket & (bucket - 1) == 0 for bucket in histogram))
+
+    def test_same_behaviour(self):
+
+        plain = BitnFly(self.schema)
+
+        self.schema.instrument()
+        instrumented = BitnFly(self.schema)
+
+        for b in (plain, instrumented):
+            b.flip('read').off().on()
+            b |= 'write'
+
+        self.assertEqual(plain.get(), instrumented.get())
+        self.assertEqual(repr(plain), repr(instrumented))
+        self.assertIsInstance(instrumented, BitnFly)
+
+    def test_uninstrument(self):
+
+        recorder = self.schema.instrument()
+        b = BitnFly(self.schema)
+
+        self.assertIs(self.schema.uninstrument(), recorder)
+
+        b.flip('read')
+        self.assertEqual(recorder.snapshot(), {})
+
+        # the first call after uninstrument goes back to the plain class
+        self.assertIs(type(b), BitnFly)
+        self.assertFalse(b & 'read')
+
+    def test_pickle(self):
+
+        recorder = self.schema.instrument()
+        b = BitnFly(self.schema).flip('read')
+
+        copy = pickle.loads(pickle.dumps(b))
+
+        self.assertIs(type(copy), BitnFly)
+        self.assertEqual(b.get(), copy.get())
+        self.assertIsNone(copy.schema().recorder)
+        self.assertIs(self.schema.recorder, recorder)
+
+    def test_handle(self):
+
+        recorder = self.schema.instrument()
+        b = ConcurrentBitnFly(self.schema)
+
+        b.flip('read').reset()
+
+        self.assertEqual(recorder.snapshot()['reset']['calls'], 1)
+
+        recorder.clear()
+        self.assertEqual(recorder.snapshot(), {})
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array(self):
+
+        recorder = self.schema.instrument()
+        array = BitnFlyArray(self.schema, size=4)
+
+        array.flip(numpy.arange(4, dtype=numpy.uint64))
+
+        self.assertEqual(recorder.snapshot()['flip']['kinds'], {'ndarray': 1})
@@ -0,0 +1,185 @@
+import io
+import random
+import unittest
+
+from functools import partial
+
+from BitnFly.api import BitnFly, BitnFlyArray, ConcurrentBitnFly, FlagSchema, FlagValue, SparseBitnFly
+from BitnFly.api import migrate
+from BitnFly.api.codec import dump, load
+from BitnFly.api.migrate import SchemaMigration, numpy
+
+
+def _by_names(mask, old, new, renames, defaults=0):
+
+    result = defaults
+
+    for position, name in enumerate(old.names):
+
+        target = renames.get(name, name)
+
+        if mask >> position & 1 and target in new.positions:
+            result |= 1 << new.positions[target]
+
+    return result
+
+
+class TestSchemaMigration(unittest.TestCase):
+
+    def setUp(self):
+
+        self.rnd = random.Random(3)
+
+        self.old = FlagSchema(['read', 'write', 'delete', 'admin'])
+        self.new = FlagSchema(['read', 'comment', 'write', 'superuser', 'owner'])
+
+        self.migration = self.old.migration(self.new, renames={'admin': 'superuser'}, defaults=['comment'])
+
+    def _random(self, width):
+
+        names = ['flag_{}'.format(x) for x in range(width)]
+        new = [name for name in names if self.rnd.random() < 0.9]
+
+        for _ in range(width // 10):
+            new.insert(self.rnd.randint(0, len(new)), 'new_{}'.format(len(new)))
+
+        if self.rnd.random() < 0.5:
+            self.rnd.shuffle(new)
+
+        renames = dict((name, name + '_renamed') for name in self.rnd.sample(new, 3) if name.startswith('flag'))
+        new = [renames.get(name, name) for name in new]
+
+        old, new = FlagSchema(names), FlagSchema(new)
+        renames = dict((name.upper(), target.upper()) for name, target in renames.items())
+
+        return old, new, renames
+
+    def test_diff(self):
+
+        migration = self.migration
+
+        self.assertEqual({'ADMIN': 'SUPERUSER'}, migration.renamed)
+        self.assertEqual(('DELETE',), migration.dropped)
+        self.assertEqual(('COMMENT', 'OWNER'), migration.inserted)
+        self.assertEqual(('WRITE',), migration.moved)
+        self.assertEqual((0, None, 1, 3, None), migration.sources)
+
+        self.assertEqual([
+            ('rename', 'ADMIN', 'SUPERUSER'),
+            ('drop', 'DELETE', 2),
+            ('insert', 'COMMENT', 1),
+            ('insert', 'OWNER', 4),
+            ('move', 'WRITE', 1, 2),
+        ], migration.changes())
+
+        self.assertFalse(migration.is_identity())
+        self.assertTrue(SchemaMigration(['a', 'b'], ['a', 'b', 'c']).is_identity())
+
+    def test_invalid(self):
+
+        self.assertRaises(AssertionError, SchemaMigration, self.old, self.new, renames={'nope': 'read'})
+        self.assertRaises(AssertionError, SchemaMigration, self.old, self.new, renames={'admin': 'nope'})
+        self.assertRaises(AssertionError, SchemaMigration, self.old, self.new, renames={'admin': 'read'})
+        self.assertRaises(AssertionError, SchemaMigration, self.old, self.new, defaults=['read'])
+
+    def test_remap(self):
+
+        for width in (8, 30, 150):
+
+            old, new, renames = self._random(width)
+            migration = SchemaMigration(old, new, renames)
+
+            masks = [self.rnd.getrandbits(width + 5) for _ in range(200)]
+            expected = [_by_names(mask, old, new, renames) for mask in masks]
+
+            self.assertEqual(expected, [migration.remap(mask) for mask in masks])
+            self.assertEqual(expected, migration.remap_many(masks))
+            self.assertEqual(expected, [mask for chunk in migration.iter_remap(masks, 64) for mask in chunk])
+
+    def test_runs(self):
+
+        old = FlagSchema(['flag_{}'.format(x) for x in range(200)])
+        migration = old.migration(old.names[:50] + ('inserted',) + old.names[50:])
+
+        self.assertEqual(2, len(migration.runs))
+        self.assertEqual(((1 << 50) - 1) | ((1 << 150) - 1) << 51, migration.remap(old.full_mask))
+
+    def test_objects(self):
+
+        b = BitnFly(self.old, mask=0b1001).flip('write').off()
+
+        for factory in (None, partial(SparseBitnFly, self.new), partial(ConcurrentBitnFly, self.new)):
+
+            result = self.migration.migrate(b, factory=factory)
+
+            self.assertEqual((0b00100, 0b11011, False), result.state())
+            self.assertEqual(0b11111, result.on().get())
+
+        self.assertEqual(0b1111, self.migration.migrate(0b1011))
+        self.assertEqual((0b00111, 0b11111, True), self.migration.migrate(BitnFly(self.old, mask=0b11)).state())
+
+        value = self.migration.migrate(self.old.value(0b1001))
+
+        self.assertIsInstance(value, FlagValue)
+        self.assertIs(self.new.value(0b01011), value)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_arrays(self):
+
+        saved = migrate.TABLE_LIMIT
+
+        try:
+            for limit in (saved, 0):
+
+                migrate.TABLE_LIMIT = limit
+
+                for width in (8, 60, 150):
+
+                    old, new, renames = self._random(width)
+                    migration = SchemaMigration(old, new, renames)
+
+                    masks = [self.rnd.getrandbits(width) for _ in range(300)]
+                    expected = [_by_names(mask, old, new, renames) for mask in masks]
+
+                    result = BitnFlyArray(new, masks=migration.remap_array(masks, chunk_size=100)).to_ints()
+                    self.assertEqual(expected, result)
+
+        finally:
+            migrate.TABLE_LIMIT = saved
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_bitnfly_array(self):
+
+        rows = BitnFlyArray(self.old, masks=[0b1001, 0b0110, 0b1111])
+        rows.flip('write').off()
+
+        result = self.migration.migrate(rows)
+
+        for row, mask in enumerate([0b1001, 0b0110, 0b1111]):
+
+            b = BitnFly(self.old, mask=mask).flip('write').off()
+            b = self.migration.migrate(b)
+
+            self.assertEqual(b.get(), int(result.get()[row]))
+            self.assertEqual(b.mask(), int(result.mask()[row]))
+
+        self.assertEqual([0b01011, 0b00110, 0b01111], result.reset().to_ints())
+
+    def test_file(self):
+
+        old, new, renames = self._random(70)
+        migration = SchemaMigration(old, new, renames)
+
+        masks = [self.rnd.getrandbits(70) for _ in range(500)]
+
+        for encoding in ('dense', 'sparse'):
+
+            src, dst = io.BytesIO(), io.BytesIO()
+
+            dump(masks, src, old, encoding=encoding)
+            src.seek(0)
+
+            self.assertEqual(len(masks), migration.migrate_file(src, dst, chunk_size=64))
+            dst.seek(0)
+
+            self.assertEqual([_by_names(mask, old, new, renames) for mask in masks], load(dst, new))
@@ -0,0 +1,94 @@
+import io
+import json
+import random
+import unittest
+
+from BitnFly.api import BitnFly, BitnFlyArray, ConcurrentBitnFly, FlagSchema, SparseBitnFly
+from BitnFly.api.names import NameDecoder, numpy
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+def _expected(mask, schema):
+    return [name.lower() for x, name in enumerate(schema.names) if mask >> x & 1]
+
+
+class TestNames(unittest.TestCase):
+
+    def setUp(self):
+
+        rnd = random.Random(5)
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.wide = FlagSchema(['flag_{}'.format(x) for x in range(150)])
+        self.masks = [rnd.getrandbits(150) & rnd.getrandbits(150) for _ in range(300)] + [0, self.wide.full_mask]
+
+    def test_names(self):
+
+        for cls in (BitnFly, ConcurrentBitnFly, SparseBitnFly):
+
+            b = cls(self.schema, mask=0b1010)
+
+            self.assertEqual(_expected(0b1010, self.schema), b.names())
+            self.assertEqual(b.names(), list(b.iter_set()))
+
+        self.assertEqual([], SparseBitnFly(self.wide, mask=0).names())
+        self.assertEqual(_expected(0b101, self.schema), self.schema.value(0b101).names())
+
+    def test_sparse(self):
+
+        b = SparseBitnFly(self.wide, mask=1 << 3 | 1 << 140)
+        self.assertEqual(['flag_3', 'flag_140'], b.names())
+
+        b.flip(['flag_3', 'flag_7'])
+        self.assertEqual(['flag_7', 'flag_140'], list(b.iter_set()))
+
+    def test_schema(self):
+
+        for mask in self.masks:
+            self.assertEqual(_expected(mask, self.wide), self.wide.names_of(mask | 1 << 200))
+
+    def test_decoder(self):
+
+        decoder = NameDecoder(self.wide, separator=', ')
+        expected = [_expected(mask, self.wide) for mask in self.masks]
+
+        self.assertEqual(expected, list(decoder.iter_names(self.masks, chunk_size=64)))
+        self.assertEqual([', '.join(names) for names in expected], list(decoder.iter_text(self.masks)))
+        self.assertEqual([json.dumps(names) for names in expected], list(decoder.iter_json(self.masks)))
+
+        self.assertEqual('flag_0, flag_2', decoder.text(BitnFly(self.wide, mask=0b101)))
+        self.assertEqual('', decoder.text(0))
+        self.assertEqual(['flag_1'], decoder.names(0b10))
+
+    def test_write(self):
+
+        decoder = NameDecoder(self.schema)
+        objects = [BitnFly(self.schema, mask=mask & self.schema.full_mask) for mask in self.masks]
+
+        fp = io.StringIO()
+        self.assertEqual(len(objects), decoder.write(objects, fp, chunk_size=100))
+        lines = fp.getvalue().splitlines()
+        self.assertEqual([b.names() for b in objects], [line.split('; ') if line else [] for line in lines])
+
+        fp = io.StringIO()
+        decoder.write(objects, fp, format='json')
+        self.assertEqual([b.names() for b in objects], [json.loads(line) for line in fp.getvalue().splitlines()])
+
+        self.assertRaises(AssertionError, decoder.write, objects, fp, format='csv')
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_arrays(self):
+
+        decoder = NameDecoder(self.wide)
+        expected = [_expected(mask, self.wide) for mask in self.masks]
+
+        rows = BitnFlyArray(self.wide, masks=self.masks)
+        self.assertEqual(expected, list(decoder.iter_names(rows.get(), chunk_size=50)))
+
+        matrix = rows.get()
+        self.assertEqual(expected, list(decoder.iter_names([matrix[:100], matrix[100:]])))
+
+        narrow = numpy.array([mask & 0xff for mask in self.masks], dtype=numpy.uint64)
+        decoder = NameDecoder(self.schema)
+
+        self.assertEqual([_expected(int(mask), self.schema) for mask in narrow], list(decoder.iter_names(narrow)))
@@ -0,0 +1,105 @@
+import itertools
+import unittest
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagSchema, Plan
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestPlan(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+
+        self.steps = [
+            ('flip', ['admin', 'staff']),
+            ('or', [16, 32]),
+            ('xor', 'can_publish'),
+            'off',
+            'on',
+            'reset',
+        ]
+
+    def state(self, b):
+        return b.get(), b.mask(), b & 0xff
+
+    def replay(self, b, ops):
+
+        for op in ops:
+
+            name, args = (op, ()) if isinstance(op, str) else (op[0], op[1:])
+
+            if name == 'or':
+                b |= args[0]
+
+            elif name == 'xor':
+                b ^= args[0]
+
+            else:
+                getattr(b, name)(*args)
+
+        return b
+
+    def test_same_as_steps(self):
+
+        # every sequence of up to four steps, starting from states before and after off
+        for length in range(1, 5):
+            for ops in itertools.product(self.steps, repeat=length):
+                for start in ([], ['off'], [('flip', 'moderator'), 'off']):
+
+                    fused = self.replay(BitnFly(self.schema, mask=0x35), start).apply(list(ops))
+                    stepped = self.replay(self.replay(BitnFly(self.schema, mask=0x35), start), ops)
+
+                    self.assertEqual(
+                        (stepped.get(), stepped.mask()), (fused.get(), fused.mask()),
+                        '{} after {}'.format(ops, start)
+                    )
+
+                    self.assertEqual(
+                        stepped.on().get(), fused.on().get(), '{} after {} then on'.format(ops, start)
+                    )
+
+    def test_batch(self):
+
+        b = BitnFly(self.schema)
+
+        with b.batch() as ops:
+            ops.off()
+            ops |= ['admin', 'staff']
+            ops ^= 'admin'
+
+        self.assertEqual(4, b.get())
+
+        b.batch().flip('admin').commit()
+        self.assertEqual(5, b.get())
+
+        try:
+            with b.batch() as ops:
+                ops.off()
+                raise KeyError
+
+        except KeyError:
+            pass
+
+        self.assertEqual(5, b.get())
+
+        with self.assertRaises(AssertionError):
+            Plan(self.schema).commit()
+
+    def test_cache(self):
+
+        plan = self.schema.plan([('or', ['admin', 'staff']), 'off'])
+
+        self.assertIs(plan, self.schema.plan([('or', [1, 4]), 'off']))
+        self.assertIsNot(plan, self.schema.plan(['off']))
+
+        shared = ConcurrentBitnFly(self.schema, mask=0)
+        b = BitnFly(self.schema, mask=0)
+
+        for target in (shared, b):
+            target.apply(plan).apply([('flip', 'admin'), 'on'])
+
+        self.assertEqual((b.get(), b.mask()), (shared.get(), shared.mask()))
+
+        with self.assertRaises(AssertionError):
+            b.apply(FlagSchema(UserSettings.options).plan(['off']))
@@ -0,0 +1,232 @@
+import pickle
+import unittest
+
+from BitnFly.api import BitnFly, BitnFlyArray, ConcurrentBitnFly, FlagSchema, SparseBitnFly
+from BitnFly.api.array import numpy
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestFlagSchema(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(
+            UserSettings.roles + UserSettings.options
+        )
+
+    def test_tables(self):
+
+        self.assertEqual(8, len(self.schema))
+        self.assertEqual(1, self.schema.options['ADMIN'])
+        self.assertEqual(128, self.schema.options['CAN_PUBLISH'])
+        self.assertEqual('STAFF', self.schema.bits[4])
+        self.assertEqual(255, self.schema.full_mask)
+        self.assertTrue('can_read' in self.schema)
+        self.assertFalse('nothere' in self.schema)
+
+    def test_shared(self):
+
+        admin = BitnFly(self.schema)
+        mod = BitnFly(self.schema)
+
+        self.assertIs(self.schema, admin.schema())
+        self.assertIs(admin.flags(), mod.flags())
+
+        admin.flip('admin')
+        self.assertFalse(admin & 'admin')
+        self.assertTrue(mod & 'admin')
+
+    def test_same_as_list(self):
+
+        by_list = BitnFly(UserSettings.roles + UserSettings.options, mask=0x11)
+        by_schema = BitnFly(self.schema, mask=0x11)
+
+        self.assertEqual(by_list.get(), by_schema.get())
+        self.assertEqual(by_list.mask(), by_schema.mask())
+        self.assertEqual(repr(by_list), repr(by_schema))
+
+        by_schema.off().on().reset()
+        self.assertEqual(0x11, by_schema.get())
+
+    def test_assert(self):
+
+        with self.assertRaises(AssertionError):
+            BitnFly('admin')
+
+        with self.assertRaises(AssertionError):
+            FlagSchema('admin')
+
+    def test_is_bit(self):
+
+        self.assertTrue(self.schema.is_bit(1))
+        self.assertTrue(self.schema.is_bit(128))
+        self.assertFalse(self.schema.is_bit(0))
+        self.assertFalse(self.schema.is_bit(3))
+        self.assertFalse(self.schema.is_bit(256))
+        self.assertFalse(self.schema.is_bit(-1))
+
+    def test_position(self):
+
+        self.assertEqual(0, self.schema.position('ADMIN'))
+        self.assertEqual(7, self.schema.position('CAN_PUBLISH'))
+
+        with self.assertRaises(ValueError):
+            self.schema.position('NOTHERE')
+
+        with self.assertRaises(ValueError):
+            BitnFly(self.schema).flip('nothere')
+
+    def test_wide(self):
+
+        schema = FlagSchema(['flag_{}'.format(x) for x in range(2000)])
+        b = BitnFly(schema)
+
+        b.flip(1 << 1999)
+        self.assertFalse(b & 'flag_1999')
+        self.assertEqual(0, b.get(1 << 1999))
+
+        b |= 'flag_1999'
+        self.assertEqual(1 << 1999, b.get(1 << 1999))
+        self.assertEqual(0, b.get(1 << 2000))
+
+    def test_mask_of(self):
+
+        self.assertEqual(1, self.schema.mask_of(1))
+        self.assertEqual(0, self.schema.mask_of(3))
+        self.assertEqual(16, self.schema.mask_of('can_read'))
+        self.assertEqual(3, self.schema.mask_of([1, 2, 3]))
+        self.assertEqual(0, self.schema.mask_of([1, 1], '__xor__'))
+        self.assertEqual(1, self.schema.mask_of(['admin', 'admin']))
+        self.assertEqual(0, self.schema.mask_of([1, 'admin']))
+
+    def test_sequences(self):
+
+        self.assertEqual(3, self.schema.mask_of(('admin', 'moderator')))
+        self.assertEqual(3, self.schema.mask_of(frozenset(['admin', 'moderator']), '__xor__'))
+        self.assertEqual(0, self.schema.mask_of(('admin', 'admin'), '__xor__'))
+        self.assertEqual(0, self.schema.mask_of([[1]]))
+        self.assertEqual(0, self.schema.mask_of(None))
+
+        b = BitnFly(self.schema)
+
+        b.flip(('admin', 'staff')).flip(frozenset([1 << 7]))
+        self.assertEqual(0b01111010, b.get())
+
+    def test_cached(self):
+
+        ops = ['admin', 'can_edit']
+
+        self.assertEqual(65, self.schema.mask_of(ops))
+        self.assertIs(self.schema.mask_of(ops), self.schema.mask_of(list(ops)))
+
+        # a cached list is read again after it changed
+        ops.append('staff')
+        self.assertEqual(69, self.schema.mask_of(ops))
+
+        # floats and bools are equal to ints but are not flags, they do not share a key with them
+        self.assertEqual(0, self.schema.mask_of([1.0, 2.0]))
+        self.assertEqual(3, self.schema.mask_of([1, 2]))
+        self.assertEqual(0b11, BitnFly(self.schema, mask=0).flip([1, 2]).get())
+
+    def test_cached_operations(self):
+
+        # a group folds differently under | and ^, a frozenset is cached per operation
+        self.schema.group('roles', ['admin', 'moderator'])
+        bits = frozenset(['roles', 'admin'])
+
+        self.assertEqual(0b10, self.schema.mask_of(bits, '__xor__'))
+
+        b = BitnFly(self.schema, mask=0)
+        b |= bits
+
+        self.assertEqual(0b11, b.get())
+
+    def test_group_redefined(self):
+
+        self.schema.group('editor', ['can_read', 'can_edit'])
+
+        self.assertTrue(self.schema.compile('editor')(0x10))
+        self.assertEqual(0x50, BitnFly(self.schema, mask=0).apply(self.schema.plan([('or', 'editor')])).get())
+
+        # a redefined group is read again by compiled predicates and plans
+        self.schema.group('editor', 'can_publish')
+
+        self.assertFalse(self.schema.compile('editor')(0x10))
+        self.assertEqual(0x80, BitnFly(self.schema, mask=0).apply(self.schema.plan([('or', 'editor')])).get())
+
+    def test_lazy(self):
+
+        # caches and the fingerprint are made on first use and a copy of a schema starts without them
+        schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        copy = pickle.loads(pickle.dumps(schema))
+
+        self.assertEqual(self.schema.fingerprint, copy.fingerprint)
+        self.assertNotEqual(self.schema.fingerprint, FlagSchema(UserSettings.options).fingerprint)
+
+        value = copy.value(0x11)
+
+        self.assertTrue(copy.is_interned(value))
+        self.assertFalse(schema.is_interned(value))
+        self.assertEqual(0x11, copy.mask_of(['admin', 'can_read']))
+        self.assertTrue(copy.compile('admin')(value))
+
+    def test_groups(self):
+
+        permissions = ['can_read', 'can_delete', 'can_edit', 'can_publish']
+
+        self.assertEqual(0b11110000, self.schema.group('permissions', permissions))
+        self.assertEqual(0b11110001, self.schema.mask_of(['permissions', 'admin']))
+        self.assertEqual(0b11110000, self.schema.mask_of('Permissions'))
+
+        b = BitnFly(self.schema)
+        b.flip('permissions')
+
+        self.assertEqual(0b1111, b.get())
+        self.assertFalse(b & 'permissions')
+
+        b |= 'permissions'
+        self.assertEqual(0xff, b.get())
+
+        sparse = SparseBitnFly(self.schema).flip(['permissions', 'admin'])
+        self.assertEqual(0b1110, sparse.get())
+
+        with self.assertRaises(AssertionError):
+            self.schema.group('admin', [1])
+
+    def test_group_names(self):
+
+        self.schema.group('editor', ['can_read', 'can_edit'])
+        mask = self.schema.mask_of(['can_edit', 'staff'])
+
+        for cls in (BitnFly, ConcurrentBitnFly, SparseBitnFly):
+
+            b = cls(self.schema, mask=mask)
+
+            self.assertEqual(self.schema.mask_of('can_edit'), b.get('editor'))
+            self.assertTrue(b & 'editor')
+            self.assertFalse(cls(self.schema, mask=0b1).get('editor'))
+
+        wide = FlagSchema(['flag_{}'.format(x) for x in range(200)], backend='sparse')
+        wide.group('far', ['flag_3', 'flag_150'])
+
+        b = wide.create(mask=1 << 150 | 1 << 7)
+
+        self.assertEqual(1 << 150, b.get('far'))
+        self.assertTrue(b & 'far')
+        self.assertFalse(wide.create(mask=1 << 7) & 'far')
+
+        predicate = self.schema.compile('editor & ~admin')
+
+        self.assertTrue(predicate(BitnFly(self.schema, mask=mask)))
+        self.assertFalse(predicate(BitnFly(self.schema, mask=mask | 0b1)))
+        self.assertFalse(predicate(BitnFly(self.schema, mask=0b100)))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_group_names_array(self):
+
+        self.schema.group('editor', ['can_read', 'can_edit'])
+        rows = BitnFlyArray(self.schema, masks=[self.schema.mask_of('can_read'), 0b1])
+
+        self.assertEqual([self.schema.mask_of('can_read'), 0], rows.get('editor').tolist())
+        self.assertEqual([True, False], list(rows & 'editor'))
+        self.assertEqual([True, False], list(self.schema.compile('editor').test_array(rows.get())))
@@ -0,0 +1,142 @@
+import multiprocessing
+import unittest
+
+from BitnFly.api import BitnFly, FlagSchema
+from BitnFly.api.shared import SharedFlagTable, shared_memory
+from BitnFly.api.store import WRITE_RECORDS
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+def _flip_many(table, slot, bit, count):
+
+    handle = table[slot]
+
+    for _ in range(count):
+        handle.flip(bit)
+
+    handle |= bit
+    table.close()
+
+
+def _flip_pairs(table, count):
+
+    for _ in range(count):
+        table[0].flip(['admin', 'moderator'])
+
+    table.close()
+
+
+@unittest.skipIf(shared_memory is None, 'multiprocessing.shared_memory is not available')
+class TestSharedFlagTable(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.table = SharedFlagTable.create(self.schema, 4, stripes=2)
+        self.context = multiprocessing.get_context('fork')
+
+    def tearDown(self):
+
+        self.table.close()
+        self.table.unlink()
+
+    def test_same_as_bitnfly(self):
+
+        handle = self.table[1]
+        b = BitnFly(self.schema)
+
+        for obj in (handle, b):
+            obj.flip('admin').flip(['staff', 'can_read']).off()
+            obj |= 'can_edit'
+            obj.on()
+
+        self.assertEqual(b.get(), handle.get())
+        self.assertEqual(b.mask(), handle.mask())
+
+        self.table[2] = 0x3
+        self.assertEqual(0x3, self.table[2].get())
+        self.assertEqual(self.schema.full_mask, self.table[0].get())
+
+        with self.assertRaises(IndexError):
+            self.table[4]
+
+    def test_create_chunks(self):
+
+        size = WRITE_RECORDS + 3
+        table = SharedFlagTable.create(self.schema, size, mask=0x11)
+
+        try:
+            self.assertEqual(size, len(table))
+            self.assertEqual([0x11] * 3, [table[slot].get() for slot in (0, WRITE_RECORDS - 1, size - 1)])
+            self.assertEqual(self.schema.full_mask, table[size - 1].mask())
+
+        finally:
+            table.close()
+            table.unlink()
+
+    def test_initial(self):
+
+        table = SharedFlagTable.create(self.schema, 4, mask=0x11)
+
+        try:
+            self.assertEqual(0x11, table[1].flip('staff').reset().get())
+            self.assertEqual(BitnFly(self.schema, mask=0x11).flip('admin').off().reset().get(),
+                             table[2].flip('admin').off().reset().get())
+
+            with SharedFlagTable(table.name(), self.schema) as other:
+                self.assertEqual(0x11, other.initial())
+
+        finally:
+            table.close()
+            table.unlink()
+
+    def test_attach(self):
+
+        self.table[3].flip('admin')
+
+        with SharedFlagTable(self.table.name(), self.schema) as other:
+
+            self.assertEqual(0xfe, other[3].get())
+
+            with self.assertRaises(AssertionError):
+                other[3].flip('admin')
+
+        with self.assertRaises(ValueError):
+            SharedFlagTable(self.table.name(), UserSettings.options)
+
+    def test_processes(self):
+
+        # every process flips its bit an even number of times and then sets it
+        table = SharedFlagTable.create(self.schema, 1, mask=0x0, stripes=1)
+
+        try:
+            workers = [
+                self.context.Process(target=_flip_many, args=(table, 0, 1 << x, 200)) for x in range(4)
+            ]
+
+            for worker in workers:
+                worker.start()
+
+            for worker in workers:
+                worker.join()
+
+            self.assertEqual(0xf, table[0].get())
+            self.assertEqual(self.schema.full_mask, table[0].mask())
+
+        finally:
+            table.close()
+            table.unlink()
+
+    def test_consistent_reads(self):
+
+        writer = self.context.Process(target=_flip_pairs, args=(self.table, 2000))
+        writer.start()
+
+        seen = set()
+
+        while writer.is_alive():
+            seen.add(self.table[0].get() & 0x3)
+
+        writer.join()
+
+        self.assertTrue(seen <= set((0x0, 0x3)))
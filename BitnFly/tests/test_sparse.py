@@ -0,0 +1,179 @@
+import random
+import sys
+import unittest
+
+from BitnFly.api import BitnFly, FlagSchema, SparseBitnFly
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestSparseBitnFly(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.wide = FlagSchema(['feature_{}'.format(x) for x in range(50000)], backend='sparse')
+
+    def check_same(self, dense, sparse):
+
+        self.assertEqual(dense.get(), sparse.get())
+        self.assertEqual(dense.mask(), sparse.mask())
+
+    def random_ops(self, schema, count, seed):
+
+        rand = random.Random(seed)
+        names = list(schema.options)
+        ops = []
+
+        for _ in range(count):
+
+            op = rand.choice(['flip', 'or', 'off', 'on', 'reset', 'range', 'clear'])
+
+            if op in ('flip', 'or'):
+                arg = rand.choice([
+                    rand.choice(names).lower(),
+                    1 << rand.randrange(len(names)),
+                    [rand.choice(names) for _ in range(3)],
+                    [1 << rand.randrange(len(names)) for _ in range(3)],
+                ])
+                ops.append((op, arg))
+
+            elif op in ('range', 'clear'):
+                start = rand.randrange(len(names))
+                ops.append((op, start, rand.randrange(start, len(names) + 1)))
+
+            else:
+                ops.append((op,))
+
+        return ops
+
+    def run_ops(self, b, ops):
+
+        for op in ops:
+
+            if op[0] == 'flip':
+                b.flip(op[1])
+
+            elif op[0] == 'or':
+                b |= op[1]
+
+            elif op[0] == 'range':
+                b.flip_range(op[1], op[2])
+
+            elif op[0] == 'clear':
+                b.clear_range(op[1], op[2])
+
+            else:
+                getattr(b, op[0])()
+
+        return b
+
+    def test_same_as_bitnfly(self):
+
+        for seed in range(20):
+
+            for mask in (None, 0x0, 0x25):
+
+                for density in (1.0 / 256, 0.2, 1.0):
+
+                    ops = self.random_ops(self.schema, 40, seed)
+
+                    dense = self.run_ops(BitnFly(self.schema, mask=mask), ops)
+                    sparse = self.run_ops(SparseBitnFly(self.schema, mask=mask, density=density), ops)
+
+                    self.check_same(dense, sparse)
+
+                    for name in self.schema.options:
+                        self.assertEqual(dense & name, sparse & name)
+                        self.assertEqual(dense.get(name), sparse.get(name))
+
+                    self.assertEqual(dense & 0xff, sparse & 0xff)
+
+    def test_wide(self):
+
+        for seed in range(3):
+
+            ops = self.random_ops(self.wide, 30, seed)
+
+            dense = self.run_ops(BitnFly(self.wide, mask=0x0), ops)
+            sparse = self.run_ops(self.wide.create(mask=0x0), ops)
+
+            self.check_same(dense, sparse)
+
+    def test_memory(self):
+
+        b = self.wide.create(mask=0x0)
+        b |= ['feature_10', 'feature_49999']
+
+        self.assertTrue(b.is_sparse())
+        self.assertEqual([10, 49999], b.positions())
+
+        # all flags on and a full swap mask are empty sets
+        b = self.wide.create()
+        self.assertLess(sys.getsizeof(b._SparseBitnFly__opt_flags[1]), 1024)
+        self.assertTrue(b & 'feature_123')
+
+    def test_conversion(self):
+
+        b = SparseBitnFly(self.wide, mask=0x0)
+
+        b.set_range(0, 20000)
+        self.assertFalse(b.is_sparse())
+
+        b.clear_range(0, 20000)
+        self.assertEqual(0, b.get())
+
+        b.reset()
+        self.assertTrue(b.is_sparse())
+
+        b.set_range(0, 50000)
+        self.assertTrue(b.is_sparse())
+        self.assertEqual(self.wide.full_mask, b.get())
+
+    def test_negative_ints(self):
+
+        # & with a negative int agrees with BitnFly whether the state is sparse or dense
+        dense = BitnFly(self.schema, mask=0b10)
+        sparse = SparseBitnFly(self.schema, mask=0b10)
+        wide = SparseBitnFly(self.wide, mask=0x0).set_range(0, 20000)
+
+        self.assertTrue(sparse.is_sparse())
+        self.assertFalse(wide.is_sparse())
+
+        for other in (-1, -2, -4, 0):
+            self.assertEqual(dense & other, sparse & other)
+
+        self.assertTrue(wide & -1)
+        self.assertTrue(SparseBitnFly(self.wide, mask=0x0).flip(1 << 7) & -1)
+
+    def test_apply(self):
+
+        ops = [('flip', 'admin'), 'off', ('or', ['can_read']), 'on']
+
+        dense = BitnFly(self.schema).apply(ops)
+        sparse = SparseBitnFly(self.schema).apply(ops)
+
+        self.check_same(dense, sparse)
+
+        wide = self.wide.create().apply(['off', ('or', 'feature_7')])
+
+        self.assertTrue(wide.is_sparse())
+        self.assertEqual([7], wide.positions())
+
+    def test_create(self):
+
+        self.assertIsInstance(self.schema.create(), BitnFly)
+        self.assertIsInstance(self.wide.create(), SparseBitnFly)
+
+        with self.assertRaises(AssertionError):
+            FlagSchema(['a'], backend='nope')
+
+    def test_attributes(self):
+
+        b = SparseBitnFly(self.schema)
+
+        self.assertEqual(1, b.ADMIN)
+        self.assertEqual(128, b.can_publish)
+        self.assertEqual('<SparseBitnFly(255, mask=255)>', repr(b))
+
+        with self.assertRaises(AttributeError):
+            b.nothere
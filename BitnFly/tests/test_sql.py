@@ -0,0 +1,161 @@
+import random
+import sqlite3
+import unittest
+
+from BitnFly.api import BitnFly, FlagSchema
+from BitnFly.api.sql import SQLiteFlagTable
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestSQLiteFlagTable(unittest.TestCase):
+
+    def setUp(self):
+
+        self.rnd = random.Random(11)
+        self.connection = sqlite3.connect(':memory:')
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def _table(self, schema, count=40, **kwargs):
+
+        table = SQLiteFlagTable(self.connection, 'users', schema, **kwargs)
+        table.create_table()
+
+        objects = dict((key, BitnFly(schema).flip(self.rnd.getrandbits(len(schema)))) for key in range(count))
+        table.insert(objects.items())
+
+        return table, objects
+
+    def test_columns(self):
+
+        table = SQLiteFlagTable(self.connection, 't', self.schema)
+        self.assertEqual(('flags', 'flags_swap', 'flags_on'), table.columns())
+
+        wide = FlagSchema(['flag_{}'.format(x) for x in range(64)])
+        table = SQLiteFlagTable(self.connection, 't', wide, column='bits', state=False)
+
+        self.assertEqual(('bits_0', 'bits_1'), table.columns())
+
+    def test_insert(self):
+
+        table, objects = self._table(self.schema)
+        table.insert([(100, 0b101), (101, self.schema.value(0b11)), (2, objects[2].off())])
+
+        self.assertEqual(42, len(table))
+        self.assertEqual((0b101, 255, True), table.state(100))
+        self.assertEqual(0b11, table.get(101))
+        self.assertEqual(objects[2].state(), table.state(2))
+        self.assertRaises(KeyError, table.state, 1000)
+
+    def test_where(self):
+
+        for width in (8, 63, 130):
+
+            schema = FlagSchema(['flag_{}'.format(x) for x in range(width)])
+            table, objects = self._table(schema)
+
+            for expression in ('flag_1', 'flag_1 & ~flag_5 | flag_7 & flag_2', '~flag_3', 'flag_0 & ~flag_0'):
+
+                predicate = schema.compile(expression)
+
+                self.assertEqual(
+                    sorted(key for key, b in objects.items() if predicate(b)), sorted(table.keys(expression))
+                )
+
+                self.assertEqual(sum(1 for b in objects.values() if predicate(b)), table.count(expression))
+
+            self.connection.execute('DROP TABLE users')
+
+    def test_updates(self):
+
+        for width in (8, 63, 64, 130):
+
+            schema = FlagSchema(['flag_{}'.format(x) for x in range(width)])
+            table, objects = self._table(schema)
+
+            for _ in range(40):
+
+                ops = []
+
+                for _ in range(self.rnd.randint(1, 4)):
+
+                    name = self.rnd.choice(['flip', 'or', 'off', 'on', 'reset'])
+                    ops.append((name, self.rnd.getrandbits(width)) if name in ('flip', 'or') else name)
+
+                if self.rnd.random() < 0.5:
+                    keys = self.rnd.sample(range(40), 10)
+                    table.apply(ops, keys=keys)
+
+                else:
+                    keys = [key for key, b in objects.items() if b & 'flag_3']
+                    table.apply(ops, where='flag_3')
+
+                for key in keys:
+                    objects[key].apply(ops)
+
+            for key, b in objects.items():
+                self.assertEqual(b.state(), table.state(key))
+
+            self.connection.execute('DROP TABLE users')
+
+    def test_shortcuts(self):
+
+        table, objects = self._table(self.schema)
+
+        self.assertEqual(40, table.flip('admin'))
+        self.assertEqual(2, table.set(['staff', 'can_read'], keys=[1, 2]))
+        table.off(where='admin')
+        table.on()
+
+        for key, b in objects.items():
+
+            b.flip('admin')
+
+            if key in (1, 2):
+                b |= ['staff', 'can_read']
+
+            if b & 'admin':
+                b.off()
+
+            b.on()
+
+            self.assertEqual(b.state(), table.state(key))
+
+    def test_without_state(self):
+
+        table, objects = self._table(self.schema, state=False)
+
+        table.flip('admin', where='staff')
+        table.set('can_read', keys=[3])
+
+        self.assertRaises(AssertionError, table.off)
+
+        for key, b in objects.items():
+
+            if b & 'staff':
+                b.flip('admin')
+
+            if key == 3:
+                b |= 'can_read'
+
+            self.assertEqual(b.get(), table.get(key))
+
+    def test_index(self):
+
+        table, _ = self._table(self.schema)
+
+        self.assertEqual('users_flags_admin', table.create_index('admin'))
+        table.create_index('staff', index='staff_bit', partial=False)
+
+        for expression in ('admin', 'admin & can_read'):
+
+            plan = self.connection.execute(
+                'EXPLAIN QUERY PLAN SELECT count(*) FROM users WHERE {}'.format(table.where(expression))
+            ).fetchall()
+
+            self.assertIn('users_flags_admin', ' '.join(str(row) for row in plan))
+
+        names = [row[0] for row in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        self.assertEqual(['staff_bit', 'users_flags_admin'], sorted(names))
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from BitnFly.api import BitnFly, FlagSchema, FlagStore
+from BitnFly.api.store import numpy
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestFlagStore(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'flags.store')
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.store = FlagStore.create(self.path, self.schema, 100)
+
+    def tearDown(self):
+
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def test_create(self):
+
+        self.assertEqual(100, len(self.store))
+        self.assertEqual((255, 255, True), self.store.state(99))
+
+        with self.assertRaises(IndexError):
+            self.store[100]
+
+    def test_handle(self):
+
+        handle = self.store[7]
+        single = BitnFly(self.schema)
+
+        for target in (handle, single):
+            target.flip(['admin', 'staff'])
+            target |= 'can_read'
+            target ^= 2
+            target.off()
+
+        self.assertEqual(single.get(), handle.get())
+        self.assertEqual(single.mask(), handle.mask())
+        self.assertEqual((single.get(), single.mask(), False), self.store.state(7))
+
+        handle.on()
+        single.on()
+        self.assertEqual(single.get(), handle.get())
+
+        self.assertEqual(bool(single & 'admin'), handle & 'admin')
+        self.assertEqual(255, self.store[6].get())
+
+        self.store[6] = 1
+        self.assertEqual((1, 255, True), self.store.state(6))
+
+    def test_initial(self):
+
+        path = os.path.join(self.tmp, 'initial.store')
+
+        # reset restores the mask a store was created with, as it does for BitnFly(mask=...)
+        with FlagStore.create(path, self.schema, 10, mask=0x11) as store:
+
+            single = BitnFly(self.schema, mask=0x11)
+
+            for target in (store[3], single):
+                target.flip('staff').off().reset()
+
+            self.assertEqual(single.get(), store[3].get())
+            self.assertEqual(0x11, store[3].flip('admin').apply(['reset']).get())
+
+        with FlagStore(path, self.schema) as store:
+            self.assertEqual(0x11, store.initial())
+            self.assertEqual(0x11, store[4].flip('staff').reset().get())
+
+        self.assertEqual(self.schema.full_mask, self.store.initial())
+
+    def test_reopen(self):
+
+        self.store[3].flip('admin')
+        self.store.close()
+
+        with FlagStore(self.path, self.schema, readonly=True) as store:
+            self.assertEqual(254, store[3].get())
+
+        self.store = FlagStore(self.path, UserSettings.roles + UserSettings.options)
+
+        with self.assertRaises(ValueError):
+            FlagStore(self.path, UserSettings.options)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_arrays(self):
+
+        wide = FlagSchema(['flag_{}'.format(x) for x in range(100)])
+        path = os.path.join(self.tmp, 'wide.store')
+
+        with FlagStore.create(path, wide, 10, mask=0) as store:
+
+            store[2] |= 'flag_99'
+
+            flags = store.flags_array()
+            self.assertEqual((10, 2), flags.shape)
+            self.assertEqual(1 << 35, int(flags[2, 1]))
+
+            flags[4, 0] = 5
+            self.assertEqual(5, store[4].get())
+            self.assertEqual([2 ** 64 - 1, 2 ** 36 - 1], store.mask_array()[2].tolist())
+
+            del flags
@@ -0,0 +1,94 @@
+import io
+import unittest
+
+from BitnFly.api import BitnFly, FlagSchema
+from BitnFly.api.codec import dump, load
+from BitnFly.api.plan import fuse
+from BitnFly.api.stream import numpy, transform, transform_file
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestStream(unittest.TestCase):
+
+    def setUp(self):
+
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+        self.masks = list(range(256))
+
+        self.ops = [
+            ('flip', ['admin', 'staff']),
+            ('or', [16, 32]),
+            'off',
+            ('xor', 'can_publish'),
+            'on',
+        ]
+
+    def expected(self, ops):
+
+        result = []
+
+        for mask in self.masks:
+
+            b = BitnFly(self.schema, mask=mask)
+
+            for op in ops:
+
+                name, args = (op, ()) if isinstance(op, str) else (op[0], op[1:])
+
+                if name == 'or':
+                    b |= args[0]
+
+                elif name == 'xor':
+                    b ^= args[0]
+
+                else:
+                    getattr(b, name)(*args)
+
+            result.append(b.get())
+
+        return result
+
+    def test_transform(self):
+
+        chunks = list(transform(iter(self.masks), self.schema, self.ops, chunk_size=100))
+
+        self.assertEqual([100, 100, 56], [len(chunk) for chunk in chunks])
+        self.assertEqual(self.expected(self.ops), sum(chunks, []))
+
+    def test_reset(self):
+
+        ops = self.ops + ['reset', ('flip', 1), 'off', 'on', 'on']
+
+        self.assertEqual(self.expected(ops), sum(transform(self.masks, self.schema, ops), []))
+        self.assertEqual((255, 0), fuse(self.schema, ['off', 'on', 'reset']))
+
+    def test_errors(self):
+
+        for ops in (['nothing'], [('flip',)], [('off', 1)]):
+            with self.assertRaises(ValueError):
+                list(transform(self.masks, self.schema, ops))
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array(self):
+
+        masks = numpy.array(self.masks, dtype=numpy.uint64)
+        chunks = list(transform(masks, self.schema, self.ops, chunk_size=100))
+
+        self.assertEqual(self.expected(self.ops), numpy.concatenate(chunks).tolist())
+
+        wide = FlagSchema(['flag_{}'.format(x) for x in range(100)])
+        masks = numpy.zeros((3, 2), dtype=numpy.uint64)
+
+        result = next(transform([masks], wide, [('or', 'flag_99')]))
+        self.assertEqual([[0, 1 << 35]] * 3, result.tolist())
+
+    def test_file(self):
+
+        src, dst = io.BytesIO(), io.BytesIO()
+        dump(self.masks, src, self.schema, 'auto')
+
+        src.seek(0)
+        self.assertEqual(256, transform_file(src, dst, self.schema, self.ops, chunk_size=10))
+
+        dst.seek(0)
+        self.assertEqual(self.expected(self.ops), load(dst, self.schema))
@@ -0,0 +1,96 @@
+import gc
+import pickle
+import unittest
+import weakref
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagSchema, FlagValue, SparseBitnFly
+from BitnFly.tests.test_bits_fly import UserSettings
+
+
+class TestFlagValue(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = FlagSchema(UserSettings.roles + UserSettings.options)
+
+    def test_read_api(self):
+
+        value = FlagValue(self.schema, 0b101)
+        b = BitnFly(self.schema, mask=0b101)
+
+        for bit in (None, 1, 2, 4, 3, 'admin', self.schema.names[2]):
+            self.assertEqual(b.get(bit), value.get(bit))
+
+        self.assertEqual(b & 'admin', value & 'admin')
+        self.assertEqual(b.ADMIN, value.ADMIN)
+        self.assertIs(self.schema.options, value.flags())
+        self.assertEqual('0b101', value.get(output=bin))
+        self.assertEqual(self.schema.full_mask, FlagValue(self.schema).get())
+
+    def test_immutable(self):
+
+        value = FlagValue(self.schema, 0b1)
+
+        self.assertRaises(AttributeError, setattr, value, 'x', 1)
+        self.assertRaises(AttributeError, setattr, value, '_FlagValue__mask', 2)
+        self.assertFalse(hasattr(value, '__dict__'))
+
+        flipped = value.flip('admin')
+
+        self.assertEqual(0b1, value.get())
+        self.assertEqual(0b0, flipped.get())
+        self.assertEqual(0b11, (value | 0b10).get())
+        self.assertEqual(0b11, (value ^ 0b10).get())
+
+    def test_hashable(self):
+
+        first, second = FlagValue(self.schema, 0b11), FlagValue(self.schema, 0b11 | 1 << 40)
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, len({first, second}))
+        self.assertNotEqual(first, FlagValue(self.schema, 0b1))
+        self.assertNotEqual(first, FlagValue(FlagSchema(['a', 'b']), 0b11))
+        self.assertNotEqual(first, 0b11)
+
+    def test_interned(self):
+
+        value = self.schema.value(0b11)
+
+        self.assertIs(value, self.schema.value(0b11))
+        self.assertIs(value, FlagValue(self.schema, 0b11).intern())
+        self.assertIs(self.schema.value(0b111), value | 0b100)
+        self.assertTrue(self.schema.is_interned(value))
+        self.assertFalse(self.schema.is_interned(FlagValue(self.schema, 0b11)))
+        self.assertFalse(self.schema.is_interned(FlagValue(self.schema, 0b11) | 0b100))
+
+        for cls in (BitnFly, ConcurrentBitnFly, SparseBitnFly):
+            self.assertIs(value, cls(self.schema, mask=0b11).freeze())
+
+    def test_weak(self):
+
+        ref = weakref.ref(self.schema.value(0b1001))
+        gc.collect()
+
+        self.assertIsNone(ref())
+
+    def test_pickle(self):
+
+        value = self.schema.value(0b10)
+        copy = pickle.loads(pickle.dumps(value))
+
+        self.assertEqual(value, copy)
+        self.assertEqual(0b10, copy.schema().value(0b10).get())
+
+    def test_implied(self):
+
+        schema = FlagSchema(['admin', 'staff', 'read'], implies={'admin': 'staff', 'staff': 'read'})
+        value = schema.value(0x0) | 'admin'
+
+        self.assertEqual(0b111, value.get())
+        self.assertTrue(schema.value(0b1) & 'read')
+
+    def test_thaw(self):
+
+        b = FlagValue(self.schema, 0b110).thaw()
+
+        self.assertIsInstance(b, BitnFly)
+        self.assertEqual(0b110, b.get())
@@ -0,0 +1,109 @@
+import tracemalloc
+import unittest
+
+from BitnFly.api import BitnFly, ConcurrentBitnFly, FlagSchema
+from BitnFly.api.array import numpy, BitnFlyArray
+
+
+class TestWideSchema(unittest.TestCase):
+
+    size = 20000
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = FlagSchema(['flag_{}'.format(x) for x in range(cls.size)])
+
+    def test_tables(self):
+
+        last = 'FLAG_{}'.format(self.size - 1)
+
+        self.assertEqual(1 << (self.size - 1), self.schema.options[last])
+        self.assertEqual(last, self.schema.bits[1 << (self.size - 1)])
+        self.assertEqual((1 << self.size) - 1, self.schema.full_mask)
+        self.assertEqual((self.size + 63) // 64, self.schema.words)
+        self.assertEqual(self.size, len(self.schema.options))
+
+        with self.assertRaises(KeyError):
+            self.schema.bits[3]
+
+    def test_memory(self):
+
+        tracemalloc.start()
+        FlagSchema(['flag_{}'.format(x) for x in range(self.size)])
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # n ints of up to n bits would take about size ** 2 / 16 bytes
+        self.assertLess(size, 200 * self.size)
+
+    def test_exact_positions(self):
+
+        b = BitnFly(self.schema, mask=0x0)
+
+        b.flip(1 << 19999).flip('flag_12345')
+
+        self.assertEqual(1 << 19999, b.get(1 << 19999))
+        self.assertEqual(1 << 12345, b.get('flag_12345'))
+        self.assertTrue(b & 'flag_19999')
+
+    def test_repr(self):
+
+        self.assertIn('mask=0x', repr(BitnFly(self.schema)))
+        self.assertIn('mask=0x', repr(ConcurrentBitnFly(self.schema)))
+
+    def test_range_mask(self):
+
+        self.assertEqual(0b11100, self.schema.range_mask(2, 5))
+        self.assertEqual(0, self.schema.range_mask(7, 7))
+        self.assertEqual(self.schema.full_mask, self.schema.range_mask(0, self.size))
+
+        with self.assertRaises(AssertionError):
+            self.schema.range_mask(0, self.size + 1)
+
+    def test_positions_mask(self):
+
+        positions = [0, 7, 8, 19999]
+        expected = 0
+
+        for position in positions:
+            expected |= 1 << position
+
+        self.assertEqual(expected, self.schema.positions_mask(positions))
+        self.assertEqual(0, self.schema.positions_mask([]))
+
+    def test_ranges(self):
+
+        for b in (BitnFly(self.schema, mask=0x0), ConcurrentBitnFly(self.schema, mask=0x0)):
+
+            b.set_range(100, 10100)
+            self.assertEqual(self.schema.range_mask(100, 10100), b.get())
+
+            b.clear_range(5000, 15000)
+            self.assertEqual(self.schema.range_mask(100, 5000), b.get())
+
+            b.flip_range(0, 200)
+            self.assertEqual(self.schema.range_mask(0, 100) | self.schema.range_mask(200, 5000), b.get())
+
+            b.reset()
+            self.assertEqual(0, b.get())
+
+    def test_clear_range_keeps_off_on(self):
+
+        b = BitnFly(['read', 'write', 'delete', 'execute'])
+        b.clear_range(1, 3)
+
+        self.assertEqual(0b1001, b.get())
+        self.assertEqual(0b1001, b.mask())
+
+        b.off().on()
+        self.assertEqual(0b1001, b.get())
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array_ranges(self):
+
+        array = BitnFlyArray(self.schema, size=3, mask=0x0)
+
+        array.set_range(60, 70).clear_range(65, 68).flip_range(0, 1)
+
+        expected = self.schema.range_mask(60, 65) | self.schema.range_mask(68, 70) | 1
+        self.assertEqual([expected] * 3, array.to_ints())
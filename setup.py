@@ -7,6 +7,9 @@ bitnfly_dev = {'develop': [
     "flake8>=2.5.1",        # MIT license
     "pyflakes>=1.0.0",      # MIT license
     "coverage",
+    ],
+    'numpy': [
+        "numpy",            # BSD license
     ]
 }
 
@@ -35,11 +38,14 @@ setup(
 
         # Specify the Python versions you support here. In particular, ensure
         # that you indicate whether you support Python 2, Python 3 or both.
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         "Programming Language :: Python :: Implementation :: PyPy"
     ],
+    python_requires='>=3.7',
     extras_require=bitnfly_dev
 )